@@ -0,0 +1,240 @@
+from typing import Dict, Iterable, List, Optional, Any
+
+import numpy as np
+
+from core.config import settings
+from models.definitions import StudentStateModel, EMOTIONS, MOOD_TO_STATE, STUDENT_STATES
+from state.manager import state_manager
+from ai.rule_engine import DecayRules, rule_engine
+
+_MOOD_CODE = {mood: code for code, mood in enumerate(EMOTIONS)}
+_STATE_CODE = {state: code for code, state in enumerate(STUDENT_STATES)}
+# Derived student_state per mood code, so a whole room maps in one take()
+_MOOD_TO_STATE_CODE = np.array([_STATE_CODE[MOOD_TO_STATE.get(mood, "idle")] for mood in EMOTIONS], dtype=np.int8)
+
+
+class _CompiledDecay:
+    """The rule engine's decay rules as per-mood lookup arrays."""
+
+    def __init__(self, decay: DecayRules):
+        self.low_energy = decay.low_energy
+        self.low_attention = decay.low_attention
+        self.low_energy_mood = _MOOD_CODE[decay.low_energy_mood]
+        self.low_attention_mood = _MOOD_CODE[decay.low_attention_mood]
+        self.can_tire = np.array([mood not in decay.low_energy_exempt_moods for mood in EMOTIONS], dtype=bool)
+        self.can_drift = np.array([mood in decay.low_attention_from_moods for mood in EMOTIONS], dtype=bool)
+
+
+class ClassroomSimulation:
+    """
+    Room-level simulation of attention/energy decay between interactions.
+
+    Every tracked student of every room is one row in a set of NumPy arrays
+    (struct-of-arrays), so a tick is a handful of vectorized operations for
+    the whole process. A tick decays attention and energy, applies the
+    rule engine's decay rules (e.g. low energy -> sleepy, low attention
+    while neutral -> confused) and reports only the students whose derived
+    student_state changed.
+
+    The state store stays authoritative: rows are loaded from it when a
+    student is tracked, refreshed after every decision (observe) and decayed
+    values are written back (flush) before the pipeline reads a student and
+    periodically for everyone.
+    """
+
+    def __init__(self, attention_decay_per_s: float, energy_decay_per_s: float, capacity: int = 1024):
+        self.attention_decay_per_s = attention_decay_per_s
+        self.energy_decay_per_s = energy_decay_per_s
+
+        self.attention = np.zeros(capacity, dtype=np.float32)
+        self.energy = np.zeros(capacity, dtype=np.float32)
+        self.mood = np.zeros(capacity, dtype=np.int8)
+        self.derived = np.zeros(capacity, dtype=np.int8)
+        self.room = np.full(capacity, -1, dtype=np.int32)
+        self.student_id = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.dirty = np.zeros(capacity, dtype=bool)
+
+        self._row_of: Dict[int, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._rooms: List[str] = []
+        self._room_index: Dict[str, int] = {}
+        self._decay_version = None
+        self._decay: Optional[_CompiledDecay] = None
+
+    # --- Membership ---
+    def _grow(self):
+        old = len(self.active)
+        new = old * 2
+        for name in ("attention", "energy", "mood", "derived", "room", "student_id", "active", "dirty"):
+            array = getattr(self, name)
+            grown = np.full(new, -1, dtype=array.dtype) if name == "room" else np.zeros(new, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self._free.extend(range(new - 1, old - 1, -1))
+
+    def _room_code(self, room_id: str) -> int:
+        code = self._room_index.get(room_id)
+        if code is None:
+            code = self._room_index[room_id] = len(self._rooms)
+            self._rooms.append(room_id)
+        return code
+
+    def track(self, room_id: str, student_id: int, state: Optional[StudentStateModel] = None):
+        """Adds a student to the simulation (or moves it to `room_id`)."""
+        row = self._row_of.get(student_id)
+        if row is None:
+            if state is None:
+                state = state_manager.get_student_state(student_id)
+            if state is None:
+                return
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._row_of[student_id] = row
+            self.student_id[row] = student_id
+            self.active[row] = True
+            self._load_row(row, state)
+        self.room[row] = self._room_code(room_id)
+
+    async def track_async(self, room_id: str, student_id: int, state: Optional[StudentStateModel] = None):
+        """track for the event loop: a student not tracked yet is loaded without blocking it."""
+        if state is None and student_id not in self._row_of:
+            state = await state_manager.get_student_state_async(student_id)
+            if state is None:
+                return
+        self.track(room_id, student_id, state)
+
+    def untrack(self, student_ids: Iterable[int]):
+        student_ids = list(student_ids)
+        self.flush(student_ids)
+        self._release(student_ids)
+
+    async def untrack_async(self, student_ids: Iterable[int]):
+        """untrack for the event loop: the final flush does not block it."""
+        student_ids = list(student_ids)
+        await self.flush_async(student_ids)
+        self._release(student_ids)
+
+    def _release(self, student_ids: Iterable[int]):
+        for student_id in student_ids:
+            row = self._row_of.pop(student_id, None)
+            if row is not None:
+                self.active[row] = False
+                self.dirty[row] = False
+                self.room[row] = -1
+                self._free.append(row)
+
+    def drop_room(self, room_id: str):
+        self.untrack(self.room_students(room_id))
+
+    async def drop_room_async(self, room_id: str):
+        await self.untrack_async(self.room_students(room_id))
+
+    def room_students(self, room_id: str) -> List[int]:
+        code = self._room_index.get(room_id)
+        if code is None:
+            return []
+        return self.student_id[self.active & (self.room == code)].tolist()
+
+    def rooms(self) -> List[str]:
+        """Rooms with at least one tracked student."""
+        return [self._rooms[code] for code in np.unique(self.room[self.active]).tolist()]
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # --- Store synchronisation ---
+    def _load_row(self, row: int, state: StudentStateModel):
+        self.attention[row] = state.attention_level
+        self.energy[row] = state.energy_level
+        self.mood[row] = _MOOD_CODE[state.mood]
+        self.derived[row] = _MOOD_TO_STATE_CODE[self.mood[row]]
+        self.dirty[row] = False
+
+    def observe(self, state: StudentStateModel):
+        """Refreshes a tracked student after the pipeline persisted a decision."""
+        row = self._row_of.get(state.student_id)
+        if row is not None:
+            self._load_row(row, state)
+
+    def flush(self, student_ids: Optional[Iterable[int]] = None) -> int:
+        """Writes decayed values back to the state store in one batched update."""
+        updates = self._take_updates(student_ids)
+        if updates:
+            state_manager.update_student_states(updates)
+        return len(updates)
+
+    async def flush_async(self, student_ids: Optional[Iterable[int]] = None) -> int:
+        """flush for the event loop: the store write does not block it."""
+        updates = self._take_updates(student_ids)
+        if updates:
+            await state_manager.update_student_states_async(updates)
+        return len(updates)
+
+    def tracks(self, student_id: int) -> bool:
+        return student_id in self._row_of
+
+    def _take_updates(self, student_ids: Optional[Iterable[int]]) -> Dict[int, Dict[str, Any]]:
+        """Decayed values of dirty rows, which are marked clean."""
+        if student_ids is None:
+            rows = np.flatnonzero(self.dirty)
+        else:
+            rows = [row for row in (self._row_of.get(sid) for sid in student_ids) if row is not None and self.dirty[row]]
+        if len(rows) == 0:
+            return {}
+        updates = {
+            int(self.student_id[row]): {
+                "attention_level": float(self.attention[row]),
+                "energy_level": float(self.energy[row]),
+                "mood": EMOTIONS[self.mood[row]]
+            }
+            for row in rows
+        }
+        self.dirty[rows] = False
+        return updates
+
+    # --- Simulation ---
+    def tick(self, dt_s: float) -> Dict[str, List[Dict[str, Any]]]:
+        """Advances every room by `dt_s` seconds; returns changed students per room."""
+        active = self.active
+        np.subtract(self.attention, self.attention_decay_per_s * dt_s, out=self.attention, where=active)
+        np.subtract(self.energy, self.energy_decay_per_s * dt_s, out=self.energy, where=active)
+        np.clip(self.attention, 0.0, 1.0, out=self.attention)
+        np.clip(self.energy, 0.0, 1.0, out=self.energy)
+        self.dirty |= active
+
+        rule_engine.maybe_reload()
+        if self._decay_version != rule_engine.version:
+            self._decay = _CompiledDecay(rule_engine.decay)
+            self._decay_version = rule_engine.version
+        decay = self._decay
+
+        tires = active & (self.energy < decay.low_energy) & decay.can_tire[self.mood]
+        drifts = active & (self.attention < decay.low_attention) & decay.can_drift[self.mood] & ~tires
+        self.mood[tires] = decay.low_energy_mood
+        self.mood[drifts] = decay.low_attention_mood
+
+        derived = _MOOD_TO_STATE_CODE[self.mood]
+        changed = np.flatnonzero(active & (derived != self.derived))
+        if len(changed) == 0:
+            return {}
+        self.derived[changed] = derived[changed]
+
+        updates: Dict[str, List[Dict[str, Any]]] = {}
+        for row in changed.tolist():
+            updates.setdefault(self._rooms[self.room[row]], []).append({
+                "student_id": int(self.student_id[row]),
+                "student_state": STUDENT_STATES[self.derived[row]],
+                "emotion": EMOTIONS[self.mood[row]],
+                "attention_level": round(float(self.attention[row]), 3),
+                "energy_level": round(float(self.energy[row]), 3)
+            })
+        # Mood transitions are decisions in their own right: the caller persists them
+        # right away with flush_async(ids of the returned students)
+        return updates
+
+classroom_sim = ClassroomSimulation(
+    attention_decay_per_s=settings.SIM_ATTENTION_DECAY_PER_MIN / 60,
+    energy_decay_per_s=settings.SIM_ENERGY_DECAY_PER_MIN / 60
+)
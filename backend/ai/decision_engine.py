@@ -3,6 +3,7 @@ from typing import Dict, Any, Tuple
 from datetime import datetime
 from nlp.nlp_analyzer import nlp_analyzer
 from .student_agent import student_agent
+from .rule_engine import rule_engine
 from models.definitions import (
     TeacherInputRequest, AIResponse, AIResponseMeta, 
     DecisionTrace, StudentStateModel, EmotionType
@@ -39,34 +40,20 @@ class DecisionEngine:
         response_options = self.nlp.kb.get_potential_responses(intent)
         selected_response = random.choice(response_options)
         
-        # 5. Apply Logic & State Updates (The "Brain")
-        # Initialize default updates
-        mood_update = None
-        attn_update = 0.0
-        energy_update = 0.0
-        rule_id = "default_response"
-        
-        # Logic Rules
-        if intent == "praise":
-            mood_update = "happy"
-            attn_update = 0.1
-            energy_update = 0.1
-            rule_id = "praise_effect"
-        elif intent in ["discipline", "warn"]:
-            mood_update = "sad" if state_before.mood != "disruptive" else "regretful"
-            attn_update = 0.2
-            rule_id = "discipline_effect"
-        elif intent == "greeting":
-            mood_update = "happy"
-            attn_update = 0.05
-            rule_id = "greeting_effect"
-            
+        # 5. Apply Logic & State Updates (The "Brain"): the shared transition table
+        rule = rule_engine.evaluate(intent, state_before.mood, state_before.attention_level, state_before.energy_level)
+        mood_update = rule.updates.get("mood")
+        attn_update = rule.updates["attention_delta"]
+        energy_update = rule.updates["energy_delta"]
+        rule_id = rule.id
+        if rule.animation:
+            selected_response = {**selected_response, "animation": rule.animation}
+
         # State-dependent overrides (e.g. Sleepy student yields distinct response)
         if state_before.mood == "sleepy" and intent not in ["discipline", "warn"]:
              selected_response = {"reply_text": "Mhmm... (esner)... Tamam...", "animation": "sleepy_yawn", "emotion": "sleepy"}
              rule_id = "sleepy_override"
 
-        
         # 6. Commit State Updates
         state_after = self.agent.update_state(
             student_id=student_id,
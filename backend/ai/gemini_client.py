@@ -1,53 +1,130 @@
+import asyncio
+import time
 import google.generativeai as genai
-from typing import Optional
+from typing import AsyncIterator, Optional
 from core.config import settings
+from core.metrics import observe_llm_call
+from ai.prompt_builder import prompt_builder, format_user_message
 
 class GeminiClient:
     def __init__(self):
         self.api_key = settings.GEMINI_API_KEY
         self.model = None
+        self.model_name = 'models/gemini-2.0-flash'
+        self._models = {}
         if self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('models/gemini-2.0-flash')
+            self.model = genai.GenerativeModel(self.model_name)
             print(f"Gemini API initialized successfully!")
 
 
         else:
             print("WARNING: GEMINI_API_KEY not found. AI fallback disabled.")
 
+    @property
+    def configured(self) -> bool:
+        return self.model is not None
+
+
+    def _model_for(self, system_prompt: str):
+        """
+        One GenerativeModel per static system prompt. Passing it as
+        system_instruction keeps the prefix identical across calls so Gemini
+        can serve it from its implicit prompt cache.
+        """
+        model = self._models.get(system_prompt)
+        if model is None:
+            model = genai.GenerativeModel(self.model_name, system_instruction=system_prompt)
+            self._models[system_prompt] = model
+        return model
+
+    def _build_prompt(self, prompt: str, context: str, structured: bool, system_prompt: Optional[str] = None):
+        model = self._model_for(system_prompt or prompt_builder.system_prompt(structured))
+        generation_config = {
+            "response_mime_type": "application/json"
+        } if structured else {}
+        return model, format_user_message(prompt, context), generation_config
+
+    def _observe(self, status: str, started: float, response=None):
+        usage = getattr(response, "usage_metadata", None)
+        observe_llm_call(
+            "gemini", self.model_name.split("/")[-1], status, time.perf_counter() - started,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            completion_tokens=getattr(usage, "candidates_token_count", None)
+        )
 
     def generate_response(self, prompt: str, context: str = "", structured: bool = False) -> Optional[str]:
         if not self.model:
             return None
         
-        if structured:
-            system_instruction = """Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin. 
-Yanıtını MUTLAKA aşağıdaki JSON formatında ver:
-{
-  "reply_text": "yanıt metni",
-  "animation": "animasyon_adı",
-  "emotion": "duygu_adı"
-}
-Kullanabileceğin Animasyonlar: sit, stand, wave, thinking_pose, happy_nod, confused_look, listening_pose.
-Kullanabileceğin Duygular: neutral, happy, sad, confused, sleepy, alert, motivated, regretful.
-Yanıtın kısa, doğal ve Türkçe olsun."""
-        else:
-            system_instruction = "Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin. Kısa ve doğal yanıtlar ver. Türkçe yanıt ver."
+        started = time.perf_counter()
+        try:
+            model, full_prompt, generation_config = self._build_prompt(prompt, context, structured)
+            response = model.generate_content(
+                full_prompt,
+                generation_config=generation_config
+            )
+            self._observe("ok", started, response)
+            return response.text
+        except Exception as e:
+            self._observe("error", started)
+            print(f"Gemini API Error: {e}")
+            return None
 
-        full_prompt = f"Bağlam: {context}\n\nÖğretmen/Kullanıcı Mesajı: {prompt}"
-        
+    async def generate_response_async(self, prompt: str, context: str = "", structured: bool = False,
+                                      system_prompt: Optional[str] = None, max_tokens: Optional[int] = None) -> Optional[str]:
+        """
+        Non-blocking variant of generate_response for use inside the event loop.
+        `system_prompt` replaces the default student persona (e.g. for room batches).
+        """
+        if not self.model:
+            return None
+
+        started = time.perf_counter()
         try:
-            generation_config = {
-                "response_mime_type": "application/json"
-            } if structured else {}
-            
-            response = self.model.generate_content(
-                f"{system_instruction}\n\n{full_prompt}",
+            model, full_prompt, generation_config = self._build_prompt(prompt, context, structured, system_prompt)
+            if max_tokens:
+                generation_config["max_output_tokens"] = max_tokens
+            response = await model.generate_content_async(
+                full_prompt,
                 generation_config=generation_config
             )
+            self._observe("ok", started, response)
             return response.text
+        except asyncio.CancelledError:
+            # Losing side of a hedged request
+            self._observe("cancelled", started)
+            raise
         except Exception as e:
+            self._observe("error", started)
             print(f"Gemini API Error: {e}")
             return None
 
+    async def stream_response_async(self, prompt: str, context: str = "", structured: bool = False) -> AsyncIterator[str]:
+        """
+        Yields completion text chunks as they arrive. Errors are raised, not
+        swallowed, so the provider router can fail over before the first chunk.
+        """
+        if not self.model:
+            return
+
+        started = time.perf_counter()
+        status = "error"
+        try:
+            model, full_prompt, generation_config = self._build_prompt(prompt, context, structured)
+            response = await model.generate_content_async(
+                full_prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            self._observe(status, started)
+
 gemini_client = GeminiClient()
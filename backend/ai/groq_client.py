@@ -1,6 +1,10 @@
-from groq import Groq
-from typing import Optional
+import asyncio
+import time
+from groq import Groq, AsyncGroq
+from typing import AsyncIterator, Optional
 from core.config import settings
+from core.metrics import observe_llm_call, stt_seconds
+from ai.prompt_builder import prompt_builder, format_user_message
 
 class GroqClient:
     """Groq API client for fast, free AI responses."""
@@ -8,53 +12,124 @@ class GroqClient:
     def __init__(self):
         self.api_key = settings.GROQ_API_KEY if hasattr(settings, 'GROQ_API_KEY') else None
         self.client = None
+        self.async_client = None
+        self.model_name = "llama-3.1-8b-instant"
         if self.api_key:
             self.client = Groq(api_key=self.api_key)
+            # Retries and deadlines are owned by the provider router
+            self.async_client = AsyncGroq(
+                api_key=self.api_key,
+                timeout=settings.LLM_REQUEST_TIMEOUT_MS / 1000,
+                max_retries=0
+            )
             print("Groq API initialized successfully!")
         else:
             print("WARNING: GROQ_API_KEY not found. AI fallback disabled.")
 
+    @property
+    def configured(self) -> bool:
+        return self.async_client is not None
+
+    def _build_messages(self, prompt: str, context: str, structured: bool, system_prompt: Optional[str] = None):
+        # Static system prefix first, so Groq can reuse it across requests
+        return [
+            {"role": "system", "content": system_prompt or prompt_builder.system_prompt(structured)},
+            {"role": "user", "content": format_user_message(prompt, context)}
+        ]
+
+    def _observe(self, status: str, started: float, response=None):
+        usage = getattr(response, "usage", None)
+        observe_llm_call(
+            "groq", self.model_name, status, time.perf_counter() - started,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None)
+        )
+
     def generate_response(self, prompt: str, context: str = "", structured: bool = False) -> Optional[str]:
         if not self.client:
             return None
         
-        if structured:
-            system_prompt = """Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin. 
-Yanıtını MUTLAKA aşağıdaki JSON formatında ver:
-{
-  "reply_text": "yanıt metni",
-  "animation": "animasyon_adı",
-  "emotion": "duygu_adı"
-}
-Kullanabileceğin Animasyonlar: sit, stand, wave, thinking_pose, happy_nod, confused_look, listening_pose.
-Kullanabileceğin Duygular: neutral, happy, sad, confused, sleepy, alert, motivated, regretful.
-Yanıtın kısa, doğal ve Türkçe olsun."""
-        else:
-            system_prompt = "Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin. Kısa ve doğal yanıtlar ver. Türkçe yanıt ver."
-
-        full_prompt = f"Bağlam: {context}\n\nÖğretmen/Kullanıcı Mesajı: {prompt}"
-        
+        started = time.perf_counter()
         try:
             response = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": full_prompt}
-                ],
+                model=self.model_name,
+                messages=self._build_messages(prompt, context, structured),
                 max_tokens=200,
                 temperature=0.7,
                 response_format={"type": "json_object"} if structured else None
             )
+            self._observe("ok", started, response)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            self._observe("error", started)
+            print(f"Groq API Error (Chat): {e}")
+            return None
+
+    async def generate_response_async(self, prompt: str, context: str = "", structured: bool = False,
+                                      system_prompt: Optional[str] = None, max_tokens: int = 200) -> Optional[str]:
+        """
+        Non-blocking variant of generate_response for use inside the event loop.
+        `system_prompt` replaces the default student persona (e.g. for room batches).
+        """
+        if not self.async_client:
+            return None
+
+        started = time.perf_counter()
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=self._build_messages(prompt, context, structured, system_prompt),
+                max_tokens=max_tokens,
+                temperature=0.7,
+                response_format={"type": "json_object"} if structured else None
+            )
+            self._observe("ok", started, response)
             return response.choices[0].message.content.strip()
+        except asyncio.CancelledError:
+            # Losing side of a hedged request
+            self._observe("cancelled", started)
+            raise
         except Exception as e:
+            self._observe("error", started)
             print(f"Groq API Error (Chat): {e}")
             return None
 
+    async def stream_response_async(self, prompt: str, context: str = "", structured: bool = False) -> AsyncIterator[str]:
+        """
+        Yields completion tokens as they arrive. Errors are raised, not swallowed,
+        so the provider router can fail over before the first token.
+        """
+        if not self.async_client:
+            return
+
+        # Groq's JSON mode cannot be combined with streaming; the structured
+        # system prompt alone keeps the output in our JSON shape.
+        started = time.perf_counter()
+        status = "error"
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=self._build_messages(prompt, context, structured),
+                max_tokens=200,
+                temperature=0.7,
+                stream=True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            status = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            self._observe(status, started)
+
     def transcribe_audio(self, audio_file_path: str) -> Optional[str]:
         """Transcribe audio using Whisper-large-v3 model."""
         if not self.client:
             return None
         
+        started = time.perf_counter()
         try:
             with open(audio_file_path, "rb") as file:
                 transcription = self.client.audio.transcriptions.create(
@@ -64,8 +139,11 @@ Yanıtın kısa, doğal ve Türkçe olsun."""
                     response_format="text",
                     language="tr"
                 )
-            return str(transcription).strip()
+            text = str(transcription).strip()
+            stt_seconds.observe(time.perf_counter() - started, status="ok" if text else "empty")
+            return text
         except Exception as e:
+            stt_seconds.observe(time.perf_counter() - started, status="error")
             print(f"Groq API Error (STT): {e}")
             return None
 
@@ -0,0 +1,135 @@
+import asyncio
+import re
+from collections import Counter
+from typing import Dict, List, Any
+
+from core.config import settings
+from models.definitions import StudentStateModel
+from nlp.text_utils import normalize_text
+from state.manager import state_manager
+
+# Function words that say nothing about the topic of an exchange
+_STOPWORDS = frozenset("""
+acaba ama ancak artık aslında bana bazı belki ben beni benim bir biraz biri birkaç bize bizi bu buna bunu
+bunun burada çok çünkü da daha de değil diye en gibi hadi hangi hem hep hepsi her hiç için ile ise işte
+kadar ki kim mı mi mu mü nasıl ne neden nerede niye o olan olarak oldu olur ona onu onun öyle peki sen
+seni senin siz şey şimdi şu şuna şunu tamam var ve veya ya yani yok öğretmen sen evet hayır lütfen
+anlat anlatır konu konusu konusunu ayağa kalk otur dinle bakın soru cevap
+""".split())
+_SUMMARY_TOPIC = re.compile(r"(\S+) \((\d+)\)")
+_SUMMARY_COUNT = re.compile(r"^(\d+) konuşma")
+
+
+def summary_topics(summary: str) -> Dict[str, int]:
+    return {topic: int(count) for topic, count in _SUMMARY_TOPIC.findall(summary)}
+
+
+def fold_summary(summary: str, exchanges: List[str], max_topics: int) -> str:
+    """
+    Folds evicted exchanges into the rolling summary. Deterministic and
+    bounded: a running exchange count plus the `max_topics` most frequent
+    content words, e.g. "14 konuşma; konular: gezegen (4), güneş (3)".
+    """
+    match = _SUMMARY_COUNT.match(summary)
+    total = (int(match.group(1)) if match else 0) + len(exchanges)
+
+    topics = Counter(summary_topics(summary))
+    for exchange in exchanges:
+        # Topics come from the teacher's side; the student's replies mostly echo templates
+        teacher_text = exchange.split(" | Sen: ")[0].replace("Öğretmen: ", "", 1)
+        for word in set(normalize_text(teacher_text).split()):
+            if len(word) > 3 and word not in _STOPWORDS and not word.isdigit():
+                topics[word] += 1
+
+    top = sorted(topics.items(), key=lambda item: (-item[1], item[0]))[:max_topics]
+    return f"{total} konuşma; konular: " + ", ".join(f"{topic} ({count})" for topic, count in top)
+
+
+class ConversationMemory:
+    """
+    Bounded per-student conversation memory.
+
+    short_term_memory is a fixed-capacity ring: each exchange is appended by
+    the pipeline (under the student's lock) and the oldest entries fall out.
+    Evicted entries are queued here and folded into a single rolling summary
+    in long_term_memory by a background task, one batched state update per
+    round. Memory per student is therefore capped at `capacity` exchanges
+    plus one summary of at most `max_topics` topics, however long the lesson.
+    """
+
+    def __init__(self, capacity: int, max_topics: int, interval_s: float):
+        self.capacity = capacity
+        self.max_topics = max_topics
+        self.interval_s = interval_s
+        # student_id -> evicted exchanges not summarized yet (bounded by the ring size)
+        self._pending: Dict[int, List[str]] = {}
+
+    def record_exchange(self, state: StudentStateModel, teacher_text: str, reply_text: str) -> Dict[str, Any]:
+        """
+        Returns the state update appending this exchange; queues what falls
+        out. The caller holds the student's lock and writes the update.
+        """
+        if not teacher_text:
+            return {}
+        entry = f"Öğretmen: {teacher_text} | Sen: {reply_text}"
+        memory = list(state.short_term_memory) + [entry]
+        overflow = len(memory) - self.capacity
+        updates: Dict[str, Any] = {}
+        if overflow > 0:
+            pending = self._pending.setdefault(state.student_id, [])
+            pending.extend(memory[:overflow])
+            if len(pending) > self.capacity:
+                # Summarizer is lagging far behind: fold the surplus into this update to stay bounded
+                summary = state.long_term_memory[-1] if state.long_term_memory else ""
+                updates["long_term_memory"] = [fold_summary(summary, pending[:-self.capacity], self.max_topics)]
+                del pending[:-self.capacity]
+            memory = memory[overflow:]
+        updates["short_term_memory"] = memory
+        return updates
+
+    def pending_count(self) -> int:
+        return sum(len(entries) for entries in self._pending.values())
+
+    def summarize_pending(self) -> int:
+        """Folds every queued exchange into its student's summary in one batched update."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        state_manager.update_student_states(self._fold(pending, state_manager.get_student_states(pending)))
+        return sum(len(exchanges) for exchanges in pending.values())
+
+    async def summarize_pending_async(self) -> int:
+        """
+        summarize_pending for the event loop: store round-trips do not block
+        it, and the students' locks are held so a decision folding its own
+        surplus (record_exchange) cannot be overwritten.
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        async with state_manager.student_lock(*pending):
+            states = await state_manager.get_student_states_async(pending)
+            await state_manager.update_student_states_async(self._fold(pending, states))
+        return sum(len(exchanges) for exchanges in pending.values())
+
+    def _fold(self, pending: Dict[int, List[str]], states: Dict[int, Any]) -> Dict[int, Dict[str, Any]]:
+        updates = {}
+        for student_id, exchanges in pending.items():
+            state = states.get(student_id)
+            summary = state.long_term_memory[-1] if state and state.long_term_memory else ""
+            updates[student_id] = {"long_term_memory": [fold_summary(summary, exchanges, self.max_topics)]}
+        return updates
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.summarize_pending_async()
+            except Exception as e:
+                print(f"Memory summarizer error: {e}")
+
+conversation_memory = ConversationMemory(
+    capacity=settings.MEMORY_SHORT_TERM_ITEMS,
+    max_topics=settings.MEMORY_SUMMARY_TOPICS,
+    interval_s=settings.MEMORY_SUMMARY_INTERVAL_S
+)
@@ -2,16 +2,24 @@ import time
 import uuid
 import random
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
 
 from models.definitions import (
     TeacherInputRequest, AIResponse, AIResponseMeta, 
-    DecisionTrace, StudentStateModel, UnityResponse
+    DecisionTrace, StudentStateModel, UnityResponse, RoomBatchInputRequest, MOOD_TO_STATE
 )
 from nlp.nlp_analyzer import nlp_analyzer
 from state.manager import state_manager
+from ai.classroom_sim import classroom_sim
+from ai.memory import conversation_memory
+from ai.rule_engine import rule_engine
 from ai.gemini_client import gemini_client
-
+from ai.provider_router import strip_code_fence
+from ai.response_cache import response_cache
+from ai.streaming import ReplyTextExtractor
+from ai.prompt_builder import prompt_builder, BATCH_SYSTEM_PROMPT
+from core.config import settings
+from core.metrics import pipeline_stage_seconds, pipeline_decisions_total
 
 class DecisionPipeline:
     """
@@ -21,48 +29,314 @@ class DecisionPipeline:
     """
 
     def process(self, request: TeacherInputRequest) -> AIResponse:
-        start_time_token = time.perf_counter()
+        """
+        Blocking entry point, kept for scripts and tests outside the event loop.
+        Not serialized per student; servers use process_async.
+        """
+        stage = self._prepare(request)
+
+        # 5. AI Reasoning (rule fast-path, then response cache, provider on a miss)
+        started = time.perf_counter()
+        behavior = self._fast_path_behavior(stage) or self._cached_behavior(stage)
+        if behavior is None:
+            ai_raw_response = self._call_llm(stage)
+            behavior = self._parse_llm_behavior(ai_raw_response, stage)
+        reasoning_result = self._ai_reasoning(stage["nlp_data"], stage["current_state"], stage["rule_result"], behavior)
+        self._record_stage(stage, "ai_reasoning", started)
+
+        return self._finalize(request, stage, reasoning_result)
+
+    async def process_async(self, request: TeacherInputRequest) -> AIResponse:
+        """
+        Event-loop friendly entry point used by the FastAPI handlers.
+        The provider round-trip and state backend I/O are awaited; every other
+        stage is pure CPU work.
+        Decisions for the same student are serialized (state_manager.student_lock),
+        so concurrent REST and WebSocket inputs cannot overwrite each other.
+        """
+        async with state_manager.student_lock(request.student_id):
+            stage = await self._prepare_async(request)
+
+            # 5. AI Reasoning (rule fast-path, then response cache, async provider clients on a miss)
+            started = time.perf_counter()
+            behavior = self._fast_path_behavior(stage) or self._cached_behavior(stage)
+            if behavior is None:
+                ai_raw_response = await self._call_llm_async(stage)
+                behavior = self._parse_llm_behavior(ai_raw_response, stage)
+            reasoning_result = self._ai_reasoning(stage["nlp_data"], stage["current_state"], stage["rule_result"], behavior)
+            self._record_stage(stage, "ai_reasoning", started)
+
+            return await self._finalize_async(request, stage, reasoning_result)
+
+    async def process_streaming(self, request: TeacherInputRequest, on_frame: Callable[[Dict[str, Any]], Awaitable[None]]) -> AIResponse:
+        """
+        Streaming variant of process_async. Emits DECISION_STARTED as soon as the
+        decision exists, REPLY_DELTA frames while provider tokens arrive, and
+        returns the final response for the caller to emit as usual.
+        """
+        async with state_manager.student_lock(request.student_id):
+            stage = await self._prepare_async(request)
+            base_frame = {"decision_id": stage["decision_id"], "student_id": request.student_id}
+            await on_frame({"type": "DECISION_STARTED", **base_frame, "animation": "thinking_pose"})
+
+            # A sleeping student's reply is replaced by the validator, don't leak the draft text
+            show_deltas = stage["current_state"].mood != "sleepy"
+
+            # 5. AI Reasoning (rule fast-path, then response cache, streamed provider tokens on a miss)
+            started = time.perf_counter()
+            behavior = self._fast_path_behavior(stage) or self._cached_behavior(stage)
+            if behavior is not None:
+                if show_deltas:
+                    await on_frame({"type": "REPLY_DELTA", **base_frame, "delta": behavior.get("reply_text", "")})
+            else:
+                from ai.provider_router import provider_router
+                prompt = self._build_prompt(stage)
+
+                extractor = ReplyTextExtractor()
+                async for token in provider_router.stream(prompt["text"], context=prompt["context"], structured=True):
+                    delta = extractor.feed(token)
+                    if delta and show_deltas:
+                        await on_frame({"type": "REPLY_DELTA", **base_frame, "delta": delta})
+                behavior = self._parse_llm_behavior(extractor.buffer or None, stage)
+            reasoning_result = self._ai_reasoning(stage["nlp_data"], stage["current_state"], stage["rule_result"], behavior)
+            self._record_stage(stage, "ai_reasoning", started)
+
+            return await self._finalize_async(request, stage, reasoning_result)
+
+    async def process_batch_async(self, batch: RoomBatchInputRequest) -> List[AIResponse]:
+        """
+        Room-wide variant: one teacher utterance, many students.
+        Fast-path and cache hits are resolved per student; all remaining
+        students share a single structured LLM request that returns one entry
+        per student. Validation, response building and persistence still run
+        per student exactly as in process_async.
+        """
+        requests = [
+            TeacherInputRequest(
+                source=batch.source,
+                teacher_id=batch.teacher_id,
+                student_id=student_id,
+                teacher_action=batch.teacher_action,
+                input_type=batch.input_type,
+                content=batch.content
+            )
+            for student_id in dict.fromkeys(batch.student_ids)
+        ]
+
+        # Students are locked in sorted order, so overlapping batches cannot deadlock
+        async with state_manager.student_lock(*(req.student_id for req in requests)):
+            # 1-2. Context and NLP are identical for everyone in the batch
+            nlp_data = nlp_analyzer.analyze_text(batch.content, context=self._build_context(requests[0]))
+
+            # 3. Student states for the whole room in one backend round-trip
+            started = time.perf_counter()
+            student_ids = [req.student_id for req in requests]
+            await classroom_sim.flush_async(student_ids)
+            states = await state_manager.get_student_states_async(student_ids)
+            missing = [student_id for student_id in student_ids if student_id not in states]
+            if missing:
+                states.update(await state_manager.update_student_states_async({student_id: {} for student_id in missing}))
+            loaded = (started, time.perf_counter())
+            stages = [self._prepare(req, nlp_data=nlp_data, current_state=states[req.student_id], loaded=loaded)
+                      for req in requests]
+
+            # 5. AI Reasoning (rule fast-path and cache per student, one provider call for the rest)
+            behaviors: Dict[int, Dict[str, str]] = {}
+            pending = []
+            for req, stage in zip(requests, stages):
+                started = time.perf_counter()
+                behavior = self._fast_path_behavior(stage) or self._cached_behavior(stage)
+                if behavior is None:
+                    pending.append((req, stage))
+                else:
+                    behaviors[req.student_id] = behavior
+                    self._record_stage(stage, "ai_reasoning", started)
+
+            if pending:
+                # Every pending student waited for the same shared provider call
+                started = time.perf_counter()
+                behaviors.update(await self._batch_llm_behaviors(batch.content, pending))
+                for _, stage in pending:
+                    self._record_stage(stage, "ai_reasoning", started)
+
+            responses = []
+            for req, stage in zip(requests, stages):
+                reasoning_result = self._ai_reasoning(stage["nlp_data"], stage["current_state"], stage["rule_result"], behaviors[req.student_id])
+                responses.append(self._finalize(req, stage, reasoning_result, persist=False))
+
+            # 8. State Persistence, one batched write for the room
+            started = time.perf_counter()
+            persisted = await state_manager.update_student_states_async({req.student_id: stage["updates"] for req, stage in zip(requests, stages)})
+            for state in persisted.values():
+                classroom_sim.observe(state)
+            for stage, response in zip(stages, responses):
+                self._record_stage(stage, "persistence", started)
+                response.meta.stage_timings_ms = dict(stage["timings"])
+            return responses
+
+    async def _batch_llm_behaviors(self, content: str, pending: List[Tuple[TeacherInputRequest, Dict[str, Any]]]) -> Dict[int, Dict[str, str]]:
+        """Single structured provider call answering for every student in `pending`."""
+        import json
+        from ai.provider_router import provider_router
+
+        students = [
+            {
+                "student_id": req.student_id,
+                "mood": stage["current_state"].mood,
+                "attention_level": round(stage["current_state"].attention_level, 2),
+                "energy_level": round(stage["current_state"].energy_level, 2)
+            }
+            for req, stage in pending
+        ]
+        ai_raw_response = await provider_router.generate(
+            content,
+            context=json.dumps(students, ensure_ascii=False),
+            structured=True,
+            system_prompt=BATCH_SYSTEM_PROMPT,
+            max_tokens=min(4096, 80 * len(students))
+        )
+
+        by_student: Dict[int, Dict[str, Any]] = {}
+        if ai_raw_response:
+            try:
+                for item in json.loads(strip_code_fence(ai_raw_response)).get("students", []):
+                    by_student[int(item["student_id"])] = item
+            except Exception as e:
+                print(f"ERROR: Batch AI JSON Parsing failed: {e}. Output was: {ai_raw_response}")
+
+        behaviors = {}
+        for req, stage in pending:
+            item = by_student.get(req.student_id)
+            if item is None:
+                behaviors[req.student_id] = self._parse_llm_behavior(None, stage)
+            else:
+                stage["tier"] = "llm_batch"
+                behaviors[req.student_id] = self._parse_llm_behavior(json.dumps(item), stage)
+        return behaviors
+
+    def _prepare(self, request: TeacherInputRequest, nlp_data: Optional[Dict[str, Any]] = None,
+                 current_state: Optional[StudentStateModel] = None,
+                 loaded: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+        """
+        Stages 1-4: everything that happens before the LLM is consulted.
+        Callers that load current_state themselves pass loaded=(started, finished)
+        of that load, so its timing and the decision latency still include it.
+        """
+        start_time_token = loaded[0] if loaded else time.perf_counter()
         decision_id = str(uuid.uuid4())
+        stage = {"timings": {}}
 
         # 1. Context Builder
+        started = time.perf_counter()
         context = self._build_context(request)
+        self._record_stage(stage, "context", started)
 
-        # 2. NLP / Intent / Emotion Analyzer
-        nlp_data = nlp_analyzer.analyze_text(request.content, context=context)
+        # 2. NLP / Intent / Emotion Analyzer (batches pass a shared, precomputed result)
+        started = time.perf_counter()
+        if nlp_data is None:
+            nlp_data = nlp_analyzer.analyze_text(request.content, context=context)
         intent = nlp_data["intent"]
+        self._record_stage(stage, "nlp", started)
 
-        # 3. Student State Loader
-        current_state = state_manager.get_student_state(request.student_id)
-        if not current_state:
-            current_state = state_manager.update_student_state(request.student_id, {})
+        # 3. Student State Loader (async and batch callers pass the state they loaded)
+        if current_state is None:
+            started = time.perf_counter()
+            # Simulated decay since the last decision must be visible to this one
+            classroom_sim.flush([request.student_id])
+            current_state = state_manager.get_student_state(request.student_id)
+            if not current_state:
+                current_state = state_manager.update_student_state(request.student_id, {})
+            self._record_stage(stage, "state_load", started)
+        elif loaded:
+            self._record_elapsed(stage, "state_load", loaded[1] - loaded[0])
 
         # 4. Rule Engine
+        started = time.perf_counter()
         rule_result = self._apply_rules(intent, current_state)
+        self._record_stage(stage, "rules", started)
 
-        # 5. AI Reasoning (Simulation for now, designed for LLM swap)
-        reasoning_result = self._ai_reasoning(nlp_data, current_state, rule_result)
-        print(f"DEBUG: reasoning_result keys: {reasoning_result.keys()}")
+        stage.update({
+            "start_time": start_time_token,
+            "decision_id": decision_id,
+            "nlp_data": nlp_data,
+            "current_state": current_state,
+            "rule_result": rule_result,
+            "cache_key": None,
+            "cache_status": "bypass",
+            "tier": "llm"
+        })
+        return stage
+
+    async def _prepare_async(self, request: TeacherInputRequest) -> Dict[str, Any]:
+        """_prepare with the state load awaited, so a network backend never blocks the loop."""
+        started = time.perf_counter()
+        await classroom_sim.flush_async([request.student_id])
+        current_state = await state_manager.get_student_state_async(request.student_id)
+        if not current_state:
+            current_state = await state_manager.update_student_state_async(request.student_id, {})
+        return self._prepare(request, current_state=current_state, loaded=(started, time.perf_counter()))
+
+    def _record_stage(self, stage: Dict[str, Any], name: str, started: float):
+        """Stores the stage duration for the debug payload and the /metrics histogram."""
+        self._record_elapsed(stage, name, time.perf_counter() - started)
+
+    def _record_elapsed(self, stage: Dict[str, Any], name: str, elapsed: float):
+        stage["timings"][name] = round(elapsed * 1000, 3)
+        pipeline_stage_seconds.observe(elapsed, stage=name)
+
+    def _finalize(self, request: TeacherInputRequest, stage: Dict[str, Any], reasoning_result: Dict[str, Any],
+                  persist: bool = True) -> AIResponse:
+        """
+        Stages 6-8: validation, response building and persistence.
+        With persist=False the state updates are left in stage["updates"]
+        for the caller to write in bulk.
+        """
+        current_state = stage["current_state"]
+
+        reasoning_result["cache"] = {"status": stage["cache_status"], **response_cache.stats()}
+        reasoning_result["tier"] = stage["tier"]
 
         # 6. Decision Validator
+        started = time.perf_counter()
         validated_decision = self._validate_decision(reasoning_result, current_state)
-        print(f"DEBUG: validated_decision keys: {validated_decision.keys()}")
+        self._record_stage(stage, "validation", started)
 
         # 7. Deterministic Response Builder
+        started = time.perf_counter()
         response = self._build_deterministic_response(
             validated_decision, 
-            decision_id, 
+            stage["decision_id"], 
             request.source,
-            start_time_token,
+            stage["start_time"],
             current_state
         )
+        self._record_stage(stage, "response_build", started)
 
+        # 8. State Persistence (rule updates plus this exchange in the memory ring)
+        validated_decision["updates"] = {
+            **validated_decision.get("updates", {}),
+            **conversation_memory.record_exchange(current_state, validated_decision.get("raw_input", ""), validated_decision["reply_text"])
+        }
+        stage["updates"] = validated_decision["updates"]
+        if persist:
+            started = time.perf_counter()
+            self._persist_state(request.student_id, validated_decision)
+            self._record_stage(stage, "persistence", started)
 
+        response.meta.stage_timings_ms = dict(stage["timings"])
+        pipeline_decisions_total.inc(tier=stage["tier"])
 
+        # 9. Response Emit (handled by caller/WS manager, which adds the "emit" timing)
+        return response
 
-        # 8. State Persistence
-        self._persist_state(request.student_id, validated_decision)
-
-        # 9. Response Emit (handled by caller/WS manager)
+    async def _finalize_async(self, request: TeacherInputRequest, stage: Dict[str, Any],
+                              reasoning_result: Dict[str, Any]) -> AIResponse:
+        """_finalize with the state write awaited."""
+        response = self._finalize(request, stage, reasoning_result, persist=False)
+        started = time.perf_counter()
+        classroom_sim.observe(await state_manager.update_student_state_async(request.student_id, stage["updates"]))
+        self._record_stage(stage, "persistence", started)
+        response.meta.stage_timings_ms = dict(stage["timings"])
         return response
 
     def _build_context(self, request: TeacherInputRequest) -> Dict[str, Any]:
@@ -73,40 +347,73 @@ class DecisionPipeline:
         }
 
     def _apply_rules(self, intent: str, state: StudentStateModel) -> Dict[str, Any]:
-        # Implementation of the "State Transition Table"
-        updates = {"mood": "neutral", "attention_delta": 0.0, "energy_delta": 0.0}
-        
-        if intent == "praise":
-            updates = {"mood": "happy", "attention_delta": 0.2, "energy_delta": 0.1}
-        elif intent == "warn":
-            updates = {"mood": "alert", "attention_delta": 0.3, "energy_delta": -0.05}
-        elif intent == "ignore":
-            updates = {"attention_delta": -0.1}
-        
-        return updates
+        """State Transition Table lookup (ai/transition_rules.json via the rule engine)."""
+        rule = rule_engine.evaluate(intent, state.mood, state.attention_level, state.energy_level)
+        return {"id": rule.id, "updates": dict(rule.updates), "animation": rule.animation}
 
-    def _ai_reasoning(self, nlp: Dict[str, Any], state: StudentStateModel, rules: Dict[str, Any]) -> Dict[str, Any]:
-        """Enhanced reasoning with structured output support."""
-        import json
-        intent = nlp["intent"]
-        raw_text = nlp["raw_text"]
-        
-        # High-priority physical commands should skip LLM if recognized by rules early
-        # but for natural variations, structured AI is better.
-        
-        # Available Animations for the AI to choose from
-        available_animations = ["sit", "stand", "wave", "thinking_pose", "happy_nod", "confused_look", "listening_pose", "idle"]
-        
-        # 1. AI Fallback for Unknown or Complex Queries (Groq > Gemini)
-        from nlp.knowledge_base import knowledge_base
+    def _build_prompt(self, stage: Dict[str, Any]) -> Dict[str, str]:
+        """Budgeted, intent-specific context instead of the whole keyword list."""
+        nlp_data = stage["nlp_data"]
+        return prompt_builder.build(nlp_data["raw_text"], nlp_data["intent"], stage["current_state"])
+
+    def _call_llm(self, stage: Dict[str, Any]) -> Optional[str]:
+        """Blocking provider call (Groq > Gemini)."""
         from ai.groq_client import groq_client
-        from ai.gemini_client import gemini_client
-        kb_context = knowledge_base.get_all_topics()
-        
+        prompt = self._build_prompt(stage)
+
         # We want structured output
-        ai_raw_response = groq_client.generate_response(raw_text, context=str(kb_context), structured=True)
+        ai_raw_response = groq_client.generate_response(prompt["text"], context=prompt["context"], structured=True)
         if not ai_raw_response:
-            ai_raw_response = gemini_client.generate_response(raw_text, context=str(kb_context), structured=True)
+            ai_raw_response = gemini_client.generate_response(prompt["text"], context=prompt["context"], structured=True)
+        return ai_raw_response
+
+    async def _call_llm_async(self, stage: Dict[str, Any]) -> Optional[str]:
+        """Hedged, breaker-aware provider call that never blocks the event loop."""
+        from ai.provider_router import provider_router
+        prompt = self._build_prompt(stage)
+
+        return await provider_router.generate(prompt["text"], context=prompt["context"], structured=True)
+
+    def _fast_path_behavior(self, stage: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """
+        Tier 1 of the tiered decision mode: confidently recognized intents are
+        answered straight from the knowledge base templates, no LLM involved.
+        """
+        from nlp.knowledge_base import knowledge_base
+
+        if settings.DECISION_MODE != "tiered":
+            return None
+
+        nlp_data = stage["nlp_data"]
+        intent = nlp_data["intent"]
+        if intent == "unknown" or intent not in knowledge_base.response_templates:
+            return None
+        # Semantic hits were already gated by SEMANTIC_INTENT_THRESHOLD, their score is a similarity
+        if nlp_data.get("intent_source") != "semantic" and nlp_data.get("confidence", 0.0) < settings.FAST_PATH_MIN_CONFIDENCE:
+            return None
+
+        stage["tier"] = "rule_fast_path"
+        return dict(random.choice(knowledge_base.get_potential_responses(intent)))
+
+    def _cached_behavior(self, stage: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        """Looks up a previously generated behavior for the same phrase/intent/state bucket."""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None
+
+        nlp_data = stage["nlp_data"]
+        stage["cache_key"] = response_cache.make_key(nlp_data["raw_text"], nlp_data["intent"], stage["current_state"])
+        behavior = response_cache.get(stage["cache_key"])
+        stage["cache_status"] = "hit" if behavior else "miss"
+        if behavior:
+            stage["tier"] = "response_cache"
+        return behavior
+
+    def _parse_llm_behavior(self, ai_raw_response: Optional[str], stage: Dict[str, Any]) -> Dict[str, str]:
+        """Turns the raw structured LLM output into a behavior dict, caching clean answers."""
+        import json
+
+        # Available Animations for the AI to choose from
+        available_animations = ["sit", "stand", "wave", "thinking_pose", "happy_nod", "confused_look", "listening_pose", "idle"]
         
         behavior = {
             "reply_text": "...",
@@ -116,12 +423,7 @@ class DecisionPipeline:
 
         if ai_raw_response:
             try:
-                # Sanitize response (sometimes LLMs wrap in code blocks)
-                cleaned = ai_raw_response.strip()
-                if cleaned.startswith("```json"):
-                    cleaned = cleaned.replace("```json", "").replace("```", "").strip()
-                
-                ai_json = json.loads(cleaned)
+                ai_json = json.loads(strip_code_fence(ai_raw_response))
                 behavior["reply_text"] = ai_json.get("reply_text", "...")
                 behavior["animation"] = ai_json.get("animation", "thinking_pose")
                 behavior["emotion"] = ai_json.get("emotion", "neutral")
@@ -133,15 +435,27 @@ class DecisionPipeline:
                     elif "kalk" in behavior["reply_text"].lower(): behavior["animation"] = "stand"
                     else: behavior["animation"] = "thinking_pose"
 
+                # Only well-formed answers are worth replaying
+                if stage["cache_key"] is not None:
+                    response_cache.put(stage["cache_key"], behavior)
+
             except Exception as e:
                 print(f"ERROR: AI JSON Parsing failed: {e}. Output was: {ai_raw_response}")
                 behavior["reply_text"] = ai_raw_response[:100] # Fallback to raw text if parsing fails
+                stage["tier"] = "llm_unparsed"
+        else:
+            stage["tier"] = "llm_unavailable"
+
+        return behavior
+
+    def _ai_reasoning(self, nlp: Dict[str, Any], state: StudentStateModel, rules: Dict[str, Any], behavior: Dict[str, str]) -> Dict[str, Any]:
+        """Combines the chosen behavior with rule overrides into a decision."""
+        intent = nlp["intent"]
+        raw_text = nlp["raw_text"]
         
-        # 2. Rule-based override if intent is a strict command and LLM didn't catch it
-        if intent == "command_sit":
-            behavior["animation"] = "sit"
-        elif intent == "command_stand":
-            behavior["animation"] = "stand"
+        # Rule-based override (e.g. strict commands) in case the LLM didn't catch it
+        if rules["animation"]:
+            behavior["animation"] = rules["animation"]
 
         return {
             "intent": intent,
@@ -149,12 +463,11 @@ class DecisionPipeline:
             "animation": behavior.get("animation", "thinking_pose"),
             "emotion": behavior.get("emotion", "neutral"),
             "confidence": nlp.get("confidence", 0.5),
-            "updates": rules,
+            "updates": rules["updates"],
+            "rule_id": rules["id"],
             "raw_input": raw_text
         }
 
-
-
     def _validate_decision(self, decision: Dict[str, Any], state: StudentStateModel) -> Dict[str, Any]:
         # Coherence Check: Can't dance while sleeping
         if state.mood == "sleepy" and decision["animation"] not in ["sleepy", "yawn"]:
@@ -176,29 +489,20 @@ class DecisionPipeline:
         
         trace = DecisionTrace(
             intent=decision.get("intent", "unknown"),
-            rule_applied="primary_logic",
+            rule_applied=decision.get("rule_id"),
+            tier=decision.get("tier", "primary_logic"),
             state_before=state_data,
-            state_after=state_data  # Updated after persist
+            state_after=state_data,  # Updated after persist
+            cache=decision.get("cache")
         )
 
-        # Map mood to student state
-        mood_to_state = {
-            "happy": "attentive",
-            "neutral": "attentive", 
-            "sad": "confused",
-            "sleepy": "sleepy",
-            "confused": "confused",
-            "motivated": "attentive",
-            "alert": "attentive"
-        }
-
         return AIResponse(
             student_id=state.student_id,
             animation=decision["animation"],
             reply_text=decision["reply_text"],
             emotion=decision["emotion"],
             confidence=decision["confidence"],
-            student_state=mood_to_state.get(state.mood, "idle"),
+            student_state=MOOD_TO_STATE.get(state.mood, "idle"),
             decision_trace=trace,
             meta=AIResponseMeta(
                 timestamp=datetime.now().isoformat(),
@@ -212,6 +516,6 @@ class DecisionPipeline:
 
     def _persist_state(self, student_id: str, decision: Dict[str, Any]):
         updates = decision.get("updates", {})
-        state_manager.update_student_state(student_id, updates)
+        classroom_sim.observe(state_manager.update_student_state(student_id, updates))
 
 pipeline = DecisionPipeline()
@@ -0,0 +1,118 @@
+import math
+from typing import Dict, List
+
+from core.config import settings
+from models.definitions import StudentStateModel
+
+# Static prefixes. They never change between calls, so they are kept byte-identical
+# and always sent first: Groq (system message) and Gemini (system_instruction) can
+# then reuse their cached prefix instead of re-reading it on every decision.
+STUDENT_SYSTEM_PROMPT_STRUCTURED = """Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin.
+Yanıtını MUTLAKA aşağıdaki JSON formatında ver:
+{
+  "reply_text": "yanıt metni",
+  "animation": "animasyon_adı",
+  "emotion": "duygu_adı"
+}
+Kullanabileceğin Animasyonlar: sit, stand, wave, thinking_pose, happy_nod, confused_look, listening_pose.
+Kullanabileceğin Duygular: neutral, happy, sad, confused, sleepy, alert, motivated, regretful.
+Bağlamda senin o anki durumun, ilgili bilgiler ve son konuşmalar verilir; yanıtını bunlara göre ayarla.
+Yanıtın kısa, doğal ve Türkçe olsun."""
+
+STUDENT_SYSTEM_PROMPT_PLAIN = "Sen sanal bir sınıfta meraklı ve dikkatli bir öğrencisin. Kısa ve doğal yanıtlar ver. Türkçe yanıt ver."
+
+BATCH_SYSTEM_PROMPT = """Sanal bir sınıfta birden fazla öğrenciyi canlandırıyorsun. Öğretmen tüm sınıfa konuşuyor.
+Bağlam, her öğrencinin kimliğini ve durumunu (mood, attention_level, energy_level) içeren bir JSON listesidir.
+Her öğrenci için kendi durumuna uygun, kısa ve birbirinden farklı bir yanıt üret.
+Yanıtını MUTLAKA aşağıdaki JSON formatında ver:
+{
+  "students": [
+    {"student_id": 1, "reply_text": "yanıt metni", "animation": "animasyon_adı", "emotion": "duygu_adı"}
+  ]
+}
+Kullanabileceğin Animasyonlar: sit, stand, wave, thinking_pose, happy_nod, confused_look, listening_pose.
+Kullanabileceğin Duygular: neutral, happy, sad, confused, sleepy, alert, motivated, regretful.
+Yanıtlar kısa, doğal ve Türkçe olsun."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; Llama/Gemini tokenizers average ~3 chars per token on Turkish."""
+    return math.ceil(len(text) / 3)
+
+
+def format_user_message(prompt: str, context: str) -> str:
+    """The dynamic part of every request, sent after the static system prefix."""
+    return f"Bağlam: {context}\n\nÖğretmen/Kullanıcı Mesajı: {prompt}"
+
+
+class PromptBuilder:
+    """
+    Builds the dynamic context for a single-student decision under a token budget.
+
+    Sections are added in priority order until the budget is spent:
+    student state (always), knowledge base entries for the detected intent,
+    then recent memory, newest first.
+    """
+
+    def __init__(self, token_budget: int, memory_items: int):
+        self.token_budget = token_budget
+        self.memory_items = memory_items
+
+    def system_prompt(self, structured: bool = True) -> str:
+        return STUDENT_SYSTEM_PROMPT_STRUCTURED if structured else STUDENT_SYSTEM_PROMPT_PLAIN
+
+    def build(self, text: str, intent: str, state: StudentStateModel) -> Dict[str, str]:
+        """Returns the trimmed teacher text plus the budgeted context string."""
+        from nlp.knowledge_base import knowledge_base
+
+        budget = self.token_budget
+        # The teacher's words come first; extremely long transcripts are cut
+        max_text_chars = budget * 3 // 2
+        if len(text) > max_text_chars:
+            text = text[:max_text_chars]
+        budget -= estimate_tokens(text)
+
+        sections: List[str] = []
+
+        def add(section: str) -> bool:
+            nonlocal budget
+            cost = estimate_tokens(section) + 1
+            if cost > budget:
+                return False
+            sections.append(section)
+            budget -= cost
+            return True
+
+        add(
+            f"Durumun: ruh hali={state.mood}, dikkat={state.attention_level:.1f}, "
+            f"enerji={state.energy_level:.1f}, etkinlik={state.current_activity}"
+        )
+
+        if intent != "unknown":
+            _, hits = knowledge_base.find_intent_with_hits(text)
+            keywords = sorted({keyword for _, keyword, _ in hits})
+            examples = [t["reply_text"] for t in knowledge_base.response_templates.get(intent, [])]
+            add(f"Algılanan niyet: {intent}" + (f" (anahtar kelimeler: {', '.join(keywords)})" if keywords else ""))
+            if examples:
+                add("Örnek yanıtlar: " + " | ".join(examples))
+
+        for summary in state.long_term_memory[-1:]:
+            add(f"Önceki konuşmaların özeti: {summary}")
+
+        recent: List[str] = []
+        if state.short_term_memory:
+            budget -= estimate_tokens("Son konuşmalar:")
+        for entry in reversed(state.short_term_memory[-self.memory_items:]):
+            line = f"- {entry}"
+            if not add(line):
+                break
+            recent.append(sections.pop())
+        if recent:
+            sections.append("Son konuşmalar:\n" + "\n".join(reversed(recent)))
+
+        return {"text": text, "context": "\n".join(sections)}
+
+prompt_builder = PromptBuilder(
+    token_budget=settings.PROMPT_TOKEN_BUDGET,
+    memory_items=settings.PROMPT_MEMORY_ITEMS
+)
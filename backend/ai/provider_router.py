@@ -0,0 +1,278 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from core.config import settings
+
+
+def strip_code_fence(raw: str) -> str:
+    """Sanitize response (sometimes LLMs wrap JSON in code blocks)."""
+    cleaned = raw.strip()
+    if cleaned.startswith("```json"):
+        cleaned = cleaned.replace("```json", "").replace("```", "").strip()
+    return cleaned
+
+
+def is_valid_structured_reply(raw: Optional[str]) -> bool:
+    if not raw:
+        return False
+    try:
+        return isinstance(json.loads(strip_code_fence(raw)), dict)
+    except ValueError:
+        return False
+
+
+class CircuitBreaker:
+    """
+    Classic closed -> open -> half-open breaker.
+    Opens after `failure_threshold` consecutive failures and lets a single
+    trial request through once `reset_timeout_s` has elapsed.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow_request(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            self.state = "half_open"
+            self._trial_in_flight = False
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self):
+        """A half-open trial was cancelled before it could prove anything."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """Rolling latency window plus monotonic counters for one provider."""
+
+    def __init__(self, window: int = 256):
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.skipped_open = 0
+        self.latencies_ms: deque = deque(maxlen=window)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies_ms:
+            return None
+        ordered = sorted(self.latencies_ms)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "skipped_open": self.skipped_open,
+            "latency_p50_ms": self.percentile(50),
+            "latency_p95_ms": self.percentile(95)
+        }
+
+
+class _Provider:
+    def __init__(self, name: str, client: Any):
+        self.name = name
+        self.client = client
+        self.stats = ProviderStats()
+        self.breaker = CircuitBreaker(
+            settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            settings.LLM_BREAKER_RESET_S
+        )
+
+
+class ProviderRouter:
+    """
+    Deadline-aware router over the LLM providers, in preference order.
+
+    The primary provider is asked first. If it has not produced a valid answer
+    once the hedge deadline passes (its observed p95, capped by
+    LLM_HEDGE_AFTER_MS), the next provider is asked in parallel. The first valid
+    JSON answer wins and the loser is cancelled. Providers whose breaker is open
+    are skipped entirely.
+    """
+
+    def __init__(self, providers: List[tuple]):
+        self.providers = [_Provider(name, client) for name, client in providers]
+
+    def _hedge_delay_s(self, provider: _Provider) -> float:
+        configured = settings.LLM_HEDGE_AFTER_MS
+        if settings.LLM_HEDGE_ADAPTIVE and len(provider.stats.latencies_ms) >= 20:
+            configured = min(configured, provider.stats.percentile(95))
+        return configured / 1000
+
+    async def _call(self, provider: _Provider, prompt: str, context: str, structured: bool, options: Dict[str, Any]) -> Optional[str]:
+        provider.stats.requests += 1
+        started = time.perf_counter()
+        try:
+            result = await provider.client.generate_response_async(prompt, context=context, structured=structured, **options)
+        except asyncio.CancelledError:
+            # Hedge losers and deadline stragglers end up here
+            provider.stats.cancelled += 1
+            provider.breaker.release_trial()
+            raise
+        except Exception as e:
+            print(f"Provider {provider.name} raised: {e}")
+            result = None
+
+        valid = is_valid_structured_reply(result) if structured else bool(result)
+        if valid:
+            provider.stats.successes += 1
+            provider.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+            provider.breaker.record_success()
+            return result
+
+        provider.stats.errors += 1
+        provider.breaker.record_failure()
+        return None
+
+    async def generate(self, prompt: str, context: str = "", structured: bool = False, **options) -> Optional[str]:
+        """`options` (system_prompt, max_tokens) are passed through to the provider clients."""
+        queue = []
+        for provider in self.providers:
+            if provider.breaker.allow_request():
+                queue.append(provider)
+            else:
+                provider.stats.skipped_open += 1
+        if not queue:
+            return None
+
+        deadline = time.monotonic() + settings.LLM_REQUEST_TIMEOUT_MS / 1000
+        pending: Dict[asyncio.Task, _Provider] = {}
+
+        def launch():
+            provider = queue.pop(0)
+            task = asyncio.create_task(self._call(provider, prompt, context, structured, options))
+            pending[task] = provider
+            return provider
+
+        hedge_at = time.monotonic() + self._hedge_delay_s(launch())
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake_at = min(hedge_at, deadline) if queue else deadline
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=max(0.0, wake_at - now),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for task in done:
+                    pending.pop(task)
+                    result = task.result()
+                    if result is not None:
+                        return result
+
+                # Hedge: either the deadline passed or a provider failed fast
+                if queue and (done or time.monotonic() >= hedge_at):
+                    hedge_at = time.monotonic() + self._hedge_delay_s(launch())
+
+            # Overall deadline exceeded, count the stragglers as timeouts
+            for provider in pending.values():
+                provider.stats.timeouts += 1
+                provider.breaker.record_failure()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            # Providers that were reserved but never asked give their trial slot back
+            for provider in queue:
+                provider.breaker.release_trial()
+
+    async def stream(self, prompt: str, context: str = "", structured: bool = False) -> AsyncIterator[str]:
+        """
+        Streams tokens from the first healthy provider. Once tokens are flowing
+        the answer cannot be hedged, so failover only happens before the first
+        token (error, empty stream or LLM_STREAM_FIRST_TOKEN_MS exceeded).
+        """
+        for provider in self.providers:
+            if not provider.breaker.allow_request():
+                provider.stats.skipped_open += 1
+                continue
+
+            provider.stats.requests += 1
+            started = time.perf_counter()
+            tokens = provider.client.stream_response_async(prompt, context=context, structured=structured)
+            try:
+                try:
+                    first = await asyncio.wait_for(tokens.__anext__(), timeout=settings.LLM_STREAM_FIRST_TOKEN_MS / 1000)
+                except asyncio.TimeoutError:
+                    provider.stats.timeouts += 1
+                    provider.breaker.record_failure()
+                    continue
+                except StopAsyncIteration:
+                    provider.stats.errors += 1
+                    provider.breaker.record_failure()
+                    continue
+                except Exception as e:
+                    print(f"Provider {provider.name} stream failed: {e}")
+                    provider.stats.errors += 1
+                    provider.breaker.record_failure()
+                    continue
+
+                yield first
+                try:
+                    async for token in tokens:
+                        yield token
+                except Exception as e:
+                    # Partial answer already delivered, the caller parses what it got
+                    print(f"Provider {provider.name} stream broke mid-answer: {e}")
+                    provider.stats.errors += 1
+                    provider.breaker.record_failure()
+                    return
+
+                provider.stats.successes += 1
+                provider.stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+                provider.breaker.record_success()
+                return
+            finally:
+                # Consumer may have gone away mid-stream; never leave a half-open trial dangling
+                provider.breaker.release_trial()
+                await tokens.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            provider.name: {**provider.stats.to_dict(), "breaker": provider.breaker.state}
+            for provider in self.providers
+        }
+
+
+def _build_default_router() -> ProviderRouter:
+    from ai.groq_client import groq_client
+    from ai.gemini_client import gemini_client
+    # A client without an API key would only fail and trip its breaker
+    clients = [("groq", groq_client), ("gemini", gemini_client)]
+    return ProviderRouter([(name, client) for name, client in clients if client.configured])
+
+provider_router = _build_default_router()
@@ -0,0 +1,106 @@
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.config import settings
+from models.definitions import StudentStateModel
+from nlp.text_utils import normalize_text
+
+
+class _CacheEntry:
+    __slots__ = ("variants", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.variants: List[Dict[str, str]] = []
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Bounded LRU + TTL cache of structured LLM behaviors.
+
+    Key: (normalized text, intent, mood, quantized attention, quantized energy).
+    Each key keeps up to `max_variants` distinct answers and serves a random one,
+    so repeated phrases don't always get the exact same reply. While a key has
+    room for more variants, a fraction of hits (`explore_rate`) is turned into a
+    miss to collect a new one from the provider.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float, max_variants: int, explore_rate: float, state_buckets: int):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.max_variants = max_variants
+        self.explore_rate = explore_rate
+        self.state_buckets = state_buckets
+        self._entries: "OrderedDict[Tuple, _CacheEntry]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def make_key(self, text: str, intent: str, state: StudentStateModel) -> Tuple:
+        return (
+            normalize_text(text),
+            intent,
+            state.mood,
+            round(state.attention_level * self.state_buckets),
+            round(state.energy_level * self.state_buckets)
+        )
+
+    def get(self, key: Tuple) -> Optional[Dict[str, str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        if len(entry.variants) < self.max_variants and random.random() < self.explore_rate:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(random.choice(entry.variants))
+
+    def put(self, key: Tuple, behavior: Dict[str, str]):
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            entry = _CacheEntry(time.monotonic() + self.ttl_s)
+            self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        if behavior not in entry.variants:
+            if len(entry.variants) >= self.max_variants:
+                entry.variants.pop(0)
+            entry.variants.append(dict(behavior))
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._entries)
+        }
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_s=settings.RESPONSE_CACHE_TTL_S,
+    max_variants=settings.RESPONSE_CACHE_MAX_VARIANTS,
+    explore_rate=settings.RESPONSE_CACHE_EXPLORE_RATE,
+    state_buckets=settings.RESPONSE_CACHE_STATE_BUCKETS
+)
@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Any, Tuple
+
+from core.config import settings
+from models.definitions import EMOTIONS
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "transition_rules.json")
+
+_EFFECT_KEYS = ("mood", "attention_delta", "energy_delta", "animation")
+_CONDITION_KEYS = ("intent", "when_mood", "attention_below", "attention_above", "energy_below", "energy_above", "priority")
+_RULE_KEYS = frozenset(("id",) + _EFFECT_KEYS + _CONDITION_KEYS)
+
+
+class TransitionRule:
+    """One compiled row of the transition table."""
+
+    __slots__ = ("id", "intent", "when_mood", "bounds", "priority", "updates", "animation")
+
+    def __init__(self, spec: Dict[str, Any], default: Dict[str, Any]):
+        unknown = set(spec) - _RULE_KEYS
+        if unknown:
+            raise ValueError(f"Rule {spec.get('id')!r}: unknown keys {sorted(unknown)}")
+        self.id = spec["id"]
+        self.intent = spec.get("intent", "*")
+        self.when_mood = spec.get("when_mood", "*")
+        if self.when_mood != "*" and self.when_mood not in EMOTIONS:
+            raise ValueError(f"Rule {self.id!r}: unknown mood {self.when_mood!r}")
+        self.priority = spec.get("priority", 0)
+        bounds = (
+            spec.get("attention_above"), spec.get("attention_below"),
+            spec.get("energy_above"), spec.get("energy_below")
+        )
+        self.bounds = bounds if any(bound is not None for bound in bounds) else None
+
+        # Effects not given fall back to the default rule; "mood": null leaves the mood unchanged
+        mood = spec["mood"] if "mood" in spec else default.get("mood")
+        if mood is not None and mood not in EMOTIONS:
+            raise ValueError(f"Rule {self.id!r}: unknown mood {mood!r}")
+        self.updates = {
+            "attention_delta": float(spec.get("attention_delta", default.get("attention_delta", 0.0))),
+            "energy_delta": float(spec.get("energy_delta", default.get("energy_delta", 0.0)))
+        }
+        if mood is not None:
+            self.updates["mood"] = mood
+        self.animation = spec.get("animation")
+
+    def specificity(self) -> Tuple[int, int, int, int]:
+        return (self.intent != "*", self.when_mood != "*", self.bounds is not None, self.priority)
+
+    def within(self, attention: float, energy: float) -> bool:
+        attention_above, attention_below, energy_above, energy_below = self.bounds
+        return not (
+            (attention_above is not None and attention <= attention_above)
+            or (attention_below is not None and attention >= attention_below)
+            or (energy_above is not None and energy <= energy_above)
+            or (energy_below is not None and energy >= energy_below)
+        )
+
+
+class DecayRules:
+    """Idle transitions shared by the classroom simulation and StudentAgent."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.low_energy = float(spec.get("low_energy", 0.3))
+        self.low_energy_mood = spec.get("low_energy_mood", "sleepy")
+        self.low_energy_exempt_moods = frozenset(spec.get("low_energy_exempt_moods", ["sleepy", "sad"]))
+        self.low_attention = float(spec.get("low_attention", 0.3))
+        self.low_attention_mood = spec.get("low_attention_mood", "confused")
+        self.low_attention_from_moods = frozenset(spec.get("low_attention_from_moods", ["neutral"]))
+        for mood in {self.low_energy_mood, self.low_attention_mood} | self.low_energy_exempt_moods | self.low_attention_from_moods:
+            if mood not in EMOTIONS:
+                raise ValueError(f"Decay rules: unknown mood {mood!r}")
+
+    def next_mood(self, mood: str, attention: float, energy: float) -> str:
+        """Scalar form of the rules ClassroomSimulation.tick applies to whole rooms."""
+        if energy < self.low_energy and mood not in self.low_energy_exempt_moods:
+            return self.low_energy_mood
+        if attention < self.low_attention and mood in self.low_attention_from_moods:
+            return self.low_attention_mood
+        return mood
+
+
+class RuleEngine:
+    """
+    Declarative state-transition rules (ai/transition_rules.json).
+
+    The table is compiled at load time into a dict keyed by (intent, mood).
+    Each cell holds only the rules that can match it, most specific first,
+    and ends at the first rule without attention/energy bounds, so an
+    evaluation is one dict lookup plus a check of the few bounded rules
+    for that cell, however many rules the table has. The file is re-read
+    when its mtime changes (checked at most every `reload_check_s`); a
+    broken edit keeps the previous table.
+    """
+
+    def __init__(self, path: str = DEFAULT_RULES_PATH, reload_check_s: float = 2.0):
+        self.path = path
+        self.reload_check_s = reload_check_s
+        self.version = 0
+        self._mtime_ns: Optional[int] = None
+        self._next_check = 0.0
+        self.load()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            table = json.load(f)
+        self._compile(table)
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+        self._next_check = time.monotonic() + self.reload_check_s
+        self.version += 1
+
+    def _compile(self, table: Dict[str, Any]):
+        default_spec = table.get("default", {"id": "default"})
+        default = TransitionRule({"intent": "*", **default_spec}, {})
+        rules = [TransitionRule(spec, default_spec) for spec in table.get("rules", [])]
+        ids = [rule.id for rule in rules]
+        if len(ids) != len(set(ids)):
+            raise ValueError("Transition rules: duplicate rule ids")
+
+        # Stable sort: equally specific rules keep their table order
+        ordered = sorted(rules, key=lambda rule: rule.specificity(), reverse=True)
+        dispatch: Dict[Tuple[str, str], List[TransitionRule]] = {}
+        for intent in {rule.intent for rule in rules} | {"*"}:
+            for mood in EMOTIONS:
+                cell = []
+                for rule in ordered:
+                    if rule.intent in (intent, "*") and rule.when_mood in (mood, "*"):
+                        cell.append(rule)
+                        if rule.bounds is None:
+                            break
+                else:
+                    cell.append(default)
+                dispatch[(intent, mood)] = cell
+
+        self.rules = rules
+        self.default = default
+        self.decay = DecayRules(table.get("decay", {}))
+        self._dispatch = dispatch
+
+    def maybe_reload(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.reload_check_s
+        try:
+            if os.stat(self.path).st_mtime_ns == self._mtime_ns:
+                return False
+            self.load()
+            print(f"Transition rules reloaded (version {self.version}, {len(self.rules)} rules)")
+            return True
+        except Exception as e:
+            print(f"Transition rules reload failed, keeping previous table: {e}")
+            return False
+
+    def evaluate(self, intent: str, mood: str, attention: float, energy: float) -> TransitionRule:
+        self.maybe_reload()
+        cell = self._dispatch.get((intent, mood)) or self._dispatch[("*", mood)]
+        for rule in cell:
+            if rule.bounds is None or rule.within(attention, energy):
+                return rule
+        return self.default
+
+rule_engine = RuleEngine(settings.RULES_PATH or DEFAULT_RULES_PATH, settings.RULES_RELOAD_CHECK_S)
@@ -0,0 +1,81 @@
+import re
+import string
+from typing import Optional
+
+_REPLY_KEY = re.compile(r'"reply_text"\s*:\s*"')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_HEX_DIGITS = frozenset(string.hexdigits)
+
+
+def _code_point(digits: str) -> Optional[int]:
+    """The value of a \\u escape's four hex digits, or None if they are not hex (the model wrote garbage)."""
+    if len(digits) != 4 or not _HEX_DIGITS.issuperset(digits):
+        return None
+    return int(digits, 16)
+
+
+class ReplyTextExtractor:
+    """
+    Incrementally pulls the "reply_text" string out of a structured JSON answer
+    while it is still being streamed, so the text can be shown before the
+    object is complete. Only handles the flat shape our system prompt asks for.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos: Optional[int] = None  # Index of the next undecoded char inside the string
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        """Returns the reply text decoded from this chunk (possibly empty)."""
+        self.buffer += chunk
+        if self.done:
+            return ""
+
+        if self._pos is None:
+            match = _REPLY_KEY.search(self.buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        i = self._pos
+        while i < len(self.buffer):
+            char = self.buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char == "\\":
+                if i + 1 >= len(self.buffer):
+                    break  # Wait for the rest of the escape sequence
+                code = self.buffer[i + 1]
+                if code == "u":
+                    if i + 6 > len(self.buffer):
+                        break
+                    point = _code_point(self.buffer[i + 2:i + 6])
+                    if point is None:
+                        point = 0xFFFD  # Malformed escape: keep streaming instead of failing the reply
+                    elif 0xD800 <= point <= 0xDBFF:
+                        # Emoji arrive as a surrogate pair; decode both halves into one character
+                        low = self.buffer[i + 6:i + 12]
+                        if len(low) < 6 and "\\u".startswith(low[:2]):
+                            break  # Wait for the low half
+                        low_point = _code_point(low[2:]) if low.startswith("\\u") else None
+                        if low_point is not None and 0xDC00 <= low_point <= 0xDFFF:
+                            out.append(chr(0x10000 + ((point - 0xD800) << 10) + (low_point - 0xDC00)))
+                            i += 12
+                            continue
+                    if 0xD800 <= point <= 0xDFFF:
+                        point = 0xFFFD  # A lone half cannot be encoded as UTF-8
+                    out.append(chr(point))
+                    i += 6
+                    continue
+                out.append(_ESCAPES.get(code, code))
+                i += 2
+                continue
+            out.append(char)
+            i += 1
+
+        self._pos = i
+        return "".join(out)
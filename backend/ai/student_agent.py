@@ -1,6 +1,7 @@
 from typing import Dict
 from datetime import datetime
 from models.definitions import StudentStateModel, EmotionType
+from .rule_engine import rule_engine
 
 class StudentAgent:
     """
@@ -44,11 +45,8 @@ class StudentAgent:
         if activity:
             state.current_activity = activity
             
-        # 3. Automatic mood decay/shift logic (Rule-based simple AI)
-        if state.energy_level < 0.3 and state.mood not in ["sleepy", "sad"]:
-            state.mood = "sleepy"
-        elif state.attention_level < 0.3 and state.mood == "neutral":
-            state.mood = "confused"
+        # 3. Automatic mood decay/shift logic (shared decay rules of the transition table)
+        state.mood = rule_engine.decay.next_mood(state.mood, state.attention_level, state.energy_level)
             
         state.last_updated = datetime.now()
         self._states[student_id] = state
@@ -23,10 +23,97 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./sql_app.db"
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Student State (state/manager.py, state/backends.py)
+    STATE_BACKEND: str = "memory"  # "memory": this process only, "redis": shared via REDIS_URL across workers
+    STATE_TTL_S: float = 6 * 60 * 60  # Idle students are evicted after this long; 0 keeps them forever
+    STATE_MAX_RETRIES: int = 5  # Optimistic update retries when another worker wrote first
+
+    # Write-behind Persistence (state/persistence.py, SQLite at DATABASE_URL)
+    PERSIST_ENABLED: bool = True
+    PERSIST_FLUSH_MS: int = 1000  # Dirty students are flushed at least this often
+    PERSIST_FLUSH_CHANGES: int = 200  # ...or as soon as this many are dirty
+
+    # Event Log (state/event_log.py)
+    EVENT_LOG_ENABLED: bool = False  # Opt-in: writes to EVENT_LOG_DIR from every process that imports main
+    EVENT_LOG_DIR: str = "./event_log"
+    EVENT_LOG_FLUSH_MS: int = 500  # Buffered events are written at least this often
+    EVENT_LOG_BUFFER_BYTES: int = 256 * 1024  # ...or as soon as the buffer is this large
+    EVENT_LOG_SNAPSHOT_S: float = 15 * 60  # A new segment, opening with a snapshot of every student, this often
+    EVENT_LOG_SEGMENT_BYTES: int = 16 * 1024 * 1024  # ...or when the current segment reaches this size
+    EVENT_LOG_RETENTION_S: float = 7 * 24 * 60 * 60  # Older segments are compacted away
+
+    # Room Sharding (core/sharding.py, run_workers.py)
+    SHARD_ID: typing.Optional[str] = None  # This worker's name; unset = single process, every room is local
+    SHARD_WORKERS: str = ""  # "w0=http://127.0.0.1:9001,w1=http://127.0.0.1:9002": internal URL of every worker
+    SHARD_VNODES: int = 64  # Hash ring points per worker
+    SHARD_FORWARD_TIMEOUT_S: float = 10.0  # REST calls forwarded to the owning worker
+    SHARD_SECRET: typing.Optional[str] = None  # Shared by the workers, not SECRET_KEY; sharding refuses to start without it
+
+    # Classroom Simulation (ai/classroom_sim.py)
+    SIM_ENABLED: bool = True
+    SIM_TICK_HZ: float = 1.0  # Decay ticks per second for all rooms of this process
+    SIM_ATTENTION_DECAY_PER_MIN: float = 0.03  # Attention lost per minute without interaction
+    SIM_ENERGY_DECAY_PER_MIN: float = 0.015  # Energy lost per minute without interaction
+    SIM_FLUSH_S: float = 10.0  # Decayed levels are written back to the state store this often
+
     # AI Keys
     GEMINI_API_KEY: typing.Optional[str] = None
     GROQ_API_KEY: typing.Optional[str] = None
 
+    # LLM Provider Routing (ai/provider_router.py)
+    LLM_REQUEST_TIMEOUT_MS: int = 4000  # Hard deadline for one structured answer
+    LLM_HEDGE_AFTER_MS: int = 800  # Ask the backup provider after this long (upper bound)
+    LLM_HEDGE_ADAPTIVE: bool = True  # Hedge at the primary's observed p95 when it is lower
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 3  # Consecutive errors/timeouts before skipping a provider
+    LLM_BREAKER_RESET_S: float = 30.0  # Time before a half-open trial request is allowed
+    LLM_STREAM_FIRST_TOKEN_MS: int = 1500  # Streaming fails over if no token arrives in time
+
+    # Semantic Intent Tier (nlp/semantic_classifier.py)
+    SEMANTIC_INTENT_ENABLED: bool = True
+    SEMANTIC_INTENT_THRESHOLD: float = 0.5  # Cosine similarity needed to trust the intent and skip the LLM
+    SEMANTIC_INTENT_MARGIN: float = 0.1  # Required lead over the runner-up intent
+
+    # Conversation Memory (ai/memory.py)
+    MEMORY_SHORT_TERM_ITEMS: int = 8  # Ring size: most recent exchanges kept verbatim per student
+    MEMORY_SUMMARY_TOPICS: int = 12  # Topics kept in the rolling long-term summary
+    MEMORY_SUMMARY_INTERVAL_S: float = 5.0  # Evicted exchanges are folded into the summary this often
+
+    # Prompt Builder (ai/prompt_builder.py)
+    PROMPT_TOKEN_BUDGET: int = 400  # Estimated tokens for teacher text + dynamic context
+    PROMPT_MEMORY_ITEMS: int = 6  # Most recent memory entries considered for the context
+
+    # Transition Rules (ai/rule_engine.py)
+    RULES_PATH: typing.Optional[str] = None  # Defaults to ai/transition_rules.json
+    RULES_RELOAD_CHECK_S: float = 2.0  # How often the rules file mtime is checked for hot reload
+
+    # Decision Tiers (ai/pipeline.py)
+    DECISION_MODE: str = "tiered"  # "tiered": KB templates answer known intents, "llm": always ask the LLM
+    FAST_PATH_MIN_CONFIDENCE: float = 0.95  # NLP confidence needed to skip the LLM: explicit actions (1.0) and keyword-only messages (0.95), not keywords inside longer text (0.9). Semantic hits use SEMANTIC_INTENT_THRESHOLD
+
+    # WebSocket Streaming
+    WS_STREAM_REPLIES: bool = False  # Default for STUDENT_INPUT messages without a "stream" flag
+
+    # WebSocket Fan-out (ws/manager.py)
+    WS_SEND_QUEUE_SIZE: int = 256  # Outbound messages queued per connection
+    WS_OVERFLOW_POLICY: str = "drop_oldest"  # Full queue: "drop_oldest", "coalesce" (latest per student) or "disconnect"
+    WS_SEND_TIMEOUT_S: float = 5.0  # A client that takes longer to accept one message is disconnected
+    WS_COALESCE_ROLES: typing.List[str] = []  # Roles sent one FRAME_BATCH per window instead of every message, e.g. ["unity"]
+    WS_COALESCE_WINDOW_MS: float = 33.0  # Batching window of those roles (latest message per student wins)
+
+    # Room Pub/Sub (ws/pubsub.py, ws/broker.py)
+    PUBSUB_BACKEND: str = "local"  # "local": this process only, "broker": ws/broker.py at PUBSUB_URL, "redis": REDIS_URL
+    PUBSUB_URL: str = "tcp://127.0.0.1:7450"  # Broker address for PUBSUB_BACKEND=broker
+    PUBSUB_BATCH_MS: float = 2.0  # Room messages are sent to other workers in one batch per window
+    PUBSUB_BATCH_MAX: int = 256  # A batch this large is sent without waiting for the window
+    PUBSUB_BACKLOG_MAX: int = 4096  # Messages a broker bus keeps while disconnected (oldest dropped beyond)
+
+    # Response Cache (ai/response_cache.py)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2048
+    RESPONSE_CACHE_TTL_S: float = 900.0
+    RESPONSE_CACHE_MAX_VARIANTS: int = 3  # Distinct replies kept per key
+    RESPONSE_CACHE_EXPLORE_RATE: float = 0.25  # Share of hits sent to the LLM while a key has free variant slots
+    RESPONSE_CACHE_STATE_BUCKETS: int = 4  # Attention/energy are quantized to 1/N steps
     
     model_config = SettingsConfigDict(
         env_file=".env",
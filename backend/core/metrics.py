@@ -0,0 +1,202 @@
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans sub-millisecond rule stages up to slow LLM round-trips
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace('"', '\\"')) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every label set of this metric."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            labels = _format_labels(self.labelnames, key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {self._sums[key]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal Prometheus text-format registry; no client library required."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# --- Shared application metrics ---
+pipeline_stage_seconds = registry.histogram(
+    "vc_pipeline_stage_seconds", "Time spent in each decision pipeline stage", ["stage"]
+)
+pipeline_decisions_total = registry.counter(
+    "vc_pipeline_decisions_total", "Decisions produced, by answering tier", ["tier"]
+)
+state_lock_wait_seconds = registry.histogram(
+    "vc_state_lock_wait_seconds", "Time a decision waited for its students' locks", ["scope"]
+)
+persist_flush_seconds = registry.histogram(
+    "vc_persist_flush_seconds", "Write-behind flush transaction time"
+)
+persist_dirty_students = registry.gauge(
+    "vc_persist_dirty_students", "Students changed since the last write-behind flush"
+)
+shard_forwards_total = registry.counter(
+    "vc_shard_forwards_total", "Requests and sockets forwarded to the worker owning their room", ["kind"]
+)
+ws_queue_drops_total = registry.counter(
+    "vc_ws_queue_drops_total", "Outbound WebSocket messages not delivered as queued", ["reason"]
+)
+ws_encodes_total = registry.counter(
+    "vc_ws_encodes_total", "Outbound messages encoded (once per message and wire format)", ["encoding"]
+)
+pubsub_messages_total = registry.counter(
+    "vc_pubsub_messages_total", "Room messages exchanged with other workers over the pub/sub bus", ["direction"]
+)
+stt_seconds = registry.histogram(
+    "vc_stt_seconds", "Speech-to-text transcription time", ["status"]
+)
+llm_requests_total = registry.counter(
+    "vc_llm_requests_total", "Provider calls by outcome", ["provider", "model", "status"]
+)
+llm_request_seconds = registry.histogram(
+    "vc_llm_request_seconds", "Provider call duration", ["provider", "model", "status"]
+)
+llm_tokens_total = registry.counter(
+    "vc_llm_tokens_total", "Tokens reported by the provider", ["provider", "model", "kind"]
+)
+
+
+def observe_llm_call(provider: str, model: str, status: str, duration_s: float,
+                     prompt_tokens: Optional[int] = None, completion_tokens: Optional[int] = None):
+    llm_requests_total.inc(provider=provider, model=model, status=status)
+    llm_request_seconds.observe(duration_s, provider=provider, model=model, status=status)
+    if prompt_tokens:
+        llm_tokens_total.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens_total.inc(completion_tokens, provider=provider, model=model, kind="completion")
@@ -0,0 +1,203 @@
+import asyncio
+import bisect
+import hashlib
+import hmac
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+
+import httpx
+
+from core.config import settings
+from core.metrics import shard_forwards_total
+
+# Set on requests and sockets one worker forwards to another; the receiver
+# always serves them locally, so a membership change in flight cannot loop
+FORWARDED_HEADER = "x-shard-forwarded"
+# Carries SHARD_SECRET on forwarded hops and internal calls; without it the
+# forwarded marker is ignored and /api/v1/internal/shards refuses the call
+SECRET_HEADER = "x-shard-secret"
+# Close code sent to sockets of a room that moved to another worker
+ROOM_MOVED_CLOSE_CODE = 4010
+
+
+def parse_workers(spec: str) -> Dict[str, str]:
+    """'w0=http://127.0.0.1:9001,w1=http://127.0.0.1:9002' -> {"w0": "http://127.0.0.1:9001", ...}"""
+    workers = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, url = item.partition("=")
+        if not name or not url:
+            raise ValueError(f"Invalid SHARD_WORKERS entry: {item!r}")
+        workers[name.strip()] = url.strip().rstrip("/")
+    return workers
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of room ids onto workers. Each worker owns `vnodes`
+    points on the ring, so rooms spread evenly and adding a worker moves
+    only about 1/N of the rooms, all of them to the new worker.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class ShardRouter:
+    """
+    Which worker process owns which room, and forwarding to it.
+
+    Without SHARD_ID/SHARD_WORKERS every room is local (single process).
+    Otherwise each worker owns the rooms the hash ring assigns to it: their
+    student state, simulation rows and sockets live only there. A REST call
+    or socket that lands on another worker (e.g. through a shared
+    SO_REUSEPORT port) is forwarded to the owner's internal URL.
+    """
+
+    def __init__(self, shard_id: Optional[str], workers: Dict[str, str], secret: Optional[str] = None,
+                 vnodes: int = 64, forward_timeout_s: float = 10.0):
+        self.shard_id = shard_id
+        self.secret = secret
+        self.vnodes = vnodes
+        self.forward_timeout_s = forward_timeout_s
+        self.workers: Dict[str, str] = {}
+        self.ring = HashRing(vnodes=vnodes)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.set_workers(workers)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.shard_id) and len(self.workers) > 1
+
+    def set_workers(self, workers: Dict[str, str]) -> List[str]:
+        """Installs a new membership; returns the ids of workers that joined."""
+        if self.shard_id and workers and self.shard_id not in workers:
+            raise ValueError(f"Membership does not include this worker ({self.shard_id})")
+        if self.shard_id and len(workers) > 1 and not self.secret:
+            raise ValueError("SHARD_SECRET must be set to run several workers")
+        joined = [name for name in workers if name not in self.workers]
+        ring = HashRing(sorted(workers), self.vnodes)
+        self.workers, self.ring = dict(workers), ring
+        return joined
+
+    def owner(self, room_id: str) -> Optional[str]:
+        return self.ring.owner(room_id) if self.enabled else self.shard_id
+
+    def is_local(self, room_id: str) -> bool:
+        return not self.enabled or self.ring.owner(room_id) == self.shard_id
+
+    def authorized(self, headers: Any) -> bool:
+        """Whether a request carries this cluster's SHARD_SECRET (never true without one)."""
+        if not self.secret:
+            return False
+        return hmac.compare_digest(headers.get(SECRET_HEADER, "").encode("utf-8"), self.secret.encode("utf-8"))
+
+    def should_forward(self, room_id: str, headers: Any) -> bool:
+        if self.is_local(room_id):
+            return False
+        # Only another worker can mark a hop as forwarded; a client setting the header is routed as usual
+        return not (FORWARDED_HEADER in headers and self.authorized(headers))
+
+    def _hop_headers(self) -> Dict[str, str]:
+        return {FORWARDED_HEADER: self.shard_id, SECRET_HEADER: self.secret}
+
+    # --- Forwarding ---
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.forward_timeout_s)
+        return self._client
+
+    async def forward_json(self, room_id: str, path: str, payload: Any) -> Tuple[int, Any]:
+        """POSTs a REST call to the room's owner; returns (status, JSON body)."""
+        owner = self.ring.owner(room_id)
+        shard_forwards_total.inc(kind="http")
+        response = await self._http().post(
+            self.workers[owner] + path, json=payload, headers=self._hop_headers()
+        )
+        return response.status_code, response.json()
+
+    async def proxy_websocket(self, websocket, room_id: str, path: str):
+        """Relays an accepted client socket to the room's owner until either side closes."""
+        from websockets.asyncio.client import connect
+        from websockets.exceptions import ConnectionClosed
+        from fastapi import WebSocketDisconnect
+
+        owner = self.ring.owner(room_id)
+        url = self.workers[owner].replace("http", "ws", 1) + path
+        if websocket.url.query:
+            url += "?" + websocket.url.query
+        shard_forwards_total.inc(kind="websocket")
+
+        async with connect(url, additional_headers=self._hop_headers()) as upstream:
+            async def client_to_owner():
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    if message.get("text") is not None:
+                        await upstream.send(message["text"])
+                    elif message.get("bytes") is not None:
+                        await upstream.send(message["bytes"])
+
+            async def owner_to_client():
+                async for message in upstream:
+                    if isinstance(message, bytes):
+                        await websocket.send_bytes(message)
+                    else:
+                        await websocket.send_text(message)
+                # The owner closed (e.g. ROOM_MOVED): pass its close code on
+                await websocket.close(code=upstream.close_code or 1000)
+
+            tasks = [asyncio.create_task(client_to_owner()), asyncio.create_task(owner_to_client())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            except (ConnectionClosed, WebSocketDisconnect):
+                pass
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+shard_router = ShardRouter(
+    settings.SHARD_ID,
+    parse_workers(settings.SHARD_WORKERS),
+    secret=settings.SHARD_SECRET,
+    vnodes=settings.SHARD_VNODES,
+    forward_timeout_s=settings.SHARD_FORWARD_TIMEOUT_S
+)
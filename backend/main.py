@@ -1,16 +1,140 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from core.config import settings
-from models.definitions import TeacherInputRequest, AIResponse, UnityResponse
+from core.metrics import registry, pipeline_stage_seconds
+from core.sharding import shard_router, ROOM_MOVED_CLOSE_CODE
+from typing import Dict, List, Optional
+from models.definitions import TeacherInputRequest, RoomBatchInputRequest, AIResponse, UnityResponse, MOOD_TO_STATE
 from ai.pipeline import pipeline
+from ai.provider_router import provider_router
+from ai.classroom_sim import classroom_sim
+from ai.memory import conversation_memory
+from state.persistence import WriteBehindPersister, create_persister
+from state.event_log import event_log
+from state.manager import state_manager
 from ws.manager import manager
+from ws.encoding import OutboundMessage
 from security.auth import get_current_user, check_role
 from services.voice_processor import voice_processor
 
+UNITY_FIELDS = tuple(field for field in UnityResponse.model_fields if field != "meta")
+
+# Opened in lifespan(), so importing the app (e.g. in tests) never touches the database
+state_persister: Optional[WriteBehindPersister] = None
+
+async def run_classroom_sim():
+    """Ticks every tracked room and pushes students whose student_state changed."""
+    interval = 1.0 / settings.SIM_TICK_HZ
+    last_tick = last_flush = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        try:
+            changes = classroom_sim.tick(now - last_tick)
+            if changes:
+                # Mood transitions are persisted right away, plain decay lazily below
+                await classroom_sim.flush_async([s["student_id"] for students in changes.values() for s in students])
+            for room_id, students in changes.items():
+                # One encoding per wire format, shared by both roles
+                message = OutboundMessage({"type": "STATE_UPDATE", "room_id": room_id, "students": students}, schema="state_update")
+                await manager.send_state(room_id, "unity", message, students)
+                await manager.send_to_role(room_id, "debug", message)
+            if now - last_flush >= settings.SIM_FLUSH_S:
+                await classroom_sim.flush_async()
+                last_flush = now
+        except Exception as e:
+            print(f"Classroom simulation error: {e}")
+        last_tick = now
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global state_persister
+    state_persister = create_persister()
+    sim_task = asyncio.create_task(run_classroom_sim()) if settings.SIM_ENABLED else None
+    memory_task = asyncio.create_task(conversation_memory.run())
+    if state_persister:
+        state_persister.start()
+    if event_log:
+        event_log.start()
+    await manager.bus.start()
+    yield
+    if sim_task:
+        sim_task.cancel()
+        await classroom_sim.flush_async()
+    memory_task.cancel()
+    await conversation_memory.summarize_pending_async()
+    if state_persister:
+        # Last write-behind flush, so a restart resumes the lesson
+        await state_persister.stop()
+        state_persister.close()
+        state_persister = None
+    if event_log:
+        await event_log.stop()
+    await manager.bus.stop()
+    await shard_router.close()
+
+
+async def warm_room(room_id: str):
+    """Restores a room's persisted students the first time it is used (no-op afterwards)."""
+    if not state_persister:
+        return
+    await state_persister.warm_room(room_id)
+    # Students of the room the state stream has not seen yet (e.g. restored ones) join it
+    known = manager.state_streams.known_students(room_id)
+    students = [student_id for student_id in state_persister.room_students(room_id) if student_id not in known]
+    if students:
+        await manager.send_state(room_id, "unity", None, [
+            {
+                "student_id": student_id,
+                "emotion": state.mood,
+                "student_state": MOOD_TO_STATE.get(state.mood, "idle"),
+                "attention_level": round(state.attention_level, 3),
+                "energy_level": round(state.energy_level, 3)
+            }
+            for student_id, state in (await state_manager.get_student_states_async(students)).items()
+        ])
+
+
+async def handoff_room(room_id: str):
+    """
+    Gives up a room that now belongs to another worker: clients are told to
+    reconnect, decayed state and memory are written and persisted, and the
+    room's students leave this process so the owner warm-loads them.
+    """
+    owner = shard_router.owner(room_id)
+    for connection in list(manager.rooms.get(room_id, ())):
+        manager.close_connection(connection, {"type": "ROOM_MOVED", "room_id": room_id, "owner": owner}, ROOM_MOVED_CLOSE_CODE)
+
+    students = set(classroom_sim.room_students(room_id))
+    await classroom_sim.drop_room_async(room_id)
+    manager.state_streams.drop_room(room_id)
+    await conversation_memory.summarize_pending_async()
+    if state_persister:
+        await state_persister.flush()
+        students.update(state_persister.release_room(room_id))
+    if settings.STATE_BACKEND == "memory":
+        # A shared store (Redis) stays authoritative; only process-local copies go
+        state_manager.evict_students(students)
+    print(f"Room {room_id} handed off to {owner} ({len(students)} students)")
+
+
+def local_rooms() -> set:
+    rooms = set(manager.rooms) | set(classroom_sim.rooms())
+    if state_persister:
+        rooms |= state_persister.rooms()
+    return rooms
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.API_VERSION,
-    description="Backend for Virtual Classroom AI System"
+    description="Backend for Virtual Classroom AI System",
+    lifespan=lifespan
 )
 
 # CORS Setup
@@ -22,21 +146,92 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def emit_decision(room_id: str, response: AIResponse):
+    """Fan a decision out: strict contract to Unity, full response with trace to Debug."""
+    # Students that were addressed in a room keep decaying there between decisions
+    await classroom_sim.track_async(room_id, response.student_id)
+    if state_persister:
+        state_persister.note_room(room_id, response.student_id)
+    # Dumped once: the Debug payload, the event log and the Unity payload all read this dict
+    decision = response.model_dump()
+    meta = decision["meta"]
+    if event_log:
+        event_log.log_decision(room_id, decision)
+    # Strict Unity contract (UnityResponse): no trace, only latency and id in meta
+    payload = {field: decision[field] for field in UNITY_FIELDS}
+    payload["meta"] = {"latency_ms": meta["latency_ms"], "decision_id": meta["decision_id"]}
+    started = time.perf_counter()
+    # Keyed by student: under the coalesce policy a lagging client only gets the latest decision
+    await manager.send_state(room_id, "unity", OutboundMessage(payload, schema="decision"),
+                             [{**payload, "decision_id": meta["decision_id"]}], key=response.student_id)
+    elapsed = time.perf_counter() - started
+    pipeline_stage_seconds.observe(elapsed, stage="emit")
+    if response.meta.stage_timings_ms is not None:
+        response.meta.stage_timings_ms["emit"] = meta["stage_timings_ms"]["emit"] = round(elapsed * 1000, 3)
+    await manager.send_to_role(room_id, "debug", decision)
+
 @app.get("/")
 async def root():
     return {"status": "ok", "message": "Virtual Classroom AI Backend is running."}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition: stage latencies, decision tiers, STT and provider calls."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/v1/debug/rooms/{room_id}")
+async def room_stats(room_id: str):
+    """Outbound queue depth and dropped/coalesced message counts per client of a room."""
+    return manager.room_stats(room_id)
+
+@app.get("/api/v1/debug/providers")
+async def provider_stats():
+    """Per-provider latency percentiles, error/timeout counters and breaker state."""
+    return provider_router.get_stats()
+
+@app.get("/api/v1/internal/shards")
+async def shard_status(http_request: Request):
+    """This worker's view of the shard membership and the rooms it currently hosts."""
+    if not shard_router.authorized(http_request.headers):
+        raise HTTPException(status_code=403, detail="Invalid shard secret")
+    return {
+        "shard_id": shard_router.shard_id,
+        "workers": shard_router.workers,
+        "rooms": sorted(local_rooms())
+    }
+
+@app.post("/api/v1/internal/shards")
+async def rebalance_shards(workers: Dict[str, str], http_request: Request):
+    """Installs a new worker membership and hands off rooms this worker no longer owns."""
+    if not shard_router.authorized(http_request.headers):
+        raise HTTPException(status_code=403, detail="Invalid shard secret")
+    try:
+        joined = shard_router.set_workers(workers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    moved = [room_id for room_id in sorted(local_rooms()) if not shard_router.is_local(room_id)]
+    for room_id in moved:
+        await handoff_room(room_id)
+    return {"shard_id": shard_router.shard_id, "joined": joined, "moved_rooms": moved}
+
 @app.post("/api/v1/teacher/input", response_model=AIResponse)
 async def process_teacher_input(
-    request: TeacherInputRequest
+    request: TeacherInputRequest,
+    http_request: Request
 ):
     """REST endpoint for manual teacher overrides. Auth disabled in DEBUG mode."""
+    # In a real setup, room_id would be in the request or derived from user
+    room_id = "room_001"
+    if shard_router.should_forward(room_id, http_request.headers):
+        status, body = await shard_router.forward_json(room_id, http_request.url.path, request.model_dump(mode="json"))
+        return JSONResponse(body, status_code=status)
 
     try:
         # Handle Voice Input if necessary
         if request.input_type == "voice":
             print(f"DEBUG: Processing voice input from {request.source}")
-            transcribed_text = voice_processor.process_base64_audio(request.content)
+            # STT is a blocking SDK call, keep it off the event loop
+            transcribed_text = await asyncio.to_thread(voice_processor.process_base64_audio, request.content)
             if transcribed_text:
                 print(f"DEBUG: Transcribed text: {transcribed_text}")
                 request.content = transcribed_text
@@ -45,29 +240,11 @@ async def process_teacher_input(
                 print("WARNING: Voice transcription failed, using empty content.")
                 request.content = ""
 
-        response = pipeline.process(request)
+        await warm_room(room_id)
+        response = await pipeline.process_async(request)
         
         # BROADCAST: Send the response to Unity and Debug Dashboard
-        # In a real setup, room_id would be in the request or derived from user
-        room_id = "room_001" 
-        
-        # 1. Send full response to Debug Dashboard
-        await manager.send_to_role(room_id, "debug", response.model_dump())
-        
-        # 2. Send simplified response to Unity
-        unity_payload = UnityResponse(
-            student_id=response.student_id,
-            animation=response.animation,
-            reply_text=response.reply_text,
-            emotion=response.emotion,
-            confidence=response.confidence,
-            student_state=response.student_state,
-            meta={
-                "latency_ms": response.meta.latency_ms,
-                "decision_id": response.meta.decision_id
-            }
-        )
-        await manager.send_to_role(room_id, "unity", unity_payload.model_dump())
+        await emit_decision(room_id, response)
 
         return response
     except Exception as e:
@@ -75,23 +252,68 @@ async def process_teacher_input(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/teacher/batch_input", response_model=List[AIResponse])
+async def process_teacher_batch_input(
+    request: RoomBatchInputRequest,
+    http_request: Request
+):
+    """Room-wide teacher input: one LLM call answers for every targeted student."""
+    if shard_router.should_forward(request.room_id, http_request.headers):
+        status, body = await shard_router.forward_json(request.room_id, http_request.url.path, request.model_dump(mode="json"))
+        return JSONResponse(body, status_code=status)
+
+    try:
+        if request.input_type == "voice":
+            transcribed_text = await asyncio.to_thread(voice_processor.process_base64_audio, request.content)
+            request.content = transcribed_text or ""
+
+        await warm_room(request.room_id)
+        responses = await pipeline.process_batch_async(request)
+        for response in responses:
+            await emit_decision(request.room_id, response)
+        return responses
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.websocket("/ws/v1/classroom/{room_id}")
 async def classroom_socket(
     websocket: WebSocket, 
     room_id: str, 
-    token: str = Query(...)
+    token: str = Query(...),
+    encoding: Optional[str] = Query(None),
+    state: Optional[str] = Query(None)
 ):
     """Main real-time gateway for Unity and Web clients."""
-    user = await manager.connect(websocket, room_id, token)
+    if shard_router.should_forward(room_id, websocket.headers):
+        # Another worker owns this room: relay the socket there untouched
+        await websocket.accept()
+        try:
+            await shard_router.proxy_websocket(websocket, room_id, websocket.url.path)
+        except Exception as e:
+            print(f"WS forward error: {e}")
+            try:
+                await websocket.close(code=1011)
+            except RuntimeError:
+                pass  # Already closed
+        return
+
+    user = await manager.connect(websocket, room_id, token, encoding, state)
     if not user:
         return
+    await warm_room(room_id)
 
     try:
         # Send initial snapshot if Unity
         if user["role"] == "unity":
-            await websocket.send_json({"type": "INIT_SUCCESS", "message": "Unity connected"})
+            manager.send_personal(websocket, {
+                "type": "INIT_SUCCESS", "message": "Unity connected",
+                "encoding": manager.client_encoding(websocket)
+            })
+        # Delta clients start from a full snapshot of the room
+        manager.sync_state(websocket)
 
         while True:
             data = await websocket.receive_json()
@@ -103,7 +325,7 @@ async def classroom_socket(
                 
                 # Process voice if needed
                 if input_type == "voice" and content:
-                    transcribed_text = voice_processor.process_base64_audio(content)
+                    transcribed_text = await asyncio.to_thread(voice_processor.process_base64_audio, content)
                     content = transcribed_text or ""
                     print(f"DEBUG WS: Transcribed voice to: {content}")
 
@@ -115,33 +337,45 @@ async def classroom_socket(
                     content=content,
                     input_type=input_type
                 )
-                response = pipeline.process(req)
+                if data.get("stream", settings.WS_STREAM_REPLIES):
+                    # Partial frames go to Unity as soon as they exist
+                    async def emit_partial(frame: dict):
+                        await manager.send_to_role(room_id, "unity", frame)
+                    response = await pipeline.process_streaming(req, emit_partial)
+                else:
+                    response = await pipeline.process_async(req)
                 
-                # 2. Strict Contract Enforcement for Unity
-                unity_payload = UnityResponse(
-                    student_id=response.student_id,
-                    animation=response.animation,
-                    reply_text=response.reply_text,
-                    emotion=response.emotion,
-                    confidence=response.confidence,
-                    student_state=response.student_state,
-                    meta={
-                        "latency_ms": response.meta.latency_ms,
-                        "decision_id": response.meta.decision_id
-                    }
+                # 2. Emit (Unity contract + full trace for Debug)
+                await emit_decision(room_id, response)
+
+            elif data.get("type") == "RESYNC_REQUEST":
+                # The client saw a gap in the STATE_DELTA seq: start it over from a snapshot
+                manager.sync_state(websocket)
+
+            elif data.get("type") == "CLASS_INPUT":
+                # Whole-class utterance: one batched decision for all targeted students
+                batch = RoomBatchInputRequest(
+                    source="unity",
+                    teacher_id="system",
+                    room_id=room_id,
+                    student_ids=[int(sid) for sid in data["student_ids"]],
+                    content=data.get("text", ""),
+                    teacher_action=data.get("teacher_action")
                 )
-                
-                # 3. Emit
-                # To Unity Client
-                await manager.send_to_role(room_id, "unity", unity_payload.model_dump())
-                # To Debug Dashboard (Full response with trace)
-                await manager.send_to_role(room_id, "debug", response.model_dump())
+                for response in await pipeline.process_batch_async(batch):
+                    await emit_decision(room_id, response)
 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
         print(f"WS Error: {e}")
         manager.disconnect(websocket)
+    if not manager.rooms.get(room_id):
+        # Nobody left to watch the room; stop simulating it
+        await classroom_sim.drop_room_async(room_id)
+        manager.state_streams.drop_room(room_id)
+        if state_persister:
+            state_persister.forget_room(room_id)
 
 if __name__ == "__main__":
     import uvicorn
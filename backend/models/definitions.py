@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, Literal, List, get_args
 from datetime import datetime
 
 # --- Enums (defined as Literals for simplicity in JSON) ---
@@ -8,6 +8,19 @@ InputSourceType = Literal["unity", "web"]
 InputTypeType = Literal["text", "voice"]
 EmotionType = Literal["neutral", "happy", "sad", "confused", "sleepy", "alert", "motivated", "regretful"]
 StudentStateType = Literal["attentive", "sleepy", "confused", "successful", "idle", "disruptive"]
+EMOTIONS = get_args(EmotionType)
+STUDENT_STATES = get_args(StudentStateType)
+
+# Derived Unity student_state per mood; anything unlisted is "idle"
+MOOD_TO_STATE: Dict[str, str] = {
+    "happy": "attentive",
+    "neutral": "attentive",
+    "sad": "confused",
+    "sleepy": "sleepy",
+    "confused": "confused",
+    "motivated": "attentive",
+    "alert": "attentive"
+}
 
 # --- Input Models ---
 class TeacherInputRequest(BaseModel):
@@ -18,12 +31,24 @@ class TeacherInputRequest(BaseModel):
     input_type: InputTypeType = Field("text", description="Type of input: text or voice")
     content: str = Field(..., description="The actual text content or command payload")
 
+class RoomBatchInputRequest(BaseModel):
+    """One teacher utterance addressed to several students of a room at once."""
+    source: InputSourceType = Field("web", description="Source of the request")
+    teacher_id: str = Field(..., description="ID of the teacher sending the command")
+    room_id: str = Field("room_001", description="Room whose clients receive the results")
+    student_ids: List[int] = Field(..., min_length=1, description="IDs of the targeted students")
+    teacher_action: Optional[TeacherActionType] = Field(None, description="Explicit action type if available (e.g. from button click)")
+    input_type: InputTypeType = Field("text", description="Type of input: text or voice")
+    content: str = Field(..., description="The actual text content or command payload")
+
 # --- State & Logic Models ---
 class DecisionTrace(BaseModel):
     intent: str = Field(..., description="The detected intent from NLP")
     rule_applied: Optional[str] = Field(None, description="ID of the rule that triggered")
+    tier: Optional[str] = Field(None, description="Which tier produced the behavior (rule_fast_path, response_cache, llm, ...)")
     state_before: Dict[str, Any] = Field(..., description="Student state before processing")
     state_after: Dict[str, Any] = Field(..., description="Student state after processing")
+    cache: Optional[Dict[str, Any]] = Field(None, description="Response cache status for this decision plus running hit/miss counters")
 
 class StudentStateModel(BaseModel):
     student_id: int
@@ -44,6 +69,7 @@ class AIResponseMeta(BaseModel):
     latency_ms: int = 0
     decision_id: str = ""
     transcribed_text: Optional[str] = None
+    stage_timings_ms: Optional[Dict[str, float]] = None  # Per pipeline stage, for the Debug Dashboard
 
 class AIResponse(BaseModel):
     """Internal full response model with trace for Debug Dashboard."""
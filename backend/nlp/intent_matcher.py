@@ -0,0 +1,111 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .text_utils import normalize_text
+
+
+class IntentMatcher:
+    """
+    Aho-Corasick automaton over the knowledge base keywords.
+
+    Built once from the keyword map; matching is a single pass over the
+    normalized text, so cost grows with the text length, not with the number
+    of keywords. A hit only counts when it is a whole word ("soru" does not
+    fire in "sorun", "sus" not in "susuz"). Keywords listed in `stems` are
+    verb stems and may also carry Turkish suffixes ("otur" matches "oturur").
+    """
+
+    def __init__(self, keyword_map: Dict[str, str], priorities: Optional[Dict[str, int]] = None,
+                 stems: Iterable[str] = ()):
+        self.priorities = priorities or {}
+        self._stems: Set[str] = {normalize_text(word) for word in stems}
+
+        # Trie: per-node transition dict, failure link and the keywords ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]
+
+        for keyword, intent in keyword_map.items():
+            self._insert(normalize_text(keyword), intent)
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, intent: str):
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((keyword, intent))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Inherit matches of the longest proper suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str, str]]:
+        """Returns (start, keyword, intent) for every boundary-respecting hit."""
+        normalized = normalize_text(text)
+        hits = []
+        node = 0
+        for end, char in enumerate(normalized):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for keyword, intent in self._out[node]:
+                start = end - len(keyword) + 1
+                if start > 0 and normalized[start - 1] != " ":
+                    continue
+                if keyword not in self._stems and end + 1 < len(normalized) and normalized[end + 1] != " ":
+                    continue
+                hits.append((start, keyword, intent))
+        return hits
+
+    def covers(self, text: str, hits: List[Tuple[int, str, str]]) -> bool:
+        """
+        True when every word of the text starts inside a hit, i.e. the
+        message is nothing but intent keywords ("Ayağa kalk!", not
+        "Merhaba, fotosentez nedir?").
+        """
+        normalized = normalize_text(text)
+        covered = set()
+        for start, keyword, _ in hits:
+            covered.update(range(start, start + len(keyword)))
+        word_start = 0
+        for word in normalized.split(" "):
+            if word and word_start not in covered:
+                return False
+            word_start += len(word) + 1
+        return bool(normalized)
+
+    def best_intent(self, text: str) -> Tuple[str, List[Tuple[int, str, str]]]:
+        """
+        Scores every hit by its intent priority (longer keywords break ties)
+        and returns the winning intent together with all hits.
+        """
+        hits = self.find_all(text)
+        if not hits:
+            return "unknown", hits
+
+        scores: Dict[str, float] = {}
+        first_seen: Dict[str, int] = {}
+        for start, keyword, intent in hits:
+            scores[intent] = scores.get(intent, 0.0) + self.priorities.get(intent, 1) + len(keyword) / 100
+            first_seen.setdefault(intent, start)
+        best = max(scores, key=lambda intent: (scores[intent], -first_seen[intent]))
+        return best, hits
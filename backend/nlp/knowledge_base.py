@@ -1,5 +1,6 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import random
+from .intent_matcher import IntentMatcher
 
 class KnowledgeBase:
     """
@@ -26,10 +27,46 @@ class KnowledgeBase:
             "kalk": "command_stand",
             "ayağa": "command_stand",
             "yerine": "command_sit",
-            "sessiz": "discipline",
             "sus": "discipline",
         }
+
+        # When several intents match, the higher priority wins (default 1).
+        # Physical commands outrank everything so "Aferin, otur" still sits.
+        self.intent_priority: Dict[str, int] = {
+            "command_sit": 4,
+            "command_stand": 4,
+            "discipline": 3,
+            "correction": 2,
+            "praise": 2,
+            "comprehension_check": 2,
+        }
+
+        # Keywords match whole words only. These verb stems may also carry
+        # suffixes ("oturur", "kalkar"); a stem like "soru" or "dinle" would
+        # fire in "sorun" and "dinlendin", so only unambiguous ones are listed.
+        self.stem_keywords: List[str] = ["otur", "kalk"]
         
+        # Labelled example utterances for the semantic intent tier.
+        # "unknown" examples are negatives: open questions that need the LLM.
+        self.intent_examples: Dict[str, List[str]] = {
+            "greeting": ["Merhaba çocuklar", "Günaydın sınıf", "Selam, herkes nasıl", "İyi dersler arkadaşlar"],
+            "status_check": ["Nasılsın bugün", "Her şey yolunda mı", "Kendini nasıl hissediyorsun", "İyi misin"],
+            "comprehension_check": ["Anladın mı", "Konu anlaşıldı mı", "Bu kısmı kavrayabildin mi", "Açık mı şimdi", "Takıldığın bir yer var mı"],
+            "request_repeat": ["Tekrar eder misin", "Bir daha söyle", "Son cümleni yinele", "Baştan anlat bakalım"],
+            "praise": ["Aferin sana", "Çok güzel olmuş", "Harika bir cevap", "Tebrik ederim", "Bravo, çok iyi", "Mükemmel iş çıkardın"],
+            "correction": ["Bu yanlış oldu", "Hayır, öyle değil", "Doğru cevap bu değil", "Bir hata yaptın"],
+            "discipline": ["Sessiz ol", "Sus artık", "Konuşmayı kes", "Gürültü yapmayın", "Yeter, toparlanın", "Arkadaşını rahatsız etme"],
+            "attention_command": ["Beni dinle", "Buraya bak", "Tahtaya bak", "Bana bakar mısın", "Dikkatini tahtaya ver", "Odaklan lütfen"],
+            "question_expectation": ["Sana bir soru soracağım", "Soruyu cevapla", "Kim cevaplamak ister"],
+            "command_sit": ["Otur", "Oturur musun", "Yerine geç", "Yerine otur", "Sırana otur", "Otur bakalım", "Sandalyene geç"],
+            "command_stand": ["Kalk", "Ayağa kalk", "Kalkar mısın", "Kalk bakalım", "Tahtaya kalk", "Ayakta dur"],
+            "unknown": [
+                "Gezegenler hakkında bilgi ver", "Fotosentez nedir", "Bana bir hikaye anlat",
+                "Dünyanın en büyük okyanusu hangisi", "Bu konuyu açıklar mısın", "Neden gökyüzü mavi",
+                "Matematik problemini çöz", "Osmanlı tarihi hakkında ne biliyorsun"
+            ],
+        }
+
         # Intent to Response Templates
         self.response_templates: Dict[str, List[Dict[str, str]]] = {
             "greeting": [
@@ -65,13 +102,27 @@ class KnowledgeBase:
 
         }
 
+        self.rebuild_matcher()
+
+    def rebuild_matcher(self):
+        """Recompiles the keyword automaton; call after editing keyword_map directly."""
+        self._matcher = IntentMatcher(self.keyword_map, self.intent_priority, self.stem_keywords)
+
+    def add_keyword(self, keyword: str, intent: str):
+        self.keyword_map[keyword] = intent
+        self.rebuild_matcher()
+
     def find_intent(self, text: str) -> str:
         """Finds the intent based on keywords in the text."""
-        text_lower = text.lower()
-        for keyword, intent in self.keyword_map.items():
-            if keyword in text_lower:
-                return intent
-        return "unknown"
+        return self._matcher.best_intent(text)[0]
+
+    def find_intent_with_hits(self, text: str) -> Tuple[str, List[Tuple[int, str, str]]]:
+        """Like find_intent, but also returns every (start, keyword, intent) hit."""
+        return self._matcher.best_intent(text)
+
+    def is_exact_intent(self, text: str, hits: List[Tuple[int, str, str]]) -> bool:
+        """True when the text consists of intent keywords only (see IntentMatcher.covers)."""
+        return self._matcher.covers(text, hits)
 
     def get_potential_responses(self, intent: str) -> List[Dict[str, str]]:
         """Returns list of potential responses for an intent."""
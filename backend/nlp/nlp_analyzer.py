@@ -1,5 +1,7 @@
 from typing import Dict, Any, Optional
+from core.config import settings
 from .knowledge_base import knowledge_base
+from .semantic_classifier import SemanticIntentClassifier
 
 class NLPAnalyzer:
     """
@@ -10,6 +12,11 @@ class NLPAnalyzer:
     
     def __init__(self):
         self.kb = knowledge_base
+        self.semantic = SemanticIntentClassifier(
+            self.kb.intent_examples,
+            threshold=settings.SEMANTIC_INTENT_THRESHOLD,
+            margin=settings.SEMANTIC_INTENT_MARGIN
+        ) if settings.SEMANTIC_INTENT_ENABLED else None
         
     def analyze_text(self, text: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -24,9 +31,22 @@ class NLPAnalyzer:
         if explicit_action:
             intent = explicit_action
             confidence = 1.0
+            intent_source = "explicit"
         else:
-            intent = self.kb.find_intent(text)
-            confidence = 0.9 if intent != "unknown" else 0.4
+            intent, hits = self.kb.find_intent_with_hits(text)
+            intent_source = "keyword" if intent != "unknown" else "none"
+            confidence = 0.4
+            if intent != "unknown":
+                # A bare command is certain; a keyword inside a longer message may not be its point
+                confidence = 0.95 if self.kb.is_exact_intent(text, hits) else 0.9
+
+            # Natural phrasings without a keyword: semantic tier before paying for the LLM
+            if intent == "unknown" and self.semantic and text:
+                semantic_intent, score = self.semantic.classify(text)
+                if semantic_intent != "unknown":
+                    intent = semantic_intent
+                    confidence = round(score, 3)
+                    intent_source = "semantic"
         
         # 2. Entity Extraction (Placeholder for future)
         entities = []
@@ -43,7 +63,8 @@ class NLPAnalyzer:
             "entities": entities,
             "sentiment": sentiment,
             "raw_text": text,
-            "confidence": confidence
+            "confidence": confidence,
+            "intent_source": intent_source
         }
 
 nlp_analyzer = NLPAnalyzer()
@@ -0,0 +1,83 @@
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .text_utils import normalize_text
+
+
+class SemanticIntentClassifier:
+    """
+    Offline semantic intent tier.
+
+    Utterances are embedded with a hashed bag of character n-grams and words
+    (no model download, stable across processes), L2-normalized, and compared
+    against a matrix of labelled example utterances in one matrix product.
+    Each intent scores the similarity of its closest example. An intent is
+    accepted when it clears `threshold` and beats the runner-up by `margin`;
+    examples labelled "unknown" act as negatives for open-ended questions that
+    should still go to the LLM.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]], dim: int = 4096,
+                 ngram_range: Tuple[int, int] = (3, 5), threshold: float = 0.5, margin: float = 0.05):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.threshold = threshold
+        self.margin = margin
+
+        self.intents: List[str] = []
+        rows = []
+        labels = []
+        for intent, utterances in examples.items():
+            if not utterances:
+                continue
+            self.intents.append(intent)
+            for utterance in utterances:
+                rows.append(self.embed(utterance))
+                labels.append(len(self.intents) - 1)
+
+        # Examples are grouped by intent, so a per-intent max is a reduceat over row offsets
+        self._matrix = np.vstack(rows).astype(np.float32)
+        labels = np.asarray(labels)
+        self._offsets = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+
+    def _features(self, text: str) -> List[str]:
+        normalized = normalize_text(text)
+        features = [f"w:{word}" for word in normalized.split()]
+        padded = f" {normalized} "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def scores(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), len(intents)) matrix of best-example cosine similarity."""
+        queries = np.vstack([self.embed(text) for text in texts])
+        similarity = queries @ self._matrix.T
+        return np.maximum.reduceat(similarity, self._offsets, axis=1)
+
+    def classify_many(self, texts: List[str]) -> List[Tuple[str, float]]:
+        if not texts:
+            return []
+        per_intent = self.scores(texts)
+        results = []
+        for row in per_intent:
+            order = np.argsort(row)[::-1]
+            best, best_score = self.intents[order[0]], float(row[order[0]])
+            runner_up = float(row[order[1]]) if len(order) > 1 else 0.0
+            if best == "unknown" or best_score < self.threshold or best_score - runner_up < self.margin:
+                results.append(("unknown", best_score))
+            else:
+                results.append((best, best_score))
+        return results
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        return self.classify_many([text])[0]
@@ -0,0 +1,17 @@
+import re
+
+# str.lower() maps "I" to "i" and "İ" to "i̇" (i + combining dot), both wrong for Turkish
+_TURKISH_UPPER_MAP = str.maketrans({"I": "ı", "İ": "i"})
+_NON_WORD = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def turkish_casefold(text: str) -> str:
+    """Lower-cases text with Turkish dotted/dotless I rules."""
+    return text.translate(_TURKISH_UPPER_MAP).lower()
+
+
+def normalize_text(text: str) -> str:
+    """Case-folded, punctuation-free, single-spaced form used for matching and cache keys."""
+    folded = _NON_WORD.sub(" ", turkish_casefold(text))
+    return _WHITESPACE.sub(" ", folded).strip()
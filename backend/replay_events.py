@@ -0,0 +1,48 @@
+"""
+Rebuilds student states from the decision event log (state/event_log.py).
+
+    python replay_events.py state --student 101 --at "2026-10-18T10:30:00"
+    python replay_events.py all --at "2026-10-18T10:30:00"
+    python replay_events.py decisions --student 101 --since "2026-10-18T09:00:00"
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+from core.config import settings
+from state.event_log import EventLogReader
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the decision event log.")
+    parser.add_argument("command", choices=["state", "all", "decisions"])
+    parser.add_argument("--dir", default=settings.EVENT_LOG_DIR, help="Event log directory")
+    parser.add_argument("--student", type=int, help="Student id (required for 'state')")
+    parser.add_argument("--at", help="ISO time to rebuild the state at (default: latest)")
+    parser.add_argument("--since", help="ISO time decisions are listed from")
+    args = parser.parse_args()
+
+    reader = EventLogReader(args.dir)
+    started = time.perf_counter()
+    if args.command == "state":
+        if args.student is None:
+            parser.error("'state' needs --student")
+        state = reader.state_at(args.student, _timestamp(args.at))
+        result = state.model_dump(mode="json") if state else None
+    elif args.command == "all":
+        states = reader.states_at(_timestamp(args.at))
+        result = {student_id: state.model_dump(mode="json") for student_id, state in sorted(states.items())}
+    else:
+        result = reader.decisions(args.student, _timestamp(args.since), _timestamp(args.at))
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"Replayed in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Runs the backend as several room-sharded worker processes (core/sharding.py).
+
+Every worker listens on the shared public port (SO_REUSEPORT, the kernel
+spreads connections) and on its own internal port, which other workers use
+to forward calls and sockets for rooms it owns.
+
+Workers authenticate each other with SHARD_SECRET (separate from
+SECRET_KEY, no default); every command reads it from the environment.
+
+    export SHARD_SECRET=$(python -c "import secrets; print(secrets.token_urlsafe(32))")
+    python run_workers.py start --workers 4 --port 8000
+    # Add a fifth worker later, then move its rooms over:
+    python run_workers.py serve --shard w4 --internal-port 9005 --members "w0=http://127.0.0.1:9001,...,w4=http://127.0.0.1:9005"
+    python run_workers.py rebalance --members "w0=http://127.0.0.1:9001,...,w4=http://127.0.0.1:9005"
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+
+import httpx
+
+
+def _listen(host: str, port: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def serve(shard_id: str, members: str, host: str, port: int, internal_host: str, internal_port: int):
+    # Settings are read when main is imported, so configure the worker first
+    os.environ["SHARD_ID"] = shard_id
+    os.environ["SHARD_WORKERS"] = members
+    # Each worker appends to its own event log
+    os.environ["EVENT_LOG_DIR"] = os.path.join(os.environ.get("EVENT_LOG_DIR", "./event_log"), shard_id)
+
+    import uvicorn
+    sockets = [_listen(host, port, reuse_port=True), _listen(internal_host, internal_port, reuse_port=False)]
+    server = uvicorn.Server(uvicorn.Config("main:app", log_level="info"))
+    server.run(sockets=sockets)
+
+
+def start(workers: int, host: str, port: int, internal_host: str, internal_port: int):
+    members = ",".join(f"w{i}=http://{internal_host}:{internal_port + i}" for i in range(workers))
+    print(f"Starting {workers} workers on {host}:{port}: {members}")
+    processes = [
+        multiprocessing.Process(
+            target=serve, args=(f"w{i}", members, host, port, internal_host, internal_port + i), name=f"w{i}"
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+def rebalance(members: str, secret: str):
+    """Sends the new membership to every worker; each hands off the rooms it lost."""
+    from core.sharding import SECRET_HEADER, parse_workers
+    workers = parse_workers(members)
+    for name, url in workers.items():
+        response = httpx.post(f"{url}/api/v1/internal/shards", json=workers, headers={SECRET_HEADER: secret}, timeout=30)
+        response.raise_for_status()
+        print(f"{name}: {response.json()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room-sharded multi-process launcher.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    start_parser = commands.add_parser("start", help="Start N workers on this host")
+    start_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    serve_parser = commands.add_parser("serve", help="Start one worker with an explicit membership")
+    serve_parser.add_argument("--shard", required=True)
+    serve_parser.add_argument("--members", required=True)
+
+    for sub in (start_parser, serve_parser):
+        sub.add_argument("--host", default="0.0.0.0")
+        sub.add_argument("--port", type=int, default=8000)
+        sub.add_argument("--internal-host", default="127.0.0.1")
+        sub.add_argument("--internal-port", type=int, default=9001, help="First internal port (start) or this worker's (serve)")
+
+    rebalance_parser = commands.add_parser("rebalance", help="Install a new membership on every worker")
+    rebalance_parser.add_argument("--members", required=True)
+
+    args = parser.parse_args()
+    secret = os.environ.get("SHARD_SECRET")
+    if not secret:
+        parser.error("SHARD_SECRET must be set in the environment")
+    if args.command == "start":
+        start(args.workers, args.host, args.port, args.internal_host, args.internal_port)
+    elif args.command == "serve":
+        serve(args.shard, args.members, args.host, args.port, args.internal_host, args.internal_port)
+    else:
+        rebalance(args.members, secret)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.definitions import StudentStateModel
+from state.record import StudentRecord
+
+try:
+    from redis.exceptions import WatchError
+except ImportError:  # redis is only needed for STATE_BACKEND=redis
+    class WatchError(Exception):
+        pass
+
+# (record, version). Version 0 means "does not exist yet".
+VersionedRecord = Tuple[StudentRecord, int]
+
+
+class StateBackend(ABC):
+    """
+    Storage interface behind StateManager.
+
+    Every write is versioned: `set_many` takes, per key, the version the
+    caller read (None for an unconditional write, 0 for "must not exist")
+    and applies all writes or none. This lets several workers update the
+    same students optimistically and retry on conflict.
+
+    `blocking` backends wait on the network; StateManager's async methods
+    run their calls in a thread so the event loop keeps serving sockets.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def get_many(self, keys: Iterable[str]) -> Dict[str, VersionedRecord]:
+        """The stored (record, version) of every key that exists."""
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, Tuple[StudentRecord, Optional[int]]],
+                 ttl_s: Optional[float] = None) -> Optional[Dict[str, int]]:
+        """Returns the new versions, or None if any expected version did not match."""
+
+    @abstractmethod
+    def delete_many(self, keys: Iterable[str]):
+        """Removes the keys; missing ones are ignored."""
+
+    def get(self, key: str) -> Optional[VersionedRecord]:
+        return self.get_many([key]).get(key)
+
+
+class InProcessStateBackend(StateBackend):
+    """
+    Single-process store of live records; nothing is serialized.
+    Idle entries expire lazily on read and in sweeps on write; a sweep runs
+    at most once per len(store) writes, so its cost stays O(1) per write.
+    """
+
+    def __init__(self, sweep_every: int = 1024):
+        # key -> [record, version, expires_at or None]
+        self._entries: Dict[str, list] = {}
+        self._sweep_every = sweep_every
+        self._writes = 0
+
+    def _live(self, key: str, now: float) -> Optional[list]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[VersionedRecord]:
+        entry = self._live(key, time.monotonic())
+        return (entry[0], entry[1]) if entry is not None else None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, VersionedRecord]:
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._live(key, now)
+            if entry is not None:
+                found[key] = (entry[0], entry[1])
+        return found
+
+    def set_many(self, items: Dict[str, Tuple[StudentRecord, Optional[int]]],
+                 ttl_s: Optional[float] = None) -> Optional[Dict[str, int]]:
+        now = time.monotonic()
+        current = {}
+        for key, (_, expected) in items.items():
+            entry = self._live(key, now)
+            version = entry[1] if entry is not None else 0
+            if expected is not None and expected != version:
+                return None
+            current[key] = version
+
+        expires_at = now + ttl_s if ttl_s else None
+        versions = {}
+        for key, (record, _) in items.items():
+            versions[key] = current[key] + 1
+            self._entries[key] = [record, versions[key], expires_at]
+
+        self._writes += 1
+        if self._writes >= max(self._sweep_every, len(self._entries)):
+            self._writes = 0
+            self.purge_expired()
+        return versions
+
+    def delete_many(self, keys: Iterable[str]):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[2] is not None and entry[2] <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Shared store for multiple workers, speaking the Redis protocol.
+
+    Each key holds a JSON envelope {"v": version, "state": {...}}, so a
+    whole room is read with one MGET. Writes WATCH the keys, check the
+    versions and commit in one MULTI/EXEC; a concurrent writer makes
+    EXEC fail and the caller retries. TTLs are Redis key expiries.
+    """
+
+    blocking = True
+
+    def __init__(self, url: Optional[str] = None, client=None):
+        if client is None:
+            import redis  # Optional dependency, only needed for STATE_BACKEND=redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+
+    @staticmethod
+    def _encode(record: StudentRecord, version: int) -> str:
+        return '{"v":%d,"state":%s}' % (version, record.to_json())
+
+    @staticmethod
+    def _decode(raw) -> VersionedRecord:
+        data = json.loads(raw)
+        return StudentRecord.from_model(StudentStateModel.model_validate(data["state"])), data["v"]
+
+    @staticmethod
+    def _version(raw) -> int:
+        return json.loads(raw)["v"] if raw else 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, VersionedRecord]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        return {key: self._decode(raw) for key, raw in zip(keys, self.client.mget(keys)) if raw}
+
+    def set_many(self, items: Dict[str, Tuple[StudentRecord, Optional[int]]],
+                 ttl_s: Optional[float] = None) -> Optional[Dict[str, int]]:
+        keys: List[str] = list(items)
+        if not keys:
+            return {}
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(*keys)
+                current = [self._version(raw) for raw in pipe.mget(keys)]
+                for key, version in zip(keys, current):
+                    expected = items[key][1]
+                    if expected is not None and expected != version:
+                        pipe.unwatch()
+                        return None
+
+                versions = {}
+                pipe.multi()
+                for key, version in zip(keys, current):
+                    versions[key] = version + 1
+                    payload = self._encode(items[key][0], versions[key])
+                    if ttl_s:
+                        pipe.set(key, payload, px=int(ttl_s * 1000))
+                    else:
+                        pipe.set(key, payload)
+                pipe.execute()
+                return versions
+            except WatchError:
+                return None
+
+    def delete_many(self, keys: Iterable[str]):
+        keys = list(keys)
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_backend(kind: str, url: Optional[str] = None) -> StateBackend:
+    if kind == "redis":
+        return RedisStateBackend(url)
+    if kind == "memory":
+        return InProcessStateBackend()
+    raise ValueError(f"Unknown state backend: {kind}")
@@ -0,0 +1,373 @@
+import asyncio
+import json
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+
+from core.config import settings
+from models.definitions import StudentStateModel
+from state.manager import StateManager, state_manager
+from state.record import StudentRecord
+
+EVENT_STATE = 1  # Changed fields of one student after a write
+EVENT_DECISION = 2  # Summary of one pipeline decision
+EVENT_SNAPSHOT = 3  # Full state of one student at the start of a segment
+
+# Segment file: magic, format version, start time of the segment
+_SEGMENT_HEADER = struct.Struct("<4sHd")
+_MAGIC = b"VCEL"
+_FORMAT_VERSION = 1
+# Event: payload length, payload crc32, type, timestamp, student id; then the JSON payload
+_EVENT_HEADER = struct.Struct("<IIBdq")
+# Fields that change between writes; last_updated is the event timestamp
+_STATE_FIELDS = tuple(field for field in StudentRecord.__slots__ if field not in ("student_id", "last_updated"))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, tuple):
+        return list(value)
+    raise TypeError(f"Not JSON serializable: {type(value).__name__}")
+
+
+def _encode_payload(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=_json_default).encode("utf-8")
+
+
+def _encode_event(event_type: int, ts: float, student_id: int, payload: Dict[str, Any]) -> bytes:
+    data = _encode_payload(payload)
+    return _EVENT_HEADER.pack(len(data), zlib.crc32(data), event_type, ts, student_id) + data
+
+
+def _record_fields(record: StudentRecord, previous: Optional[StudentRecord]) -> Dict[str, Any]:
+    """Fields of `record` that differ from `previous` (all of them without one)."""
+    if previous is None:
+        return {field: getattr(record, field) for field in _STATE_FIELDS}
+    changed = {}
+    for field in _STATE_FIELDS:
+        value = getattr(record, field)
+        # Containers are replaced, never mutated, so unchanged ones are usually the same object
+        old = getattr(previous, field)
+        if value is not old and value != old:
+            changed[field] = value
+    return changed
+
+
+def _segment_name(sequence: int) -> str:
+    return f"events-{sequence:08d}.log"
+
+
+class EventLog:
+    """
+    Append-only binary log of pipeline decisions and student state changes.
+
+    Every write through the StateManager is appended as the fields that
+    changed, and every emitted decision as a short summary. Events are
+    encoded into an in-memory buffer on the caller's path (a few
+    microseconds); a background task writes the buffer to the current
+    segment in a worker thread every `flush_ms`, or sooner when it grows
+    past `buffer_bytes`.
+
+    A new segment is started every `snapshot_s` (or at `segment_bytes`) and
+    begins with a snapshot of every known student, so a point-in-time replay
+    reads a single segment. Compaction deletes segments older than
+    `retention_s`: the snapshot opening the next segment already holds
+    their net effect.
+    """
+
+    def __init__(self, directory: str, manager: Optional[StateManager] = None, flush_ms: int = 500,
+                 buffer_bytes: int = 256 * 1024, snapshot_s: float = 900.0,
+                 segment_bytes: int = 16 * 1024 * 1024, retention_s: float = 7 * 24 * 3600):
+        self.directory = directory
+        self.flush_interval_s = flush_ms / 1000
+        self.buffer_bytes = buffer_bytes
+        self.snapshot_s = snapshot_s
+        self.segment_bytes = segment_bytes
+        self.retention_s = retention_s
+
+        self._buffer = bytearray()
+        self._first_ts: Optional[float] = None
+        self._last_ts = 0.0
+        # Latest logged record per student: the base for deltas and for segment snapshots
+        self._last: Dict[int, StudentRecord] = {}
+        self._file = None
+        self._sequence = 0
+        self._segment_start = 0.0
+        self._segment_size = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        if manager is not None:
+            manager.add_listener(self.log_states)
+
+    # --- Appends (event loop, never blocking) ---
+    def _append(self, event_type: int, ts: float, student_id: int, payload: Dict[str, Any]):
+        if self._first_ts is None:
+            self._first_ts = ts
+        self._buffer += _encode_event(event_type, ts, student_id, payload)
+        self._last_ts = max(self._last_ts, ts)
+        if self._wake is not None and len(self._buffer) >= self.buffer_bytes:
+            self._wake.set()
+
+    def log_states(self, records: Dict[int, StudentRecord], ts: Optional[float] = None):
+        """StateManager listener: appends what changed for each written student."""
+        ts = ts if ts is not None else time.time()
+        for student_id, record in records.items():
+            changed = _record_fields(record, self._last.get(student_id))
+            self._last[student_id] = record
+            if changed:
+                self._append(EVENT_STATE, ts, student_id, changed)
+
+    def log_decision(self, room_id: str, decision: Dict[str, Any], ts: Optional[float] = None):
+        """`decision` is AIResponse.model_dump(), the same dict the Debug Dashboard gets."""
+        trace, meta = decision["decision_trace"], decision["meta"]
+        self._append(EVENT_DECISION, ts if ts is not None else time.time(), decision["student_id"], {
+            "decision_id": meta["decision_id"],
+            "room_id": room_id,
+            "intent": trace["intent"],
+            "rule": trace["rule_applied"],
+            "tier": trace["tier"],
+            "animation": decision["animation"],
+            "emotion": decision["emotion"],
+            "student_state": decision["student_state"],
+            "reply_text": decision["reply_text"],
+            "confidence": decision["confidence"],
+            "latency_ms": meta["latency_ms"]
+        })
+
+    # --- Segments (worker thread) ---
+    def _open_segment(self, start_ts: float, snapshot: Dict[int, StudentRecord]):
+        if self._file is not None:
+            self._file.close()
+        self._sequence += 1
+        self._file = open(os.path.join(self.directory, _segment_name(self._sequence)), "ab")
+        data = bytearray(_SEGMENT_HEADER.pack(_MAGIC, _FORMAT_VERSION, start_ts))
+        for student_id, record in snapshot.items():
+            data += _encode_event(EVENT_SNAPSHOT, start_ts, student_id, _record_fields(record, None))
+        self._file.write(data)
+        self._file.flush()
+        self._segment_start = start_ts
+        self._segment_size = len(data)
+
+    def _resume(self, start_ts: float):
+        """
+        Opens this run's first segment. Segments of earlier runs are never
+        appended to; the new one opens with the latest state they hold, so
+        every segment stays a complete starting point for replay.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        segments = list_segments(self.directory)
+        self._sequence = max((int(os.path.basename(path)[7:15]) for path, _ in segments), default=0)
+        previous = {}
+        if segments:
+            for student_id, state in EventLogReader(self.directory).states_at().items():
+                previous[student_id] = StudentRecord.from_model(state)
+                # Students written in this run already carry newer records
+                self._last.setdefault(student_id, previous[student_id])
+        self._open_segment(start_ts, previous)
+
+    def _write(self, data: bytes, first_ts: float, last_ts: float, snapshot: Dict[int, StudentRecord]):
+        if self._file is None:
+            self._resume(first_ts)
+        self._file.write(data)
+        self._file.flush()
+        self._segment_size += len(data)
+
+        if last_ts - self._segment_start >= self.snapshot_s or self._segment_size >= self.segment_bytes:
+            self._open_segment(last_ts, snapshot)
+            self.compact(now=last_ts)
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Deletes segments that ended before the retention window; returns how many."""
+        cutoff = (now if now is not None else time.time()) - self.retention_s
+        segments = list_segments(self.directory)
+        removed = 0
+        # A segment ends where the next one starts; the newest one is always kept
+        for (path, _), (_, next_start) in zip(segments, segments[1:]):
+            if next_start >= cutoff:
+                break
+            os.remove(path)
+            removed += 1
+        return removed
+
+    async def flush(self) -> int:
+        """Writes the buffered events; returns how many bytes."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            # Records are never mutated in place, so the thread can encode this shallow copy
+            args = self._take_buffer()
+            await asyncio.to_thread(self._write, *args)
+            return len(args[0])
+
+    def flush_sync(self) -> int:
+        """Blocking flush, for scripts and tests without a running loop."""
+        if not self._buffer:
+            return 0
+        args = self._take_buffer()
+        self._write(*args)
+        return len(args[0])
+
+    def _take_buffer(self) -> Tuple[bytes, float, float, Dict[int, StudentRecord]]:
+        taken = (bytes(self._buffer), self._first_ts, self._last_ts, dict(self._last))
+        self._buffer = bytearray()
+        self._first_ts = None
+        return taken
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Event log write error: {e}")
+
+    def start(self):
+        if self._file is None:
+            self._resume(time.time())
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background task, writes what is left and closes the segment."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# --- Reading and replay ---
+def list_segments(directory: str) -> List[Tuple[str, float]]:
+    """(path, start timestamp) of every segment, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith("events-") and name.endswith(".log")):
+            continue
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            header = f.read(_SEGMENT_HEADER.size)
+        if len(header) < _SEGMENT_HEADER.size:
+            continue
+        magic, version, start_ts = _SEGMENT_HEADER.unpack(header)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            raise ValueError(f"{path}: not an event log segment")
+        segments.append((path, start_ts))
+    return segments
+
+
+def read_segment(path: str, student_id: Optional[int] = None, until: Optional[float] = None
+                 ) -> Iterator[Tuple[int, float, int, Dict[str, Any]]]:
+    """
+    Yields (type, ts, student_id, payload). Only the payloads of `student_id`
+    are decoded when given. A torn or corrupt tail (crash mid-write) ends
+    the segment.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = _SEGMENT_HEADER.size
+    header_size = _EVENT_HEADER.size
+    unpack = _EVENT_HEADER.unpack_from
+    while offset + header_size <= len(data):
+        length, crc, event_type, ts, event_student = unpack(data, offset)
+        start = offset + header_size
+        end = start + length
+        if end > len(data):
+            break
+        if until is not None and ts > until:
+            return
+        offset = end
+        if student_id is not None and event_student != student_id:
+            continue
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            print(f"Event log: corrupt event in {path}, stopping there")
+            return
+        yield event_type, ts, event_student, json.loads(payload)
+
+
+class EventLogReader:
+    """Point-in-time reconstruction of student states from an event log directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _segments_for(self, since: Optional[float], until: Optional[float]) -> List[str]:
+        segments = list_segments(self.directory)
+        if until is not None:
+            segments = [segment for segment in segments if segment[1] <= until] or segments[:1]
+        if since is not None:
+            # Start from the segment that contains `since`
+            first = 0
+            for index, (_, start_ts) in enumerate(segments):
+                if start_ts <= since:
+                    first = index
+            segments = segments[first:]
+        return [path for path, _ in segments]
+
+    def events(self, student_id: Optional[int] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Iterator[Tuple[int, float, int, Dict[str, Any]]]:
+        for path in self._segments_for(since, until):
+            for event in read_segment(path, student_id, until):
+                if since is None or event[1] >= since:
+                    yield event
+
+    def decisions(self, student_id: Optional[int] = None, since: Optional[float] = None,
+                  until: Optional[float] = None) -> List[Dict[str, Any]]:
+        return [
+            {"ts": ts, "student_id": sid, **payload}
+            for event_type, ts, sid, payload in self.events(student_id, since, until)
+            if event_type == EVENT_DECISION
+        ]
+
+    def states_at(self, ts: Optional[float] = None, student_id: Optional[int] = None) -> Dict[int, StudentStateModel]:
+        """
+        States as of `ts` (latest when None). Only the last segment starting
+        at or before `ts` is read: it opens with a snapshot of everyone.
+        """
+        segments = [path for path, start_ts in list_segments(self.directory) if ts is None or start_ts <= ts]
+        fields: Dict[int, Dict[str, Any]] = {}
+        updated: Dict[int, float] = {}
+        for path in segments[-1:]:
+            for event_type, event_ts, sid, payload in read_segment(path, student_id, ts):
+                if event_type == EVENT_DECISION:
+                    continue
+                fields.setdefault(sid, {}).update(payload)
+                updated[sid] = event_ts
+        return {
+            sid: StudentStateModel.model_validate({
+                **state, "student_id": sid, "last_updated": datetime.fromtimestamp(updated[sid])
+            })
+            for sid, state in fields.items()
+        }
+
+    def state_at(self, student_id: int, ts: Optional[float] = None) -> Optional[StudentStateModel]:
+        return self.states_at(ts, student_id).get(student_id)
+
+event_log = EventLog(
+    settings.EVENT_LOG_DIR,
+    state_manager,
+    flush_ms=settings.EVENT_LOG_FLUSH_MS,
+    buffer_bytes=settings.EVENT_LOG_BUFFER_BYTES,
+    snapshot_s=settings.EVENT_LOG_SNAPSHOT_S,
+    segment_bytes=settings.EVENT_LOG_SEGMENT_BYTES,
+    retention_s=settings.EVENT_LOG_RETENTION_S
+) if settings.EVENT_LOG_ENABLED else None
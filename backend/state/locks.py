@@ -0,0 +1,54 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from core.metrics import state_lock_wait_seconds
+
+
+class StudentLocks:
+    """
+    One asyncio.Lock per student, created on first use and dropped again
+    when nobody holds or waits for it, so memory follows the number of busy
+    students rather than all students ever seen. There is no global lock:
+    decisions for different students never wait on each other.
+    """
+
+    def __init__(self):
+        # student_id -> [lock, holders + waiters]
+        self._locks: Dict[int, List] = {}
+
+    @asynccontextmanager
+    async def hold(self, *student_ids: int):
+        """Holds every given student's lock. Multiple locks are taken in sorted order."""
+        ids = sorted(set(student_ids))
+        entries = []
+        for student_id in ids:
+            entry = self._locks.get(student_id)
+            if entry is None:
+                entry = self._locks[student_id] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            entries.append(entry)
+
+        acquired = []
+        started = time.perf_counter()
+        try:
+            for entry in entries:
+                await entry[0].acquire()
+                acquired.append(entry)
+            state_lock_wait_seconds.observe(time.perf_counter() - started, scope="room" if len(ids) > 1 else "student")
+            yield
+        finally:
+            for entry in acquired:
+                entry[0].release()
+            for student_id, entry in zip(ids, entries):
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[student_id]
+
+    def locked(self, student_id: int) -> bool:
+        entry = self._locks.get(student_id)
+        return entry is not None and entry[0].locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
@@ -1,65 +1,171 @@
-from typing import Dict, Optional, Any
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional, Any
 from datetime import datetime
-import json
-from models.definitions import StudentStateModel, EmotionType
+from models.definitions import StudentStateModel
 from core.config import settings
+from state.backends import StateBackend, create_backend
+from state.locks import StudentLocks
+from state.record import StudentRecord
+
+
+class StateConflictError(RuntimeError):
+    """Raised when optimistic updates keep losing to concurrent writers."""
+
 
 class StateManager:
     """
-    Manages student states with Redis-ready architecture.
-    Uses an in-memory dictionary for this implementation as requested,
-    but designed to be easily swapped for Redis.
+    Manages student states on a pluggable backend (state/backends.py):
+    live in-process records by default, or Redis so several workers share
+    student state. Updates are read-modify-write with version checks and
+    are retried when another writer got there first.
+
+    Code on the event loop uses the *_async methods: with a blocking backend
+    (Redis) the round-trips run in a thread, in-process calls stay inline.
+    Listeners are always called on the caller's thread.
     """
-    
-    def __init__(self):
-        self._local_storage: Dict[str, str] = {} # Simulating Redis key-value storage
+
+    def __init__(self, backend: Optional[StateBackend] = None):
+        self.backend = backend or create_backend(settings.STATE_BACKEND, settings.REDIS_URL)
+        self.ttl_s = settings.STATE_TTL_S or None
+        self.max_retries = settings.STATE_MAX_RETRIES
+        self.locks = StudentLocks()
+        # Called with {student_id: stored record} for every write through this manager
+        # (write-behind persistence, event log); iterating it yields the ids
+        self._listeners: List[Callable[[Dict[int, StudentRecord]], None]] = []
+        # Called with the student ids removed by evict_students
+        self._evict_listeners: List[Callable[[List[int]], None]] = []
 
     def _get_key(self, student_id: int) -> str:
         return f"student:state:{student_id}"
 
+    def add_listener(self, callback: Callable[[Dict[int, StudentRecord]], None]):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Dict[int, StudentRecord]], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def add_evict_listener(self, callback: Callable[[List[int]], None]):
+        self._evict_listeners.append(callback)
+
+    def remove_evict_listener(self, callback: Callable[[List[int]], None]):
+        if callback in self._evict_listeners:
+            self._evict_listeners.remove(callback)
+
+    def _notify(self, records: Dict[int, StudentRecord]):
+        for callback in self._listeners:
+            callback(records)
+
+    def student_lock(self, *student_ids: int):
+        """
+        Async context manager serializing decisions per student within this
+        process; versioned writes still protect against other workers.
+        """
+        return self.locks.hold(*student_ids)
+
     def get_student_state(self, student_id: int) -> Optional[StudentStateModel]:
-        key = self._get_key(student_id)
-        data = self._local_storage.get(key)
-        if not data:
+        found = self.backend.get(self._get_key(student_id))
+        if found is None:
             return None
-        return StudentStateModel.model_validate_json(data)
+        return found[0].to_model()
+
+    def get_student_states(self, student_ids: Iterable[int]) -> Dict[int, StudentStateModel]:
+        """Room-wide read in one backend round-trip; missing students are left out."""
+        keys = {self._get_key(student_id): student_id for student_id in student_ids}
+        found = self.backend.get_many(keys)
+        return {keys[key]: record.to_model() for key, (record, _) in found.items()}
 
     def set_student_state(self, student_id: int, state: StudentStateModel):
-        key = self._get_key(student_id)
         state.last_updated = datetime.now()
-        self._local_storage[key] = state.model_dump_json()
+        record = StudentRecord.from_model(state)
+        self.backend.set_many({self._get_key(student_id): (record, None)}, self.ttl_s)
+        self._notify({student_id: record})
 
     def update_student_state(self, student_id: int, updates: Dict[str, Any]) -> StudentStateModel:
-        state = self.get_student_state(student_id)
-        if not state:
-            # Initialize default state with required fields
-            state = StudentStateModel(
-                student_id=student_id,
-                mood="neutral",
-                attention_level=0.8,
-                energy_level=0.8,
-                current_activity="listening",
-                last_updated=datetime.now(),
-                personality_traits={"type": "balanced"}
-            )
-        
-        # Apply updates
-        state_dict = state.model_dump()
-        for k, v in updates.items():
-            if k in state_dict:
-                state_dict[k] = v
-        
-        # Clamping
-        state_dict["attention_level"] = max(0.0, min(1.0, state_dict["attention_level"]))
-        state_dict["energy_level"] = max(0.0, min(1.0, state_dict["energy_level"]))
-        
-        updated_state = StudentStateModel(**state_dict)
-        self.set_student_state(student_id, updated_state)
-        return updated_state
-
-    def acquire_lock(self, student_id: int, duration_ms: int = 2000) -> bool:
-        """Simple mutex simulation for teacher overrides."""
-        # In Redis: SET key val NX PX duration_ms
-        return True # Simplified for this version
+        return self.update_student_states({student_id: updates})[student_id]
+
+    def update_student_states(self, updates_by_student: Dict[int, Dict[str, Any]]) -> Dict[int, StudentStateModel]:
+        """
+        Applies updates to several students atomically: one batched read and
+        one batched conditional write per attempt. Missing students start from
+        the default state.
+        """
+        records = self._write_updates(updates_by_student)
+        self._notify(records)
+        return {student_id: record.to_model() for student_id, record in records.items()}
+
+    async def _run(self, fn, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get_student_state_async(self, student_id: int) -> Optional[StudentStateModel]:
+        return await self._run(self.get_student_state, student_id)
+
+    async def get_student_states_async(self, student_ids: Iterable[int]) -> Dict[int, StudentStateModel]:
+        return await self._run(self.get_student_states, list(student_ids))
+
+    async def update_student_state_async(self, student_id: int, updates: Dict[str, Any]) -> StudentStateModel:
+        return (await self.update_student_states_async({student_id: updates}))[student_id]
+
+    async def update_student_states_async(self, updates_by_student: Dict[int, Dict[str, Any]]) -> Dict[int, StudentStateModel]:
+        records = await self._run(self._write_updates, updates_by_student)
+        self._notify(records)
+        return {student_id: record.to_model() for student_id, record in records.items()}
+
+    def _write_updates(self, updates_by_student: Dict[int, Dict[str, Any]]) -> Dict[int, StudentRecord]:
+        """The retried read-modify-write behind update_student_states; returns the stored records."""
+        keys = {self._get_key(student_id): student_id for student_id in updates_by_student}
+        for _ in range(self.max_retries + 1):
+            found = self.backend.get_many(keys)
+            items = {}
+            now = datetime.now()
+            for key, student_id in keys.items():
+                if key in found:
+                    # Copy: the in-process backend hands out its live record
+                    record, version = found[key][0].copy(), found[key][1]
+                else:
+                    # Initialize default state with required fields
+                    record, version = StudentRecord(student_id=student_id), 0
+                record.apply(updates_by_student[student_id])
+                record.last_updated = now
+                items[key] = (record, version)
+
+            if self.backend.set_many(items, self.ttl_s) is not None:
+                return {keys[key]: record for key, (record, _) in items.items()}
+        raise StateConflictError(f"Gave up updating students {list(updates_by_student)} after {self.max_retries} retries")
+
+    def get_records(self, student_ids: Iterable[int]) -> Dict[int, StudentRecord]:
+        """Stored records for serialization; they are replaced on write, never mutated."""
+        keys = {self._get_key(student_id): student_id for student_id in student_ids}
+        return {keys[key]: record for key, (record, _) in self.backend.get_many(keys).items()}
+
+    async def get_records_async(self, student_ids: Iterable[int]) -> Dict[int, StudentRecord]:
+        return await self._run(self.get_records, list(student_ids))
+
+    def load_student_states(self, records: Iterable[StudentRecord]) -> int:
+        """
+        Warm-start: inserts students that are not in the store yet. Existing
+        (newer) states are kept and listeners are not notified.
+        """
+        items = {self._get_key(record.student_id): (record, 0) for record in records}
+        present = self.backend.get_many(items)
+        missing = {key: item for key, item in items.items() if key not in present}
+        if not missing:
+            return 0
+        if self.backend.set_many(missing, self.ttl_s) is not None:
+            return len(missing)
+        # Someone wrote one of them meanwhile; fall back to one by one
+        return sum(self.backend.set_many({key: item}, self.ttl_s) is not None for key, item in missing.items())
+
+    async def load_student_states_async(self, records: Iterable[StudentRecord]) -> int:
+        return await self._run(self.load_student_states, list(records))
+
+    def evict_students(self, student_ids: Iterable[int]):
+        """Removes students from this process's store (their room moved to another worker)."""
+        student_ids = list(student_ids)
+        self.backend.delete_many([self._get_key(student_id) for student_id in student_ids])
+        for callback in self._evict_listeners:
+            callback(student_ids)
 
 state_manager = StateManager()
@@ -0,0 +1,229 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.config import settings
+from core.metrics import persist_flush_seconds, persist_dirty_students
+from state.manager import StateManager, state_manager
+from state.record import StudentRecord
+
+
+def sqlite_path(database_url: str) -> str:
+    """'sqlite:///./sql_app.db' -> './sql_app.db'"""
+    prefix = "sqlite:///"
+    if not database_url.startswith(prefix):
+        raise ValueError(f"Only sqlite:/// URLs are supported for state persistence: {database_url}")
+    return database_url[len(prefix):]
+
+
+class SQLiteStateStore:
+    """One row per student (latest snapshot as JSON), in WAL mode."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # Used from worker threads only, one at a time
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS student_states ("
+                "student_id INTEGER PRIMARY KEY, room_id TEXT, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_student_states_room ON student_states (room_id)")
+
+    def write_many(self, rows: List[Tuple[int, Optional[str], str]]):
+        """Upserts (student_id, room_id, state_json) rows in a single transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO student_states (student_id, room_id, state, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(student_id) DO UPDATE SET "
+                    "room_id = COALESCE(excluded.room_id, student_states.room_id), "
+                    "state = excluded.state, updated_at = excluded.updated_at",
+                    [(student_id, room_id, state, now) for student_id, room_id, state in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load_room(self, room_id: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT state FROM student_states WHERE room_id = ?", (room_id,))]
+
+    def load_students(self, student_ids: Iterable[int]) -> List[str]:
+        ids = list(student_ids)
+        if not ids:
+            return []
+        with self._lock:
+            placeholders = ",".join("?" * len(ids))
+            query = f"SELECT state FROM student_states WHERE student_id IN ({placeholders})"
+            return [row[0] for row in self._conn.execute(query, ids)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindPersister:
+    """
+    Write-behind persistence for the state store.
+
+    StateManager writes only mark students dirty (a set insert); a
+    background task flushes them every `flush_ms` or as soon as
+    `flush_changes` students are dirty. Records are read on the event loop,
+    but serialization and the SQLite transaction run in a worker thread,
+    so the request path never waits on disk. Stored records are never
+    mutated in place, so the thread can serialize them safely.
+
+    Restarts are warm: the latest snapshot of a room is loaded the first
+    time the room is used again (warm_room), without overwriting students
+    that already have newer in-memory state. A room is loaded again once its
+    students were evicted, or after the store's TTL could have expired them.
+    """
+
+    def __init__(self, store: SQLiteStateStore, manager: StateManager, flush_ms: int, flush_changes: int):
+        self.store = store
+        self.manager = manager
+        self.flush_interval_s = flush_ms / 1000
+        self.flush_changes = flush_changes
+
+        self._dirty: Set[int] = set()
+        self._rooms: Dict[int, str] = {}
+        # room_id -> time.monotonic() of its warm load
+        self._warm_rooms: Dict[str, float] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        manager.add_listener(self.mark_dirty)
+        manager.add_evict_listener(self.forget_students)
+
+    def mark_dirty(self, student_ids: Iterable[int]):
+        self._dirty.update(student_ids)
+        persist_dirty_students.set(len(self._dirty))
+        if self._wake is not None and len(self._dirty) >= self.flush_changes:
+            self._wake.set()
+
+    def note_room(self, room_id: str, student_id: int):
+        """Remembers which room a student belongs to, for per-room warm loads."""
+        if self._rooms.get(student_id) != room_id:
+            self._rooms[student_id] = room_id
+            self.mark_dirty([student_id])
+
+    async def warm_room(self, room_id: str) -> int:
+        """Loads a room's persisted students once per process (or after forget_room)."""
+        now = time.monotonic()
+        warmed_at = self._warm_rooms.get(room_id)
+        if warmed_at is not None and (self.manager.ttl_s is None or now - warmed_at < self.manager.ttl_s):
+            return 0
+        self._warm_rooms[room_id] = now
+        rows = await asyncio.to_thread(self.store.load_room, room_id)
+        records = [StudentRecord.from_json(row) for row in rows]
+        for record in records:
+            self._rooms.setdefault(record.student_id, room_id)
+        loaded = await self.manager.load_student_states_async(records)
+        if loaded:
+            print(f"Warm start: restored {loaded} students of {room_id}")
+        return loaded
+
+    def forget_room(self, room_id: str):
+        self._warm_rooms.pop(room_id, None)
+
+    def forget_students(self, student_ids: Iterable[int]):
+        """Evicted students must be warm-loaded again, so their rooms are no longer warm."""
+        for student_id in student_ids:
+            room_id = self._rooms.get(student_id)
+            if room_id is not None:
+                self._warm_rooms.pop(room_id, None)
+
+    def rooms(self) -> Set[str]:
+        """Rooms restored or noted by this process."""
+        return set(self._warm_rooms) | set(self._rooms.values())
+
+    def room_students(self, room_id: str) -> List[int]:
+        return [student_id for student_id, room in self._rooms.items() if room == room_id]
+
+    def release_room(self, room_id: str) -> List[int]:
+        """Drops the room's bookkeeping (it moved to another worker); returns its students."""
+        students = self.room_students(room_id)
+        for student_id in students:
+            del self._rooms[student_id]
+        self._warm_rooms.pop(room_id, None)
+        return students
+
+    async def flush(self) -> int:
+        """Writes every dirty student in one transaction; returns how many."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty = self._dirty, set()
+            persist_dirty_students.set(0)
+            records = await self.manager.get_records_async(dirty)
+            rooms = {student_id: self._rooms.get(student_id) for student_id in records}
+
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, records, rooms)
+            except Exception as e:
+                # Keep them dirty; the next flush retries
+                print(f"State persistence error: {e}")
+                self.mark_dirty(dirty)
+                return 0
+            persist_flush_seconds.observe(time.perf_counter() - started)
+            return len(records)
+
+    def _write(self, records: Dict[int, StudentRecord], rooms: Dict[int, Optional[str]]):
+        self.store.write_many([(student_id, rooms[student_id], record.to_json()) for student_id, record in records.items()])
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the background task and flushes what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def close(self):
+        """Detaches from the manager and closes the store (after stop)."""
+        self.manager.remove_listener(self.mark_dirty)
+        self.manager.remove_evict_listener(self.forget_students)
+        self.store.close()
+
+
+def create_persister(manager: StateManager = state_manager) -> Optional[WriteBehindPersister]:
+    """
+    The configured persister, or None with PERSIST_ENABLED off. It opens
+    DATABASE_URL, so the server creates it at startup, not on import.
+    """
+    if not settings.PERSIST_ENABLED:
+        return None
+    return WriteBehindPersister(
+        SQLiteStateStore(sqlite_path(settings.DATABASE_URL)),
+        manager,
+        flush_ms=settings.PERSIST_FLUSH_MS,
+        flush_changes=settings.PERSIST_FLUSH_CHANGES
+    )
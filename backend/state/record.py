@@ -0,0 +1,125 @@
+from typing import Dict, Optional, Any, get_args
+from datetime import datetime
+from models.definitions import StudentStateModel, EmotionType
+
+_VALID_MOODS = frozenset(get_args(EmotionType))
+# Shared by every record until replaced; records never mutate containers in place
+_DEFAULT_TRAITS = {"type": "balanced"}
+# Copied by StudentRecord.to_model, which overwrites every field (in declaration order)
+_MODEL_TEMPLATE = StudentStateModel.model_construct(**dict.fromkeys(StudentStateModel.model_fields))
+
+
+class StudentRecord:
+    """
+    Live, mutable state of one student.
+
+    Kept as a plain slotted object so reads and updates touch attributes
+    instead of re-parsing JSON; a StudentStateModel is only built when a
+    caller asks for one, and JSON only at a persistence boundary.
+    Containers are replaced, never mutated, so memories are stored as
+    tuples and the default traits dict is shared.
+    """
+
+    __slots__ = (
+        "student_id", "mood", "attention_level", "energy_level", "personality_traits",
+        "short_term_memory", "long_term_memory", "last_interaction", "current_activity", "last_updated"
+    )
+
+    def __init__(self, student_id: int, mood: str = "neutral", attention_level: float = 0.8,
+                 energy_level: float = 0.8, personality_traits: Optional[Dict[str, str]] = None,
+                 short_term_memory: Optional[list] = None, long_term_memory: Optional[list] = None,
+                 last_interaction: Optional[datetime] = None, current_activity: str = "listening",
+                 last_updated: Optional[datetime] = None):
+        self.student_id = student_id
+        self.mood = mood
+        self.attention_level = attention_level
+        self.energy_level = energy_level
+        self.personality_traits = dict(personality_traits) if personality_traits is not None else _DEFAULT_TRAITS
+        self.short_term_memory = tuple(short_term_memory or ())
+        self.long_term_memory = tuple(long_term_memory or ())
+        self.last_interaction = last_interaction
+        self.current_activity = current_activity
+        self.last_updated = last_updated or datetime.now()
+
+    @classmethod
+    def from_model(cls, state: StudentStateModel) -> "StudentRecord":
+        return cls(
+            student_id=state.student_id,
+            mood=state.mood,
+            attention_level=state.attention_level,
+            energy_level=state.energy_level,
+            personality_traits=state.personality_traits,
+            short_term_memory=state.short_term_memory,
+            long_term_memory=state.long_term_memory,
+            last_interaction=state.last_interaction,
+            current_activity=state.current_activity,
+            last_updated=state.last_updated
+        )
+
+    def to_model(self) -> StudentStateModel:
+        """
+        Fields are validated on the way in (apply), so the model is copied
+        from a template without validation (model_copy skips the per-field
+        default handling model_construct does on every call). Containers are
+        copied so callers cannot mutate the live record.
+        """
+        return _MODEL_TEMPLATE.model_copy(update={
+            "student_id": self.student_id,
+            "mood": self.mood,
+            "attention_level": self.attention_level,
+            "energy_level": self.energy_level,
+            "personality_traits": dict(self.personality_traits),
+            "short_term_memory": list(self.short_term_memory),
+            "long_term_memory": list(self.long_term_memory),
+            "last_interaction": self.last_interaction,
+            "current_activity": self.current_activity,
+            "last_updated": self.last_updated
+        })
+
+    def apply(self, updates: Dict[str, Any]):
+        """
+        Applies known fields (unknown keys are ignored), the rule engine's
+        attention_delta/energy_delta increments, and clamps the levels.
+        """
+        if "mood" in updates and updates["mood"] not in _VALID_MOODS:
+            raise ValueError(f"Invalid mood: {updates['mood']!r}")
+        for key, value in updates.items():
+            if key == "attention_delta":
+                self.attention_level += value
+                continue
+            if key == "energy_delta":
+                self.energy_level += value
+                continue
+            if key == "student_id" or key not in self.__slots__:
+                continue
+            if key in ("short_term_memory", "long_term_memory"):
+                value = tuple(value)
+            elif key == "personality_traits":
+                value = dict(value)
+            setattr(self, key, value)
+
+        self.attention_level = max(0.0, min(1.0, float(self.attention_level)))
+        self.energy_level = max(0.0, min(1.0, float(self.energy_level)))
+
+    def copy(self) -> "StudentRecord":
+        """Shallow copy; safe because containers are replaced, never mutated."""
+        clone = StudentRecord.__new__(StudentRecord)
+        clone.student_id = self.student_id
+        clone.mood = self.mood
+        clone.attention_level = self.attention_level
+        clone.energy_level = self.energy_level
+        clone.personality_traits = self.personality_traits
+        clone.short_term_memory = self.short_term_memory
+        clone.long_term_memory = self.long_term_memory
+        clone.last_interaction = self.last_interaction
+        clone.current_activity = self.current_activity
+        clone.last_updated = self.last_updated
+        return clone
+
+    def to_json(self) -> str:
+        """Serialization for the persistence boundary."""
+        return self.to_model().model_dump_json()
+
+    @classmethod
+    def from_json(cls, data) -> "StudentRecord":
+        return cls.from_model(StudentStateModel.model_validate_json(data))
@@ -0,0 +1,96 @@
+import sys
+import os
+import time
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws.manager import ConnectionManager
+from ws.encoding import as_outbound
+
+ROOMS = 40
+UNITY_PER_ROOM = 2
+DEBUG_PER_ROOM = 3
+TEACHERS_PER_ROOM = 100  # Web panels watching the room: 4,200 sockets in total
+DECISIONS = 2000
+
+
+class NullSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        pass
+
+    async def close(self, code=1000):
+        pass
+
+
+async def _fill(manager):
+    tokens = [("dev-unity-token", UNITY_PER_ROOM), ("dev-debug-token", DEBUG_PER_ROOM), ("dev-token", TEACHERS_PER_ROOM)]
+    for room in range(ROOMS):
+        for token, count in tokens:
+            for _ in range(count):
+                await manager.connect(NullSocket(), f"room_{room}", token)
+
+
+def test_index_follows_connect_and_disconnect():
+    async def run():
+        manager = ConnectionManager()
+        unity, debug = NullSocket(), NullSocket()
+        await manager.connect(unity, "room_i", "dev-unity-token")
+        await manager.connect(debug, "room_i", "dev-debug-token")
+
+        snapshot = manager.room_snapshot("room_i")
+        assert manager.room_snapshot("room_i") is snapshot  # cached, not copied
+        assert [client.websocket for client in manager.recipients("room_i", "unity")] == [unity]
+
+        manager.disconnect(unity)
+        assert manager.recipients("room_i", "unity") == ()
+        assert [meta["role"] for meta in manager.room_snapshot("room_i")] == ["debug"]
+        manager.disconnect(debug)
+        assert "room_i" not in manager.rooms
+        assert manager.room_snapshot("room_i") == ()
+
+    asyncio.run(run())
+
+
+def test_benchmark_role_sends_with_thousands_of_sockets():
+    async def run():
+        manager = ConnectionManager(queue_size=DECISIONS * 2 + 10)
+        await _fill(manager)
+        sockets = len(manager.clients)
+
+        def scan_send(room_id, role, message):
+            # The previous implementation: walk the whole room, look up each role
+            for connection in list(manager.rooms[room_id]):
+                meta = manager.meta.get(connection)
+                if meta and meta["role"] == role:
+                    manager.clients[connection].enqueue(message)
+
+        message = as_outbound({"type": "decision"})
+        started = time.perf_counter()
+        for i in range(DECISIONS):
+            scan_send(f"room_{i % ROOMS}", "unity", message)
+            scan_send(f"room_{i % ROOMS}", "debug", message)
+        scan_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(DECISIONS):
+            await manager.send_to_role(f"room_{i % ROOMS}", "unity", message)
+            await manager.send_to_role(f"room_{i % ROOMS}", "debug", message)
+        indexed_s = time.perf_counter() - started
+
+        print(f"{sockets} sockets, {DECISIONS} decisions: scan {scan_s / DECISIONS * 1e6:.1f} us, "
+              f"index {indexed_s / DECISIONS * 1e6:.1f} us per decision")
+        assert indexed_s < scan_s / 4
+        for client in list(manager.clients.values()):
+            client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_index_follows_connect_and_disconnect()
+    test_benchmark_role_sends_with_thousands_of_sockets()
@@ -0,0 +1,95 @@
+import sys
+import os
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.memory import ConversationMemory, conversation_memory, fold_summary, summary_topics
+from ai.pipeline import pipeline
+from ai.prompt_builder import prompt_builder
+from models.definitions import TeacherInputRequest
+from state.manager import state_manager
+
+TOPICS = ["gezegenler", "fotosentez", "kesirler", "volkanlar", "mıknatıslar"]
+
+
+def test_pipeline_fills_ring_and_summary():
+    student_id = 7001
+    # Explicit commands are answered by the rule fast-path, so no provider is needed
+    for i in range(12):
+        content = f"Ayağa kalk ve {TOPICS[i % len(TOPICS)]} konusunu anlat"
+        asyncio.run(pipeline.process_async(TeacherInputRequest(source="web", teacher_id="memory_test", student_id=student_id,
+                                                               teacher_action="command_stand", content=content)))
+
+    state = state_manager.get_student_state(student_id)
+    capacity = conversation_memory.capacity
+    assert len(state.short_term_memory) == capacity
+    assert TOPICS[11 % len(TOPICS)] in state.short_term_memory[-1]
+
+    # Evicted exchanges wait for the background summarizer
+    assert state.long_term_memory == []
+    conversation_memory.summarize_pending()
+    summary = state_manager.get_student_state(student_id).long_term_memory[-1]
+    print(summary)
+    assert summary.startswith(f"{12 - capacity} konuşma")
+    assert "gezegenler" in summary_topics(summary)
+
+    # The budgeted prompt carries both the summary and the most recent exchanges
+    context = prompt_builder.build("Peki sonra ne oldu?", "unknown", state_manager.get_student_state(student_id))["context"]
+    assert "Önceki konuşmaların özeti" in context and "Son konuşmalar" in context
+
+
+def test_memory_stays_bounded():
+    memory = ConversationMemory(capacity=4, max_topics=5, interval_s=60)
+    student_id = 7002
+    state_manager.update_student_state(student_id, {})
+    for i in range(500):
+        state = state_manager.get_student_state(student_id)
+        state_manager.update_student_state(student_id, memory.record_exchange(state, f"Konu {i} hakkında soru{i % 37}", "Cevap"))
+        # Even if the summarizer never runs, queued evictions stay bounded
+        assert memory.pending_count() <= memory.capacity
+
+    memory.summarize_pending()
+    state = state_manager.get_student_state(student_id)
+    assert len(state.short_term_memory) == 4
+    assert len(state.long_term_memory) == 1
+    assert len(summary_topics(state.long_term_memory[0])) <= 5
+    assert state.long_term_memory[0].startswith("496 konuşma")
+
+
+def test_summarizer_waits_for_the_student_lock():
+    async def run():
+        memory = ConversationMemory(capacity=2, max_topics=5, interval_s=60)
+        student_id = 7003
+        state_manager.update_student_state(student_id, {})
+        for i in range(4):
+            state = state_manager.get_student_state(student_id)
+            state_manager.update_student_state(student_id, memory.record_exchange(state, f"Volkanlar {i}", "Cevap"))
+
+        async with state_manager.student_lock(student_id):
+            summarizer = asyncio.create_task(memory.summarize_pending_async())
+            await asyncio.sleep(0.01)
+            assert not summarizer.done()
+            # A decision folding its own surplus while the summarizer waits
+            state_manager.update_student_state(student_id, {"long_term_memory": ["5 konuşma; konular: gezegenler (5)"]})
+        assert await summarizer == 2
+        summary = state_manager.get_student_state(student_id).long_term_memory[-1]
+        assert summary.startswith("7 konuşma") and summary_topics(summary)["gezegenler"] == 5
+
+    asyncio.run(run())
+
+
+def test_fold_is_incremental():
+    once = fold_summary("", ["Öğretmen: Gezegenler dönüyor | Sen: Evet gezegenler"], 3)
+    twice = fold_summary(once, ["Öğretmen: Gezegenler ve yıldızlar | Sen: Tamam"], 3)
+    assert once == "1 konuşma; konular: dönüyor (1), gezegenler (1)"
+    assert "evet" not in once
+    assert summary_topics(twice)["gezegenler"] == 2 and twice.startswith("2 konuşma")
+
+
+if __name__ == "__main__":
+    test_pipeline_fills_ring_and_summary()
+    test_memory_stays_bounded()
+    test_summarizer_waits_for_the_student_lock()
+    test_fold_is_incremental()
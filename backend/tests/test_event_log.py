@@ -0,0 +1,160 @@
+import sys
+import os
+import time
+import asyncio
+import random
+import tempfile
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state.backends import InProcessStateBackend
+from state.manager import StateManager
+from state.event_log import EventLog, EventLogReader, list_segments
+from models.definitions import AIResponse, AIResponseMeta, DecisionTrace, EMOTIONS
+
+DAY_START = 1_760_000_000.0
+LESSON_S = 8 * 3600
+STUDENTS = 30
+
+
+def _write(manager, log, student_id, updates, ts):
+    """A state write stamped with a simulated time instead of the wall clock."""
+    manager.update_student_state(student_id, updates)
+    log.log_states(manager.get_records([student_id]), ts)
+
+
+def _decision(student_id, decision_id):
+    return AIResponse(
+        student_id=student_id, animation="raise_hand", reply_text="Anladım hocam.", emotion="happy",
+        confidence=0.9, student_state="attentive",
+        decision_trace=DecisionTrace(intent="praise", rule_applied="praise", tier="rule_fast_path",
+                                     state_before={}, state_after={}),
+        meta=AIResponseMeta(timestamp="", source="web", decision_id=decision_id)
+    ).model_dump()
+
+
+def test_point_in_time_replay():
+    directory = tempfile.mkdtemp()
+    manager = StateManager(InProcessStateBackend())
+    log = EventLog(directory, snapshot_s=120)
+
+    for minute, mood in enumerate(["happy", "sleepy", "alert", "motivated", "sad"]):
+        _write(manager, log, 7, {"mood": mood, "attention_delta": -0.1}, DAY_START + minute * 60)
+        log.log_decision("room_a", _decision(7, f"d{minute}"), DAY_START + minute * 60)
+        log.flush_sync()
+
+    reader = EventLogReader(directory)
+    print(f"Segments: {[round(start - DAY_START) for _, start in list_segments(directory)]}")
+    assert len(list_segments(directory)) > 1  # rotated with snapshots
+
+    assert reader.state_at(7, DAY_START - 1) is None
+    at_two = reader.state_at(7, DAY_START + 2 * 60 + 30)
+    assert at_two.mood == "alert"
+    assert abs(at_two.attention_level - 0.5) < 1e-9
+    assert reader.state_at(7).mood == "sad"
+    assert [d["decision_id"] for d in reader.decisions(7, until=DAY_START + 150)] == ["d0", "d1", "d2"]
+
+
+def test_listener_and_restart_resume():
+    directory = tempfile.mkdtemp()
+
+    async def run():
+        manager = StateManager(InProcessStateBackend())
+        log = EventLog(directory, manager, flush_ms=10)
+        log.start()
+        manager.update_student_state(1, {"mood": "happy"})
+        manager.update_student_state(2, {"mood": "sleepy"})
+        await asyncio.sleep(0.05)
+        await log.stop()
+
+        # Next run: a new segment that opens with the previous run's states
+        manager = StateManager(InProcessStateBackend())
+        log = EventLog(directory, manager, flush_ms=10)
+        log.start()
+        manager.update_student_state(2, {"mood": "alert"})
+        await log.stop()
+
+    asyncio.run(run())
+    segments = list_segments(directory)
+    assert len(segments) == 2
+    states = EventLogReader(directory).states_at()
+    print(f"After restart: { {sid: s.mood for sid, s in states.items()} }")
+    assert states[1].mood == "happy"
+    assert states[2].mood == "alert"
+
+
+def test_torn_tail_and_compaction():
+    directory = tempfile.mkdtemp()
+    manager = StateManager(InProcessStateBackend())
+    log = EventLog(directory, snapshot_s=3600, retention_s=2 * 3600)
+    for hour in range(6):
+        _write(manager, log, 3, {"mood": EMOTIONS[hour % len(EMOTIONS)]}, DAY_START + hour * 3600)
+        log.flush_sync()
+    removed = log.compact(now=DAY_START + 6 * 3600)
+    print(f"Compaction removed {removed} segments")
+    assert removed > 0
+    # Older history is gone but the latest state survives through the snapshots
+    assert EventLogReader(directory).state_at(3).mood == EMOTIONS[5 % len(EMOTIONS)]
+
+    # A crash mid-write leaves a partial event; replay stops cleanly before it
+    last_path = list_segments(directory)[-1][0]
+    with open(last_path, "ab") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+    assert EventLogReader(directory).state_at(3).mood == EMOTIONS[5 % len(EMOTIONS)]
+
+
+def test_full_day_replay_is_fast():
+    """A full lesson day of a 30-student room: one decision per student per minute plus 10s decay writes."""
+    directory = tempfile.mkdtemp()
+    manager = StateManager(InProcessStateBackend())
+    log = EventLog(directory)
+    rng = random.Random(4)
+
+    started = time.perf_counter()
+    events = 0
+    for second in range(0, LESSON_S, 10):
+        ts = DAY_START + second
+        for student_id in range(1, STUDENTS + 1):
+            if second % 60 == (student_id * 10) % 60:
+                _write(manager, log, student_id, {
+                    "mood": rng.choice(EMOTIONS), "attention_delta": 0.1,
+                    "short_term_memory": [f"Öğretmen: soru {second} | Sen: cevap"]
+                }, ts)
+                log.log_decision("room_a", _decision(student_id, f"{student_id}-{second}"), ts)
+                events += 2
+            else:
+                _write(manager, log, student_id, {"attention_delta": -0.005, "energy_delta": -0.0025}, ts)
+                events += 1
+        if second % 300 == 0:
+            log.flush_sync()
+    log.flush_sync()
+    append_s = time.perf_counter() - started
+
+    size = sum(os.path.getsize(path) for path, _ in list_segments(directory))
+    reader = EventLogReader(directory)
+
+    started = time.perf_counter()
+    noon = reader.states_at(DAY_START + LESSON_S / 2)
+    point_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    replayed = 0
+    for event in reader.events():
+        replayed += 1
+    full_s = time.perf_counter() - started
+
+    print(f"{events} events, {size / 1024:.0f} KiB, {len(list_segments(directory))} segments; "
+          f"append {events / append_s:,.0f} ev/s, room state at noon {point_s * 1000:.1f} ms, "
+          f"full day decode {full_s * 1000:.0f} ms")
+    assert len(noon) == STUDENTS
+    assert replayed >= events
+    assert full_s < 5.0
+    assert point_s < 1.0
+
+
+if __name__ == "__main__":
+    test_point_in_time_replay()
+    test_listener_and_restart_resume()
+    test_torn_tail_and_compaction()
+    test_full_day_replay_is_fast()
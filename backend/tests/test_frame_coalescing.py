@@ -0,0 +1,106 @@
+import sys
+import os
+import json
+import time
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws.manager import ConnectionManager
+
+STUDENTS = 10
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+
+def test_one_batch_per_client_per_window():
+    async def run():
+        manager = ConnectionManager(coalesce_roles=("unity",), coalesce_window_ms=20)
+        unity, unity_delta, debug = RecordingSocket(), RecordingSocket(), RecordingSocket()
+        await manager.connect(unity, "room_c", "dev-unity-token")
+        await manager.connect(unity_delta, "room_c", "dev-unity-token", state_mode="delta")
+        await manager.connect(debug, "room_c", "dev-debug-token")
+        manager.sync_state(unity_delta)
+
+        for i in range(100):
+            decision = {"student_id": i % STUDENTS, "reply_text": f"cevap {i}"}
+            await manager.send_state("room_c", "unity", decision, [decision], key=i % STUDENTS)
+            await manager.send_to_role("room_c", "debug", decision)
+        await manager.send_to_role("room_c", "unity", {"type": "REPLY_DELTA", "delta": "Gü"})
+        # Simulation ticks: merged into one STATE_UPDATE, latest entry per student
+        for tick in range(5):
+            students = [{"student_id": s, "student_state": f"tick {tick}"} for s in (tick % 2, 2)]
+            await manager.send_state("room_c", "unity", {"type": "STATE_UPDATE", "room_id": "room_c", "students": students}, students)
+        await asyncio.sleep(0.06)
+
+        # Debug is not coalesced: every event
+        assert len(debug.sent) == 100
+        # Unity: one frame, the latest decision per student plus the unkeyed and merged messages
+        assert len(unity.sent) == 1
+        batch = unity.sent[0]
+        assert batch["type"] == "FRAME_BATCH"
+        assert [m.get("reply_text") for m in batch["messages"]] == [f"cevap {90 + s}" for s in range(STUDENTS)] + [None, None]
+        assert batch["messages"][-1] == {"type": "STATE_UPDATE", "room_id": "room_c", "students": [
+            {"student_id": 0, "student_state": "tick 4"}, {"student_id": 2, "student_state": "tick 4"},
+            {"student_id": 1, "student_state": "tick 3"}
+        ]}
+        # Delta clients: one merged STATE_DELTA and the non-state messages
+        assert [m["type"] for m in unity_delta.sent] == ["STATE_SNAPSHOT", "STATE_DELTA", "FRAME_BATCH"]
+        assert unity_delta.sent[1]["seq"] == 1
+        assert len(unity_delta.sent[1]["students"]) == STUDENTS
+        assert unity_delta.sent[2]["messages"] == [{"type": "REPLY_DELTA", "delta": "Gü"}]
+        for client in list(manager.clients.values()):
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_benchmark_frames_per_second_under_a_burst():
+    async def run():
+        plain = ConnectionManager()
+        ticked = ConnectionManager(coalesce_roles=("unity",), coalesce_window_ms=33)
+        sockets = {}
+        for name, manager in (("plain", plain), ("ticked", ticked)):
+            sockets[name] = RecordingSocket()
+            await manager.connect(sockets[name], "room_f", "dev-unity-token")
+
+        # A whole class reacting at once: ~600 decisions over about a second
+        started = time.perf_counter()
+        for i in range(600):
+            decision = {"student_id": i % 30, "animation": "raise_hand"}
+            for manager in (plain, ticked):
+                await manager.send_state("room_f", "unity", decision, [decision], key=i % 30)
+            if i % 6 == 5:
+                await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.1)
+
+        plain_frames, ticked_frames = len(sockets["plain"].sent), len(sockets["ticked"].sent)
+        delivered = sum(len(frame["messages"]) for frame in sockets["ticked"].sent)
+        print(f"600 decisions in {elapsed:.2f}s: {plain_frames} frames without coalescing, "
+              f"{ticked_frames} frames carrying {delivered} messages with a 33 ms window")
+        assert plain_frames == 600
+        assert ticked_frames <= elapsed / 0.033 + 2
+        for manager in (plain, ticked):
+            for client in list(manager.clients.values()):
+                client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_one_batch_per_client_per_window()
+    test_benchmark_frames_per_second_under_a_burst()
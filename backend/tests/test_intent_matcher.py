@@ -0,0 +1,77 @@
+import sys
+import os
+import time
+import random
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp.intent_matcher import IntentMatcher
+from nlp.knowledge_base import knowledge_base
+
+
+def linear_scan(keyword_map, text):
+    """The previous KnowledgeBase.find_intent, kept as the benchmark baseline."""
+    text_lower = text.lower()
+    for keyword, intent in keyword_map.items():
+        if keyword in text_lower:
+            return intent
+    return "unknown"
+
+
+def test_turkish_case_folding_and_word_boundaries():
+    assert knowledge_base.find_intent("ANLADIN MI?") == "comprehension_check"
+    assert knowledge_base.find_intent("İyi, şimdi YERİNE geç") == "command_sit"
+    assert knowledge_base.find_intent("Lütfen oturur musun?") == "command_sit"
+    assert knowledge_base.find_intent("Sus artık!") == "discipline"
+    # Previously matched "sus" inside a longer word
+    assert knowledge_base.find_intent("Bugün çok susuz kaldım") == "unknown"
+    # Keywords are whole words: "soru" is not in "sorun", "dinle" not in "dinlendin"
+    assert knowledge_base.find_intent("Bir sorun mu var?") == "unknown"
+    assert knowledge_base.find_intent("Teneffüste dinlendin mi?") == "unknown"
+    assert knowledge_base.find_intent("Şimdi bir soru soracağım") == "question_expectation"
+
+
+def test_stems_take_suffixes():
+    assert sorted(knowledge_base.stem_keywords) == ["kalk", "otur"]
+    assert knowledge_base.find_intent("Oturun çocuklar") == "command_sit"
+    assert knowledge_base.find_intent("Kalkar mısın?") == "command_stand"
+    # Non-stem keywords only match on their own
+    assert knowledge_base.find_intent("Sessizce çalışın") == "unknown"
+
+
+def test_priority_decides_between_multiple_hits():
+    # Praise appears first, but the physical command has higher priority
+    assert knowledge_base.find_intent("Aferin, şimdi otur") == "command_sit"
+
+
+def test_benchmark_against_linear_scan():
+    rng = random.Random(7)
+    alphabet = "abcçdefgğhıijklmnoöprsştuüvyz"
+    keyword_map = dict(knowledge_base.keyword_map)
+    while len(keyword_map) < 5000:
+        word = "".join(rng.choice(alphabet) for _ in range(rng.randint(5, 10)))
+        keyword_map[word] = f"intent_{len(keyword_map) % 50}"
+
+    matcher = IntentMatcher(keyword_map)
+    texts = ["Güneş sistemi hakkında biraz bilgi verir misin, merak ediyorum"] * 200
+
+    start = time.perf_counter()
+    for text in texts:
+        linear_scan(keyword_map, text)
+    linear_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    start = time.perf_counter()
+    for text in texts:
+        matcher.best_intent(text)
+    automaton_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    print(f"{len(keyword_map)} keywords: linear scan {linear_us:.1f} us/text, automaton {automaton_us:.1f} us/text")
+    assert automaton_us < linear_us
+
+
+if __name__ == "__main__":
+    test_turkish_case_folding_and_word_boundaries()
+    test_stems_take_suffixes()
+    test_priority_decides_between_multiple_hits()
+    test_benchmark_against_linear_scan()
@@ -0,0 +1,63 @@
+import sys
+import os
+import asyncio
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from ai.pipeline import pipeline
+from core.metrics import MetricsRegistry, _Metric, pipeline_stage_seconds
+from models.definitions import TeacherInputRequest
+from main import app
+
+PIPELINE_STAGES = ["context", "nlp", "state_load", "rules", "ai_reasoning", "validation", "response_build", "persistence"]
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo", ["stage"], buckets=[0.1, 1.0])
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5.0, stage="a")
+    text = registry.render()
+    print(text)
+
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{stage="a",le="1.0"} 2' in text
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{stage="a"} 3' in text
+
+
+def test_metric_kinds_must_render_samples():
+    class Unrendered(_Metric):
+        kind = "gauge"
+
+    try:
+        Unrendered("demo_total", "Demo")
+    except TypeError:
+        return
+    raise AssertionError("a metric without _samples must fail when it is built")
+
+
+def test_stage_timings_reach_response_and_metrics():
+    before = pipeline_stage_seconds.count(stage="ai_reasoning")
+    # Explicit command: answered by the rule fast-path, no provider needed
+    req = TeacherInputRequest(source="web", teacher_id="metrics_test", student_id=7, content="Ayağa kalk")
+    response = asyncio.run(pipeline.process_async(req))
+
+    timings = response.meta.stage_timings_ms
+    print(timings)
+    assert list(timings) == PIPELINE_STAGES
+    assert all(value >= 0 for value in timings.values())
+    assert pipeline_stage_seconds.count(stage="ai_reasoning") == before + 1
+
+    body = TestClient(app).get("/metrics").text
+    assert 'vc_pipeline_stage_seconds_bucket{stage="nlp",le="+Inf"}' in body
+    assert "vc_pipeline_decisions_total{tier=" in body
+
+
+if __name__ == "__main__":
+    test_histogram_renders_cumulative_buckets()
+    test_metric_kinds_must_render_samples()
+    test_stage_timings_reach_response_and_metrics()
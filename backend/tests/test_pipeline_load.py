@@ -0,0 +1,67 @@
+import sys
+import os
+import time
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from core.config import settings
+from models.definitions import TeacherInputRequest
+
+SIMULATED_LLM_LATENCY_S = 0.05
+TOTAL_REQUESTS = 64
+
+
+async def _fake_llm(prompt: str, context: str = "", structured: bool = False):
+    """Stands in for a provider round-trip: pure network wait, no CPU."""
+    await asyncio.sleep(SIMULATED_LLM_LATENCY_S)
+    return json.dumps({"reply_text": "Dinliyorum.", "animation": "listening_pose", "emotion": "neutral"})
+
+
+async def _run(concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            req = TeacherInputRequest(
+                source="web",
+                teacher_id="load_test",
+                student_id=i % 30,
+                content="Güneş sistemi hakkında bilgi ver"
+            )
+            await pipeline.process_async(req)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(TOTAL_REQUESTS)))
+    elapsed = time.perf_counter() - start
+    return TOTAL_REQUESTS / elapsed
+
+
+def test_throughput_scales_with_concurrency():
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_fake_llm))])
+    # Measure the provider path, not the response cache
+    cache_enabled = settings.RESPONSE_CACHE_ENABLED
+    settings.RESPONSE_CACHE_ENABLED = False
+    try:
+        results = {c: asyncio.run(_run(c)) for c in (1, 8, 32)}
+    finally:
+        provider_router_module.provider_router = original
+        settings.RESPONSE_CACHE_ENABLED = cache_enabled
+
+    for concurrency, throughput in results.items():
+        print(f"concurrency={concurrency:>2}  throughput={throughput:7.1f} req/s")
+
+    # With a blocking pipeline these numbers would stay flat at ~1/latency.
+    assert results[8] > results[1] * 4
+    assert results[32] > results[8] * 2
+
+
+if __name__ == "__main__":
+    test_throughput_scales_with_concurrency()
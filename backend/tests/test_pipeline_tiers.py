@@ -0,0 +1,70 @@
+import sys
+import os
+import asyncio
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from models.definitions import TeacherInputRequest
+
+
+def test_button_command_skips_the_llm():
+    calls = []
+
+    async def _should_not_be_called(prompt, context="", structured=False):
+        calls.append(prompt)
+        return None
+
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_should_not_be_called))])
+    try:
+        req = TeacherInputRequest(
+            source="web",
+            teacher_id="test_teacher",
+            student_id=101,
+            teacher_action="command_sit",
+            content="Otur"
+        )
+        response = asyncio.run(pipeline.process_async(req))
+    finally:
+        provider_router_module.provider_router = original
+
+    print(f"{response.decision_trace.tier}: {response.animation} / {response.reply_text}")
+    assert calls == []
+    assert response.animation == "sit"
+    assert response.decision_trace.tier == "rule_fast_path"
+
+
+def test_keyword_inside_a_question_still_asks_the_llm():
+    calls = []
+
+    async def _fake_llm(prompt, context="", structured=False):
+        calls.append(prompt)
+        return '{"reply_text": "Bitkilerin güneşle besin üretmesi.", "animation": "talk", "emotion": "happy"}'
+
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_fake_llm))])
+    try:
+        # "Merhaba" is a greeting keyword, but the message is a question
+        question = TeacherInputRequest(source="web", teacher_id="test_teacher", student_id=102,
+                                       content="Merhaba, fotosentez nedir?")
+        answered = asyncio.run(pipeline.process_async(question))
+        # A message made only of command keywords is still answered from the templates
+        command = TeacherInputRequest(source="web", teacher_id="test_teacher", student_id=103, content="Ayağa kalk!")
+        templated = asyncio.run(pipeline.process_async(command))
+    finally:
+        provider_router_module.provider_router = original
+
+    print(f"{answered.decision_trace.tier}: {answered.reply_text}")
+    assert len(calls) == 1
+    assert answered.decision_trace.tier == "llm"
+    assert templated.decision_trace.tier == "rule_fast_path"
+
+
+if __name__ == "__main__":
+    test_button_command_skips_the_llm()
+    test_keyword_inside_a_question_still_asks_the_llm()
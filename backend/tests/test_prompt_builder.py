@@ -0,0 +1,40 @@
+import sys
+import os
+from datetime import datetime
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.prompt_builder import PromptBuilder, estimate_tokens, STUDENT_SYSTEM_PROMPT_STRUCTURED
+from models.definitions import StudentStateModel
+
+
+def _state(memory):
+    return StudentStateModel(
+        student_id=1, mood="neutral", attention_level=0.8, energy_level=0.8,
+        current_activity="listening", last_updated=datetime.now(), short_term_memory=memory
+    )
+
+
+def test_context_respects_token_budget_and_keeps_newest_memory():
+    builder = PromptBuilder(token_budget=120, memory_items=50)
+    memory = [f"Öğretmen: soru {i} / Ben: uzun bir cevap veriyorum {i}" for i in range(50)]
+    prompt = builder.build("Aferin sana", "praise", _state(memory))
+
+    used = estimate_tokens(prompt["text"]) + estimate_tokens(prompt["context"])
+    print(f"context uses ~{used} tokens")
+    assert used <= 120
+    assert "soru 49" in prompt["context"]
+    assert "soru 0 " not in prompt["context"]
+
+
+def test_unknown_intent_sends_no_keyword_list():
+    builder = PromptBuilder(token_budget=400, memory_items=6)
+    prompt = builder.build("Güneş sistemi hakkında bilgi ver", "unknown", _state([]))
+    assert "merhaba" not in prompt["context"]
+    assert builder.system_prompt(True) is STUDENT_SYSTEM_PROMPT_STRUCTURED
+
+
+if __name__ == "__main__":
+    test_context_respects_token_budget_and_keeps_newest_memory()
+    test_unknown_intent_sends_no_keyword_list()
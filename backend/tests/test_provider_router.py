@@ -0,0 +1,87 @@
+import sys
+import os
+import time
+import asyncio
+import json
+from contextlib import contextmanager
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import settings
+from ai.provider_router import ProviderRouter
+
+VALID = json.dumps({"reply_text": "Tamam.", "animation": "happy_nod", "emotion": "happy"})
+
+
+@contextmanager
+def override_settings(**values):
+    previous = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+
+class FakeProvider:
+    def __init__(self, delay_s: float, reply=VALID):
+        self.delay_s = delay_s
+        self.reply = reply
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate_response_async(self, prompt, context="", structured=False):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay_s)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.reply
+
+
+def test_hedged_request_beats_hanging_primary():
+    primary, backup = FakeProvider(delay_s=5.0), FakeProvider(delay_s=0.01)
+    router = ProviderRouter([("primary", primary), ("backup", backup)])
+
+    with override_settings(LLM_HEDGE_AFTER_MS=50):
+        start = time.perf_counter()
+        result = asyncio.run(router.generate("Merhaba", structured=True))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"hedged answer in {elapsed_ms:.0f} ms")
+    assert result == VALID
+    assert elapsed_ms < 500
+    assert primary.cancelled == 1
+    assert router.get_stats()["backup"]["successes"] == 1
+
+
+def test_invalid_json_falls_through_without_waiting_for_hedge():
+    primary, backup = FakeProvider(delay_s=0.0, reply="not json"), FakeProvider(delay_s=0.0)
+    router = ProviderRouter([("primary", primary), ("backup", backup)])
+
+    with override_settings(LLM_HEDGE_AFTER_MS=2000):
+        assert asyncio.run(router.generate("Merhaba", structured=True)) == VALID
+    assert router.get_stats()["primary"]["errors"] == 1
+
+
+def test_breaker_opens_and_skips_failing_provider():
+    with override_settings(LLM_HEDGE_AFTER_MS=2000, LLM_BREAKER_FAILURE_THRESHOLD=2):
+        primary, backup = FakeProvider(delay_s=0.0, reply=None), FakeProvider(delay_s=0.0)
+        router = ProviderRouter([("primary", primary), ("backup", backup)])
+        for _ in range(5):
+            asyncio.run(router.generate("Merhaba", structured=True))
+
+    stats = router.get_stats()
+    assert stats["primary"]["breaker"] == "open"
+    assert primary.calls == 2
+    assert stats["primary"]["skipped_open"] == 3
+
+
+if __name__ == "__main__":
+    test_hedged_request_beats_hanging_primary()
+    test_invalid_json_falls_through_without_waiting_for_hedge()
+    test_breaker_opens_and_skips_failing_provider()
@@ -0,0 +1,238 @@
+import sys
+import os
+import json
+import asyncio
+import subprocess
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+
+from core.metrics import pubsub_messages_total
+from ws.manager import ConnectionManager
+from ws.pubsub import BrokerBus, RedisBus, _BatchingBus, load_frame
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+
+class StalledWriter:
+    """A broker connection that accepts writes but never drains."""
+
+    def __init__(self):
+        self.frames = []
+        self.release = asyncio.Event()
+
+    def write(self, data):
+        self.frames.append(load_frame(data))
+
+    async def drain(self):
+        await self.release.wait()
+
+
+def _spawn_broker():
+    """Starts ws/broker.py on a free port; returns (process, url)."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ws.broker", "--port", "0"],
+        cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    assert "listening" in line, line
+    return process, f"tcp://127.0.0.1:{line.rsplit(':', 1)[1].strip()}"
+
+
+async def _wait_for(condition, timeout_s=2.0):
+    for _ in range(int(timeout_s / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+async def _close_all(*managers):
+    for manager in managers:
+        for client in list(manager.clients.values()):
+            client.close()
+        await manager.bus.stop()
+
+
+def test_rooms_reach_sockets_of_other_workers_through_the_broker():
+    process, url = _spawn_broker()
+
+    async def run():
+        # Two "workers": each manager has its own bus connection to the broker
+        worker_a = ConnectionManager(bus=BrokerBus(url, batch_ms=1))
+        worker_b = ConnectionManager(bus=BrokerBus(url, batch_ms=1))
+        for worker in (worker_a, worker_b):
+            await worker.bus.start()
+            await asyncio.wait_for(worker.bus.connected.wait(), 5)
+
+        unity_on_a = RecordingSocket()
+        other_room_on_b = RecordingSocket()
+        await worker_a.connect(unity_on_a, "room_x", "dev-unity-token")
+        await worker_b.connect(other_room_on_b, "room_y", "dev-unity-token")
+        assert worker_a.bus.rooms == {"room_x"} and worker_b.bus.rooms == {"room_y"}
+        await asyncio.sleep(0.05)  # Subscriptions reach the broker
+
+        # A decision made on B reaches the Unity socket held by A, in order
+        for i in range(20):
+            await worker_b.send_to_role("room_x", "unity", {"n": i})
+        await _wait_for(lambda: len(unity_on_a.sent) == 20)
+        assert [m["n"] for m in unity_on_a.sent] == list(range(20))
+
+        # B holds no socket of room_x, so A's own traffic is not relayed to it
+        await worker_a.send_to_role("room_x", "unity", {"n": 20})
+        await asyncio.sleep(0.05)
+        assert other_room_on_b.sent == []
+        assert len(unity_on_a.sent) == 21  # Delivered locally once, not echoed back
+
+        # Once A's last socket leaves, it unsubscribes from the room
+        worker_a.disconnect(unity_on_a)
+        assert "room_x" not in worker_a.bus.rooms
+        await _close_all(worker_a, worker_b)
+
+    try:
+        asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait(5)
+
+
+def test_publishes_are_batched_per_window():
+    process, url = _spawn_broker()
+
+    async def run():
+        publisher = ConnectionManager(bus=BrokerBus(url, batch_ms=5, batch_max=64))
+        subscriber = ConnectionManager(bus=BrokerBus(url, batch_ms=5))
+        for worker in (publisher, subscriber):
+            await worker.bus.start()
+            await asyncio.wait_for(worker.bus.connected.wait(), 5)
+        socket = RecordingSocket()
+        await subscriber.connect(socket, "room_z", "dev-debug-token")
+        await asyncio.sleep(0.05)
+
+        batches = []
+        send_batch = publisher.bus._send_batch
+        publisher.bus._send_batch = lambda batch: (batches.append(len(batch)), send_batch(batch))
+        for i in range(100):
+            await publisher.send_to_role("room_z", "debug", {"n": i})
+        await _wait_for(lambda: len(socket.sent) == 100)
+        print(f"100 publishes went out as {len(batches)} batches: {batches}")
+        assert batches == [64, 36]
+        assert [m["n"] for m in socket.sent] == list(range(100))
+        await _close_all(publisher, subscriber)
+
+    try:
+        asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait(5)
+
+
+def test_publishes_wait_for_the_broker_up_to_a_bound():
+    process, url = _spawn_broker()
+
+    async def run():
+        subscriber = ConnectionManager(bus=BrokerBus(url, batch_ms=1))
+        await subscriber.bus.start()
+        await asyncio.wait_for(subscriber.bus.connected.wait(), 5)
+        socket = RecordingSocket()
+        await subscriber.connect(socket, "room_w", "dev-debug-token")
+
+        # Not connected yet: publishes are kept, the oldest beyond the bound dropped
+        publisher = ConnectionManager(bus=BrokerBus(url, batch_ms=1, backlog_max=5))
+        dropped = pubsub_messages_total.value(direction="dropped")
+        for i in range(8):
+            await publisher.send_to_role("room_w", "debug", {"n": i})
+        await asyncio.sleep(0.05)
+        assert pubsub_messages_total.value(direction="dropped") == dropped + 3
+
+        await publisher.bus.start()
+        await _wait_for(lambda: len(socket.sent) == 5)
+        assert [m["n"] for m in socket.sent] == [3, 4, 5, 6, 7]
+        await _close_all(publisher, subscriber)
+
+    try:
+        asyncio.run(run())
+    finally:
+        process.terminate()
+        process.wait(5)
+
+
+def test_a_slow_broker_backs_up_into_the_bounded_backlog():
+    async def run():
+        bus = BrokerBus("tcp://127.0.0.1:1", batch_ms=1, batch_max=10, backlog_max=20)
+        writer = StalledWriter()
+        sender = asyncio.create_task(bus._send_loop(writer))
+        dropped = pubsub_messages_total.value(direction="dropped")
+        for i in range(100):
+            bus.publish("room_d", {"n": i})
+        await asyncio.sleep(0.01)
+
+        # One frame written, then the sender waits for drain() instead of writing on
+        assert len(writer.frames) == 1
+        assert len(bus._backlog) == 10
+        assert pubsub_messages_total.value(direction="dropped") == dropped + 80
+
+        writer.release.set()
+        await asyncio.sleep(0.01)
+        assert [entry[1]["n"] for frame in writer.frames for entry in frame["batch"]] == list(range(80, 100))
+        sender.cancel()
+
+    asyncio.run(run())
+
+
+def test_batching_bus_is_abstract():
+    try:
+        _BatchingBus()
+    except TypeError:
+        return
+    raise AssertionError("_BatchingBus must not be instantiable")
+
+
+def test_state_deltas_over_redis_pubsub():
+    async def run():
+        server = fakeredis.FakeServer()
+        worker_a = ConnectionManager(bus=RedisBus(client=fakeredis.FakeAsyncRedis(server=server), batch_ms=1))
+        worker_b = ConnectionManager(bus=RedisBus(client=fakeredis.FakeAsyncRedis(server=server), batch_ms=1))
+        for worker in (worker_a, worker_b):
+            await worker.bus.start()
+
+        unity = RecordingSocket()
+        await worker_a.connect(unity, "room_r", "dev-unity-token", state_mode="delta")
+        worker_a.sync_state(unity)
+        await asyncio.sleep(0.1)
+
+        # A malformed message is skipped; the listener keeps running
+        await worker_b.bus.client.publish(RedisBus.CHANNEL_PREFIX + "room_r", b"not json")
+        update = {"student_id": 5, "student_state": "sleepy"}
+        await worker_b.send_state("room_r", "unity", update, [update])
+        await _wait_for(lambda: len(unity.sent) == 2)
+        assert unity.sent[0]["type"] == "STATE_SNAPSHOT"
+        assert unity.sent[1] == {"type": "STATE_DELTA", "room_id": "room_r", "seq": 1, "students": [update]}
+        await _close_all(worker_a, worker_b)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_rooms_reach_sockets_of_other_workers_through_the_broker()
+    test_publishes_are_batched_per_window()
+    test_publishes_wait_for_the_broker_up_to_a_bound()
+    test_a_slow_broker_backs_up_into_the_bounded_backlog()
+    test_batching_bus_is_abstract()
+    test_state_deltas_over_redis_pubsub()
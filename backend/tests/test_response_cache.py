@@ -0,0 +1,59 @@
+import sys
+import os
+from datetime import datetime
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.response_cache import ResponseCache
+from models.definitions import StudentStateModel
+
+
+def _state(mood="neutral", attention=0.8, energy=0.8) -> StudentStateModel:
+    return StudentStateModel(
+        student_id=1, mood=mood, attention_level=attention, energy_level=energy,
+        current_activity="listening", last_updated=datetime.now()
+    )
+
+
+def test_key_normalizes_text_and_buckets_state():
+    cache = ResponseCache(max_entries=8, ttl_s=60, max_variants=2, explore_rate=0.0, state_buckets=4)
+    a = cache.make_key("  Anladın mı?", "comprehension_check", _state(attention=0.80))
+    b = cache.make_key("ANLADIN MI", "comprehension_check", _state(attention=0.82))
+    c = cache.make_key("Anladın mı?", "comprehension_check", _state(mood="sleepy"))
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction_ttl_and_counters():
+    cache = ResponseCache(max_entries=2, ttl_s=60, max_variants=2, explore_rate=0.0, state_buckets=4)
+    reply = {"reply_text": "Evet.", "animation": "happy_nod", "emotion": "happy"}
+    cache.put(("a",), reply)
+    cache.put(("b",), reply)
+    assert cache.get(("a",)) == reply  # "a" becomes most recent
+    cache.put(("c",), reply)           # evicts "b"
+    assert cache.get(("b",)) is None
+
+    cache.ttl_s = 0
+    cache.put(("d",), reply)
+    assert cache.get(("d",)) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["evictions"] == 2
+    assert stats["expirations"] == 1
+
+
+def test_variants_are_bounded_and_all_served():
+    cache = ResponseCache(max_entries=8, ttl_s=60, max_variants=2, explore_rate=0.0, state_buckets=4)
+    for text in ("Bir.", "İki.", "Üç."):
+        cache.put(("k",), {"reply_text": text, "animation": "idle", "emotion": "neutral"})
+    served = {cache.get(("k",))["reply_text"] for _ in range(200)}
+    assert served == {"İki.", "Üç."}
+
+
+if __name__ == "__main__":
+    test_key_normalizes_text_and_buckets_state()
+    test_lru_eviction_ttl_and_counters()
+    test_variants_are_bounded_and_all_served()
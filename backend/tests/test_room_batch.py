@@ -0,0 +1,48 @@
+import sys
+import os
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from models.definitions import RoomBatchInputRequest
+
+
+def test_one_provider_call_for_the_whole_room():
+    calls = []
+
+    async def _fake_batch_llm(prompt, context="", structured=False, **options):
+        calls.append(options)
+        students = json.loads(context)
+        return json.dumps({"students": [
+            {"student_id": s["student_id"], "reply_text": f"Öğrenci {s['student_id']} dinliyor.",
+             "animation": "listening_pose", "emotion": "neutral"}
+            for s in students
+        ]}, ensure_ascii=False)
+
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_fake_batch_llm))])
+    try:
+        batch = RoomBatchInputRequest(
+            teacher_id="test_teacher",
+            student_ids=list(range(300, 330)),
+            content="Çocuklar, bugün fotosentezi işleyeceğiz, hazır mısınız?"
+        )
+        responses = asyncio.run(pipeline.process_batch_async(batch))
+    finally:
+        provider_router_module.provider_router = original
+
+    print(f"{len(responses)} responses from {len(calls)} provider call(s)")
+    assert len(calls) == 1
+    assert [r.student_id for r in responses] == list(range(300, 330))
+    assert responses[5].reply_text == "Öğrenci 305 dinliyor."
+    assert {r.decision_trace.tier for r in responses} == {"llm_batch"}
+
+
+if __name__ == "__main__":
+    test_one_provider_call_for_the_whole_room()
@@ -0,0 +1,140 @@
+import sys
+import os
+import json
+import time
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.rule_engine import RuleEngine, DecayRules
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from models.definitions import TeacherInputRequest, EMOTIONS
+
+EVALUATIONS = 100_000
+
+
+def _write_table(path, table):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(table, f)
+
+
+def test_most_specific_rule_wins():
+    engine = RuleEngine()
+
+    assert engine.evaluate("praise", "neutral", 0.8, 0.8).id == "praise"
+    # Bounded rule beats the plain intent rule only inside its bounds
+    assert engine.evaluate("praise", "neutral", 0.2, 0.8).id == "praise_low_attention"
+    # Exact mood beats '*'
+    assert engine.evaluate("discipline", "sleepy", 0.5, 0.5).id == "discipline_wakes_sleepy"
+    assert engine.evaluate("discipline", "happy", 0.5, 0.5).id == "discipline"
+    # Unknown intents fall back to the default rule
+    assert engine.evaluate("question", "neutral", 0.5, 0.5).id == "default"
+
+    ignore = engine.evaluate("ignore", "happy", 0.5, 0.5)
+    assert "mood" not in ignore.updates
+    assert engine.evaluate("command_sit", "neutral", 0.5, 0.5).animation == "sit"
+
+
+def test_decay_rules_match_the_previous_behaviour():
+    decay = DecayRules({})
+    assert decay.next_mood("happy", 0.8, 0.2) == "sleepy"
+    assert decay.next_mood("sad", 0.8, 0.2) == "sad"
+    assert decay.next_mood("neutral", 0.2, 0.8) == "confused"
+    assert decay.next_mood("happy", 0.2, 0.8) == "happy"
+
+
+def test_hot_reload_and_broken_edit():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.json")
+        _write_table(path, {"rules": [{"id": "praise_v1", "intent": "praise", "mood": "happy"}]})
+        engine = RuleEngine(path, reload_check_s=0)
+        assert engine.evaluate("praise", "neutral", 0.5, 0.5).id == "praise_v1"
+
+        _write_table(path, {"rules": [{"id": "praise_v2", "intent": "praise", "mood": "motivated"}]})
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+        rule = engine.evaluate("praise", "neutral", 0.5, 0.5)
+        print(f"Reloaded: version {engine.version}, rule {rule.id}")
+        assert rule.id == "praise_v2"
+        assert engine.version == 2
+
+        # An invalid table is rejected and the previous one keeps serving
+        _write_table(path, {"rules": [{"id": "bad", "intent": "praise", "mood": "furious"}]})
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 2_000_000))
+        assert engine.evaluate("praise", "neutral", 0.5, 0.5).id == "praise_v2"
+        assert engine.version == 2
+
+
+def test_pipeline_trace_names_the_rule():
+    async def _no_llm(prompt, context="", structured=False):
+        return None
+
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_no_llm))])
+    try:
+        req = TeacherInputRequest(
+            source="web",
+            teacher_id="test_teacher",
+            student_id=117,
+            teacher_action="command_stand",
+            content="Ayağa kalk"
+        )
+        response = asyncio.run(pipeline.process_async(req))
+    finally:
+        provider_router_module.provider_router = original
+
+    print(f"Trace: rule={response.decision_trace.rule_applied} tier={response.decision_trace.tier}")
+    assert response.decision_trace.rule_applied == "command_stand"
+    assert response.animation == "stand"
+
+
+def test_benchmark_compiled_dispatch():
+    """Evaluations/sec with a large generated table, against a linear scan of the same rules."""
+    intents = [f"intent_{i}" for i in range(100)]
+    rules = []
+    for i, intent in enumerate(intents):
+        rules.append({"id": f"{intent}_base", "intent": intent, "mood": "happy", "attention_delta": 0.1})
+        rules.append({"id": f"{intent}_low", "intent": intent, "attention_below": 0.3, "mood": "motivated"})
+        rules.append({"id": f"{intent}_sleepy", "intent": intent, "when_mood": "sleepy", "mood": "alert"})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rules.json")
+        _write_table(path, {"rules": rules})
+        engine = RuleEngine(path, reload_check_s=3600)
+
+    queries = [(intents[i % len(intents)], EMOTIONS[i % len(EMOTIONS)], (i % 10) / 10, 0.5) for i in range(1000)]
+
+    ordered = sorted(engine.rules, key=lambda rule: rule.specificity(), reverse=True)
+
+    def linear(intent, mood, attention, energy):
+        for rule in ordered:
+            if rule.intent in (intent, "*") and rule.when_mood in (mood, "*") and (rule.bounds is None or rule.within(attention, energy)):
+                return rule
+        return engine.default
+
+    for query in queries:
+        assert engine.evaluate(*query) is linear(*query)
+
+    started = time.perf_counter()
+    for i in range(EVALUATIONS):
+        engine.evaluate(*queries[i % 1000])
+    compiled_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(EVALUATIONS // 10):
+        linear(*queries[i % 1000])
+    linear_s = (time.perf_counter() - started) * 10
+
+    print(f"{len(rules)} rules: compiled {EVALUATIONS / compiled_s:,.0f} eval/s, linear scan {EVALUATIONS / linear_s:,.0f} eval/s")
+    assert compiled_s < linear_s
+
+
+if __name__ == "__main__":
+    test_most_specific_rule_wins()
+    test_decay_rules_match_the_previous_behaviour()
+    test_hot_reload_and_broken_edit()
+    test_pipeline_trace_names_the_rule()
+    test_benchmark_compiled_dispatch()
@@ -0,0 +1,60 @@
+import sys
+import os
+import time
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp.nlp_analyzer import nlp_analyzer
+
+# The phrases from tests/verify_pipeline.py, plus held-out paraphrases that no keyword covers
+CASES = [
+    ("Lütfen oturur musun?", "command_sit"),
+    ("Ayağa kalkar mısın?", "command_stand"),
+    ("Güneş sistemi hakkında bilgi ver", "unknown"),
+    ("Yerine oturabilir misin", "command_sit"),
+    ("Tahtaya kalkar mısın", "command_stand"),
+    ("Çok güzel cevap verdin", "praise"),
+    ("Konuşmayı keser misiniz", "discipline"),
+    ("Tekrar söyler misin", "request_repeat"),
+    ("Nasılsınız bugün", "status_check"),
+    ("Tahtaya bakar mısın", "attention_command"),
+    ("Gezegenlerin uyduları nelerdir", "unknown"),
+    ("Bana dinozorları anlat", "unknown"),
+]
+
+
+def test_accuracy_and_latency_benchmark():
+    classifier = nlp_analyzer.semantic
+    texts = [text for text, _ in CASES]
+
+    start = time.perf_counter()
+    for text in texts:
+        classifier.classify(text)
+    single_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    start = time.perf_counter()
+    predictions = classifier.classify_many(texts)
+    batch_us = (time.perf_counter() - start) / len(texts) * 1e6
+
+    correct = 0
+    for (text, expected), (intent, score) in zip(CASES, predictions):
+        correct += intent == expected
+        print(f"{text:<36} expected={expected:<20} got={intent:<20} score={score:.2f}")
+    accuracy = correct / len(CASES)
+    print(f"accuracy={accuracy:.0%}  single={single_us:.0f} us/query  batched={batch_us:.0f} us/query")
+
+    assert [intent for intent, _ in predictions[:3]] == ["command_sit", "command_stand", "unknown"]
+    assert accuracy >= 0.8
+    assert single_us < 2000
+
+
+def test_semantic_tier_plugs_into_analyzer():
+    result = nlp_analyzer.analyze_text("Sandalyene geçer misin")
+    assert result["intent"] == "command_sit"
+    assert result["intent_source"] == "semantic"
+
+
+if __name__ == "__main__":
+    test_accuracy_and_latency_benchmark()
+    test_semantic_tier_plugs_into_analyzer()
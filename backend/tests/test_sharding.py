@@ -0,0 +1,125 @@
+import sys
+import os
+from collections import Counter
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi.testclient import TestClient
+
+from core.sharding import HashRing, ShardRouter, FORWARDED_HEADER, SECRET_HEADER, shard_router
+from state.manager import state_manager
+from main import app
+
+ROOMS = [f"room_{i}" for i in range(3000)]
+SECRET = "test-shard-secret"
+
+
+def test_ring_balance_and_minimal_movement():
+    ring = HashRing(["w0", "w1", "w2"])
+    load = Counter(ring.owner(room) for room in ROOMS)
+    print(f"3 workers: {dict(load)}")
+    assert all(abs(count - 1000) < 250 for count in load.values())
+
+    before = {room: ring.owner(room) for room in ROOMS}
+    ring.add("w3")
+    moved = [room for room in ROOMS if ring.owner(room) != before[room]]
+    print(f"Adding w3 moved {len(moved)} of {len(ROOMS)} rooms")
+    assert all(ring.owner(room) == "w3" for room in moved)
+    assert 500 < len(moved) < 1000
+
+
+def test_single_process_keeps_every_room_local():
+    router = ShardRouter(None, {})
+    assert not router.enabled
+    assert router.is_local("room_001")
+
+
+def test_sharding_needs_its_own_secret():
+    try:
+        ShardRouter("w0", {"w0": "http://w0.internal", "w1": "http://w1.internal"})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("several workers must not start without SHARD_SECRET")
+    router = ShardRouter("w0", {"w0": "http://w0.internal"})
+    assert not router.authorized({SECRET_HEADER: ""})
+
+
+def _room_owned_by(router, owner):
+    return next(room for room in ROOMS if router.owner(room) == owner)
+
+
+def test_rest_call_is_forwarded_to_the_owner():
+    forwarded = []
+
+    def owner_worker(request):
+        forwarded.append(request)
+        return httpx.Response(200, json=[{"forwarded_to": "w1"}])
+
+    original = (shard_router.shard_id, dict(shard_router.workers), shard_router._client, shard_router.secret)
+    shard_router.shard_id, shard_router.secret = "w0", SECRET
+    shard_router.set_workers({"w0": "http://w0.internal", "w1": "http://w1.internal"})
+    shard_router._client = httpx.AsyncClient(transport=httpx.MockTransport(owner_worker))
+    try:
+        room = _room_owned_by(shard_router, "w1")
+        payload = {"source": "web", "teacher_id": "t", "room_id": room, "student_ids": [301],
+                   "teacher_action": "command_sit", "content": "Otur"}
+        client = TestClient(app)
+        response = client.post("/api/v1/teacher/batch_input", json=payload)
+        assert response.json() == [{"forwarded_to": "w1"}]
+        assert str(forwarded[0].url) == "http://w1.internal/api/v1/teacher/batch_input"
+        assert forwarded[0].headers[FORWARDED_HEADER] == "w0"
+        assert forwarded[0].headers[SECRET_HEADER] == SECRET
+
+        # Already forwarded once: served here even if the rings disagree, never bounced again
+        response = client.post("/api/v1/teacher/batch_input", json=payload, headers={FORWARDED_HEADER: "w1", SECRET_HEADER: SECRET})
+        print(f"Forwarded once, then served locally: {response.json()[0]['animation']}")
+        assert response.json()[0]["animation"] == "sit"
+        assert len(forwarded) == 1
+
+        # A client setting the marker without the secret is still routed to the owner
+        client.post("/api/v1/teacher/batch_input", json=payload, headers={FORWARDED_HEADER: "w1"})
+        assert len(forwarded) == 2
+    finally:
+        shard_router.shard_id, shard_router.secret = original[0], original[3]
+        shard_router.set_workers(original[1])
+        shard_router._client = original[2]
+
+
+def test_rebalance_hands_off_rooms_that_moved():
+    original = (shard_router.shard_id, dict(shard_router.workers), shard_router.secret)
+    shard_router.shard_id, shard_router.secret = "w0", SECRET
+    shard_router.set_workers({"w0": "http://w0.internal"})
+    try:
+        client = TestClient(app)
+        grown = ShardRouter("w0", {"w0": "http://w0.internal", "w1": "http://w1.internal"}, secret=SECRET)
+        room = _room_owned_by(grown, "w1")
+        client.post("/api/v1/teacher/batch_input", json={
+            "source": "web", "teacher_id": "t", "room_id": room, "student_ids": [302],
+            "teacher_action": "command_sit", "content": "Otur"
+        })
+        assert state_manager.get_student_state(302) is not None
+
+        response = client.post("/api/v1/internal/shards", json=grown.workers,
+                               headers={SECRET_HEADER: SECRET})
+        print(f"Rebalance: {response.json()}")
+        assert room in response.json()["moved_rooms"]
+        # The new owner warm-loads the student from the shared persistence
+        assert state_manager.get_student_state(302) is None
+
+        denied = client.post("/api/v1/internal/shards", json=grown.workers, headers={SECRET_HEADER: "nope"})
+        assert denied.status_code == 403
+        assert client.get("/api/v1/internal/shards").status_code == 403
+    finally:
+        shard_router.shard_id, shard_router.secret = original[0], original[2]
+        shard_router.set_workers(original[1])
+
+
+if __name__ == "__main__":
+    test_ring_balance_and_minimal_movement()
+    test_single_process_keeps_every_room_local()
+    test_sharding_needs_its_own_secret()
+    test_rest_call_is_forwarded_to_the_owner()
+    test_rebalance_hands_off_rooms_that_moved()
@@ -0,0 +1,135 @@
+import sys
+import os
+import time
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fakeredis
+
+from state.backends import InProcessStateBackend, RedisStateBackend, StateBackend
+from state.manager import StateManager
+from state.record import StudentRecord
+
+
+def _backends():
+    """The in-process store and a Redis stand-in (fakeredis speaks the same commands)."""
+    return [InProcessStateBackend(), RedisStateBackend(client=fakeredis.FakeRedis())]
+
+
+def test_batched_reads_and_versioned_writes():
+    for backend in _backends():
+        versions = backend.set_many({
+            "student:state:1": (StudentRecord(1, mood="happy"), 0),
+            "student:state:2": (StudentRecord(2), None)
+        })
+        assert versions == {"student:state:1": 1, "student:state:2": 1}
+
+        found = backend.get_many(["student:state:1", "student:state:2", "student:state:3"])
+        assert set(found) == {"student:state:1", "student:state:2"}
+        assert found["student:state:1"][0].mood == "happy"
+
+        # A writer holding a stale version loses, and nothing in its batch is applied
+        stale = backend.set_many({
+            "student:state:1": (StudentRecord(1, mood="sad"), 0),
+            "student:state:2": (StudentRecord(2, mood="sad"), 1)
+        })
+        assert stale is None
+        assert backend.get("student:state:2")[0].mood == "neutral"
+
+        assert backend.set_many({"student:state:1": (StudentRecord(1, mood="sad"), 1)}) == {"student:state:1": 2}
+        backend.delete_many(["student:state:1"])
+        assert backend.get("student:state:1") is None
+        print(f"{type(backend).__name__}: ok")
+
+
+def test_idle_students_expire():
+    for backend in _backends():
+        backend.set_many({"student:state:1": (StudentRecord(1), None)}, ttl_s=0.05)
+        assert backend.get("student:state:1") is not None
+        time.sleep(0.1)
+        assert backend.get("student:state:1") is None
+
+
+def test_workers_share_state_and_retry_conflicts():
+    server = fakeredis.FakeServer()
+    worker_a = StateManager(RedisStateBackend(client=fakeredis.FakeRedis(server=server)))
+    worker_b = StateManager(RedisStateBackend(client=fakeredis.FakeRedis(server=server)))
+
+    worker_a.update_student_states({1: {"mood": "happy"}, 2: {"mood": "sad"}})
+    assert {k: v.mood for k, v in worker_b.get_student_states([1, 2, 3]).items()} == {1: "happy", 2: "sad"}
+
+    # Worker B writes between worker A's read and write; A must re-read and retry
+    original_set_many = worker_a.backend.set_many
+    calls = []
+
+    def racing_set_many(items, ttl_s=None):
+        if not calls:
+            worker_b.update_student_state(1, {"current_activity": "writing"})
+        calls.append(items)
+        return original_set_many(items, ttl_s)
+
+    worker_a.backend.set_many = racing_set_many
+    state = worker_a.update_student_state(1, {"mood": "alert"})
+    assert len(calls) == 2
+    assert state.mood == "alert" and state.current_activity == "writing"
+    assert worker_b.get_student_state(1).current_activity == "writing"
+
+
+class SlowRedisStateBackend(RedisStateBackend):
+    """Redis with 50 ms of network latency per round-trip."""
+
+    def get_many(self, keys):
+        time.sleep(0.05)
+        return super().get_many(keys)
+
+    def set_many(self, items, ttl_s=None):
+        time.sleep(0.05)
+        return super().set_many(items, ttl_s)
+
+
+def test_async_state_calls_do_not_block_the_event_loop():
+    manager = StateManager(SlowRedisStateBackend(client=fakeredis.FakeRedis()))
+
+    async def run():
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.005)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.sleep(0)
+        state = await manager.update_student_state_async(1, {"mood": "happy"})
+        assert state.mood == "happy"
+        assert (await manager.get_student_states_async([1, 2]))[1].mood == "happy"
+        assert list(await manager.get_records_async([1, 2])) == [1]  # the write-behind flush read
+        beat.cancel()
+        # Four 50 ms round-trips; the loop kept ticking through all of them
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+        print(f"{len(ticks)} heartbeats, longest gap {max(gaps) * 1000:.1f} ms")
+        assert max(gaps) < 0.04
+
+    asyncio.run(run())
+
+
+def test_backends_must_implement_the_storage_calls():
+    class ReadOnly(StateBackend):
+        def get_many(self, keys):
+            return {}
+
+    try:
+        ReadOnly()
+    except TypeError:
+        return
+    raise AssertionError("a backend without set_many/delete_many must not be instantiable")
+
+
+if __name__ == "__main__":
+    test_batched_reads_and_versioned_writes()
+    test_idle_students_expire()
+    test_workers_share_state_and_retry_conflicts()
+    test_async_state_calls_do_not_block_the_event_loop()
+    test_backends_must_implement_the_storage_calls()
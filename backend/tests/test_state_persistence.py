@@ -0,0 +1,139 @@
+import sys
+import os
+import time
+import asyncio
+import tempfile
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main
+from core.config import settings
+from state.backends import InProcessStateBackend
+from state.manager import StateManager
+from state.persistence import SQLiteStateStore, WriteBehindPersister
+
+
+def _persister(path: str, **options):
+    manager = StateManager(InProcessStateBackend())
+    options = {"flush_ms": 50, "flush_changes": 3, **options}
+    return manager, WriteBehindPersister(SQLiteStateStore(path), manager, **options)
+
+
+def test_batched_flush_and_warm_restart():
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+
+    async def lesson():
+        manager, persister = _persister(path, flush_ms=10_000)
+        persister.start()
+        manager.update_student_state(1, {"mood": "happy", "attention_delta": -0.3})
+        manager.update_student_state(2, {"mood": "sleepy"})
+        for student_id in (1, 2):
+            persister.note_room("room_a", student_id)
+        await asyncio.sleep(0.05)
+        assert persister.store.load_room("room_a") == []  # below the change threshold
+
+        manager.update_student_state(3, {"mood": "confused"})
+        persister.note_room("room_b", 3)
+        await asyncio.sleep(0.05)  # threshold reached: flushed without waiting for the timer
+        assert len(persister.store.load_room("room_a")) == 2
+
+        manager.update_student_state(1, {"mood": "motivated"})
+        await persister.stop()  # final flush on shutdown
+
+    asyncio.run(lesson())
+
+    async def restart():
+        manager, persister = _persister(path)
+        # Student 2 already has newer in-memory state; the snapshot must not win
+        manager.update_student_state(2, {"mood": "alert"})
+        assert await persister.warm_room("room_a") == 1
+        assert await persister.warm_room("room_a") == 0  # once per room
+
+        restored = manager.get_student_state(1)
+        assert restored.mood == "motivated"
+        assert abs(restored.attention_level - 0.5) < 1e-6
+        assert manager.get_student_state(2).mood == "alert"
+        assert manager.get_student_state(3) is None  # other room, not loaded yet
+        assert await persister.warm_room("room_b") == 1
+
+    asyncio.run(restart())
+
+
+def test_evicted_rooms_are_warm_loaded_again():
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+
+    async def run():
+        manager, persister = _persister(path)
+        manager.update_student_state(1, {"mood": "happy"})
+        persister.note_room("room_e", 1)
+        await persister.flush()
+        assert await persister.warm_room("room_e") == 0  # already in memory
+
+        manager.evict_students([1])
+        assert manager.get_student_state(1) is None
+        assert await persister.warm_room("room_e") == 1
+        assert manager.get_student_state(1).mood == "happy"
+
+        # Past the store's TTL the students may have expired, so the room is loaded again
+        manager.ttl_s = 0.05
+        await asyncio.sleep(0.1)
+        manager.backend.delete_many(["student:state:1"])
+        assert await persister.warm_room("room_e") == 1
+
+    asyncio.run(run())
+
+
+def test_request_path_never_waits_on_disk():
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    manager, persister = _persister(path, flush_ms=10, flush_changes=1)
+    slow_write = persister.store.write_many
+
+    def slow_disk(rows):
+        time.sleep(0.3)
+        slow_write(rows)
+
+    persister.store.write_many = slow_disk
+
+    async def main():
+        persister.start()
+        manager.update_student_state(1, {"mood": "happy"})
+        await asyncio.sleep(0.05)  # flush is now stuck in the slow write
+
+        start = time.perf_counter()
+        for i in range(100):
+            manager.update_student_state(100 + i, {"mood": "alert"})
+            await asyncio.sleep(0)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        await persister.stop()
+        return elapsed_ms
+
+    elapsed_ms = asyncio.run(main())
+    print(f"100 updates during a 300 ms disk write: {elapsed_ms:.1f} ms")
+    assert elapsed_ms < 100
+    assert len(persister.store.load_students(range(100, 200))) == 100
+
+
+def test_server_opens_the_database_at_startup():
+    # Importing the app opens nothing; the lifespan opens DATABASE_URL
+    assert main.state_persister is None
+    path = os.path.join(tempfile.mkdtemp(), "state.db")
+    database_url = settings.DATABASE_URL
+    settings.DATABASE_URL = f"sqlite:///{path}"
+    try:
+        with TestClient(main.app):
+            assert main.state_persister.store.path == path
+        assert main.state_persister is None
+    finally:
+        settings.DATABASE_URL = database_url
+    assert os.path.exists(path)
+
+
+if __name__ == "__main__":
+    test_batched_flush_and_warm_restart()
+    test_evicted_rooms_are_warm_loaded_again()
+    test_request_path_never_waits_on_disk()
+    test_server_opens_the_database_at_startup()
@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.definitions import StudentStateModel
+from state.manager import StateManager
+
+STUDENTS = 10_000
+ROUNDS = 3
+
+
+class JsonStateManager:
+    """The previous JSON-string store, kept as the benchmark baseline."""
+
+    def __init__(self):
+        self._local_storage = {}
+
+    def get_student_state(self, student_id):
+        data = self._local_storage.get(f"student:state:{student_id}")
+        return StudentStateModel.model_validate_json(data) if data else None
+
+    def update_student_state(self, student_id, updates):
+        state = self.get_student_state(student_id) or StudentStateModel(
+            student_id=student_id, mood="neutral", attention_level=0.8, energy_level=0.8,
+            current_activity="listening", last_updated=datetime.now(), personality_traits={"type": "balanced"}
+        )
+        state_dict = state.model_dump()
+        for k, v in updates.items():
+            if k in state_dict:
+                state_dict[k] = v
+        state_dict["attention_level"] = max(0.0, min(1.0, state_dict["attention_level"]))
+        state_dict["energy_level"] = max(0.0, min(1.0, state_dict["energy_level"]))
+        updated = StudentStateModel(**state_dict)
+        updated.last_updated = datetime.now()
+        self._local_storage[f"student:state:{student_id}"] = updated.model_dump_json()
+        return updated
+
+
+def test_same_behaviour_as_json_store():
+    store = StateManager()
+    assert store.get_student_state(1) is None
+
+    state = store.update_student_state(1, {"mood": "happy", "attention_level": 1.7, "unknown_field": 1})
+    assert state.mood == "happy"
+    assert state.attention_level == 1.0
+    assert state.personality_traits == {"type": "balanced"}
+    # Assembled without validation, but indistinguishable from a validated model
+    assert StudentStateModel.model_validate(state.model_dump()) == state
+
+    # Returned models are copies; mutating them does not touch the store
+    state.short_term_memory.append("leaked")
+    assert store.get_student_state(1).short_term_memory == []
+
+    try:
+        store.update_student_state(1, {"mood": "furious"})
+        assert False, "invalid mood accepted"
+    except ValueError:
+        pass
+    assert store.get_student_state(1).mood == "happy"
+
+    store.set_student_state(2, state)
+    assert store.get_student_state(2).short_term_memory == ["leaked"]
+    assert StudentStateModel.model_validate_json(store.backend.get("student:state:1")[0].to_json()).mood == "happy"
+
+
+def _measure(store):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(STUDENTS):
+        store.update_student_state(i, {"short_term_memory": [f"Öğretmen: soru {i}", f"Öğrenci: cevap {i}"]})
+    bytes_per_student = (tracemalloc.get_traced_memory()[0] - before) / STUDENTS
+    tracemalloc.stop()
+
+    # Best of a few rounds, so one noisy pass on a busy machine does not decide the comparison
+    get_us = update_us = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(STUDENTS):
+            store.get_student_state(i)
+        get_us = min(get_us, (time.perf_counter() - start) / STUDENTS * 1e6)
+
+        start = time.perf_counter()
+        for i in range(STUDENTS):
+            store.update_student_state(i, {"mood": "alert", "attention_level": 0.9})
+        update_us = min(update_us, (time.perf_counter() - start) / STUDENTS * 1e6)
+    return get_us, update_us, bytes_per_student
+
+
+def test_benchmark_against_json_store():
+    json_get, json_update, json_bytes = _measure(JsonStateManager())
+    live_get, live_update, live_bytes = _measure(StateManager())
+
+    print(f"{STUDENTS} students")
+    print(f"json store:   get {json_get:6.2f} us  update {json_update:6.2f} us  {json_bytes:7.0f} bytes/student")
+    print(f"record store: get {live_get:6.2f} us  update {live_update:6.2f} us  {live_bytes:7.0f} bytes/student")
+
+    # Building the model dominates a read either way, so reads are on par; updates and memory are the gain
+    assert live_get < json_get * 1.25
+    assert live_update < json_update
+    assert live_bytes < json_bytes
+
+
+if __name__ == "__main__":
+    test_same_behaviour_as_json_store()
+    test_benchmark_against_json_store()
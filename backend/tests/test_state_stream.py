@@ -0,0 +1,133 @@
+import sys
+import os
+import json
+import random
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from ws.manager import ConnectionManager
+from ws.state_stream import RoomState
+from main import app
+
+STUDENTS = 30
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        pass
+
+
+def test_deltas_carry_only_changed_fields():
+    room = RoomState("room_s")
+    first = room.apply([{"student_id": 1, "animation": "idle", "emotion": "neutral", "reply_text": "", "unknown": 1}])
+    assert first.data == {"type": "STATE_DELTA", "room_id": "room_s", "seq": 1,
+                          "students": [{"student_id": 1, "animation": "idle", "emotion": "neutral", "reply_text": ""}]}
+    second = room.apply([{"student_id": 1, "animation": "idle", "emotion": "neutral", "reply_text": "Merhaba"}])
+    assert second.data["seq"] == 2
+    assert second.data["students"] == [{"student_id": 1, "reply_text": "Merhaba"}]
+    assert room.apply([{"student_id": 1, "animation": "idle"}]) is None
+
+    snapshot = room.snapshot()
+    assert room.snapshot() is snapshot  # shared until the next change
+    assert snapshot.data["seq"] == 2
+    assert snapshot.data["students"] == [{"student_id": 1, "animation": "idle", "emotion": "neutral", "reply_text": "Merhaba"}]
+
+
+def test_delta_clients_start_from_a_snapshot():
+    async def run():
+        manager = ConnectionManager(overflow_policy="coalesce")
+        full, delta = RecordingSocket(), RecordingSocket()
+        await manager.connect(full, "room_s", "dev-unity-token")
+        await manager.connect(delta, "room_s", "dev-unity-token", state_mode="delta")
+
+        update = {"student_id": 1, "student_state": "attentive"}
+        await manager.send_state("room_s", "unity", update, [update], key=1)
+        assert manager.sync_state(delta)
+        assert not manager.sync_state(full)
+        for i in range(3):
+            update = {"student_id": 1, "reply_text": f"cevap {i}"}
+            await manager.send_state("room_s", "unity", update, [update], key=1)
+        await asyncio.sleep(0.01)
+
+        # The unsynced delta client skipped seq 1; it is part of its snapshot
+        assert [m["type"] for m in delta.sent] == ["STATE_SNAPSHOT", "STATE_DELTA", "STATE_DELTA", "STATE_DELTA"]
+        assert [m["seq"] for m in delta.sent] == [1, 2, 3, 4]
+        assert delta.sent[0]["students"] == [{"student_id": 1, "student_state": "attentive"}]
+        assert full.sent[-1] == {"student_id": 1, "reply_text": "cevap 2"}
+        for client in list(manager.clients.values()):
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_socket_snapshot_delta_and_resync():
+    client = TestClient(app)
+    with client.websocket_connect("/ws/v1/classroom/room_stream?token=dev-unity-token&state=delta") as ws:
+        assert ws.receive_json()["type"] == "INIT_SUCCESS"
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "STATE_SNAPSHOT"
+
+        client.post("/api/v1/teacher/batch_input", json={
+            "source": "web", "teacher_id": "t", "room_id": "room_stream", "student_ids": [311],
+            "teacher_action": "command_sit", "content": "Otur"
+        })
+        delta = ws.receive_json()
+        print(f"Delta after a decision: {delta}")
+        assert delta["type"] == "STATE_DELTA"
+        assert delta["seq"] == snapshot["seq"] + 1
+        assert delta["students"][0]["student_id"] == 311
+
+        ws.send_json({"type": "RESYNC_REQUEST"})
+        resync = ws.receive_json()
+        assert resync["type"] == "STATE_SNAPSHOT"
+        assert resync["seq"] == delta["seq"]
+        assert any(student["student_id"] == 311 for student in resync["students"])
+
+
+def test_benchmark_bandwidth_of_a_30_student_room():
+    rng = random.Random(7)
+    room = RoomState("room_b")
+    animations = ["idle", "idle", "idle", "raise_hand", "talk"]
+    moods = ["neutral", "neutral", "happy", "bored"]
+    full_bytes = delta_bytes = 0
+    for i in range(3000):
+        student_id = rng.randrange(STUDENTS)
+        emotion = rng.choice(moods)
+        payload = {
+            "student_id": student_id, "animation": rng.choice(animations),
+            "reply_text": rng.choice(["", "", "Anladım öğretmenim.", "Bir sorum var."]),
+            "emotion": emotion, "confidence": 0.9, "student_state": "attentive" if emotion != "bored" else "distracted",
+            "meta": {"latency_ms": rng.randrange(20, 400), "decision_id": f"d-{i}"}
+        }
+        full_bytes += len(json.dumps(payload))
+        # Idle decay updates: the full stream repeats every student each time
+        if i % 10 == 0:
+            updates = [{"student_id": s, "attention_level": round(rng.random(), 1), "energy_level": 0.8,
+                        "student_state": "attentive", "emotion": "neutral"} for s in range(STUDENTS)]
+            full_bytes += len(json.dumps({"type": "STATE_UPDATE", "room_id": "room_b", "students": updates}))
+            sim_delta = room.apply(updates)
+            delta_bytes += len(sim_delta.encode("json").encode("utf-8")) if sim_delta else 0
+        delta = room.apply([{**payload, "decision_id": payload["meta"]["decision_id"]}])
+        delta_bytes += len(delta.encode("json").encode("utf-8"))
+    print(f"30 students, 3000 decisions: full {full_bytes / 1024:.0f} KiB, deltas {delta_bytes / 1024:.0f} KiB")
+    assert delta_bytes < full_bytes * 0.6
+
+
+if __name__ == "__main__":
+    test_deltas_carry_only_changed_fields()
+    test_delta_clients_start_from_a_snapshot()
+    test_socket_snapshot_delta_and_resync()
+    test_benchmark_bandwidth_of_a_30_student_room()
@@ -0,0 +1,99 @@
+import sys
+import os
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from ai.streaming import ReplyTextExtractor
+from models.definitions import TeacherInputRequest
+from state.manager import state_manager
+
+ANSWER = json.dumps(
+    {"reply_text": "Güneş bir \"yıldız\"dır.", "animation": "thinking_pose", "emotion": "neutral"},
+    ensure_ascii=False
+)
+
+
+def test_extractor_handles_split_escapes():
+    extractor = ReplyTextExtractor()
+    text = "".join(extractor.feed(ANSWER[i:i + 2]) for i in range(0, len(ANSWER), 2))
+    assert text == 'Güneş bir "yıldız"dır.'
+    assert extractor.done
+
+
+def test_extractor_joins_surrogate_pairs():
+    # json.dumps escapes 🙂 as the pair \ud83d\ude42; chunks may split it anywhere
+    answer = json.dumps({"reply_text": "Tamam 🙂 öğretmenim", "animation": "happy_nod", "emotion": "happy"})
+    extractor = ReplyTextExtractor()
+    text = "".join(extractor.feed(answer[i:i + 1]) for i in range(len(answer)))
+    assert text == "Tamam 🙂 öğretmenim"
+    text.encode("utf-8")  # lone surrogates would raise here (and in orjson)
+
+    extractor = ReplyTextExtractor()
+    assert extractor.feed('{"reply_text": "a\\ud83d b"}') == "a\ufffd b"
+
+
+def test_extractor_replaces_malformed_escapes():
+    extractor = ReplyTextExtractor()
+    assert extractor.feed('{"reply_text": "a\\uZZ12b') == "a\ufffdb"
+    # A high half followed by a bad low half, split across chunks
+    extractor = ReplyTextExtractor()
+    text = extractor.feed('{"reply_text": "x\\ud83d\\u') + extractor.feed('+1_2y"}')
+    assert text == "x\ufffd\ufffdy"
+    assert extractor.done
+
+
+def test_streaming_frames_precede_final_response():
+    async def _fake_stream(prompt, context="", structured=False):
+        for i in range(0, len(ANSWER), 4):
+            await asyncio.sleep(0)
+            yield ANSWER[i:i + 4]
+
+    frames = []
+
+    async def on_frame(frame):
+        frames.append(frame)
+
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(stream_response_async=_fake_stream))])
+    try:
+        req = TeacherInputRequest(source="unity", teacher_id="system", student_id=202, content="Güneş nedir, anlatır mısın acaba?")
+        response = asyncio.run(pipeline.process_streaming(req, on_frame))
+    finally:
+        provider_router_module.provider_router = original
+
+    assert frames[0]["type"] == "DECISION_STARTED"
+    assert frames[0]["decision_id"] == response.meta.decision_id
+    deltas = [f["delta"] for f in frames if f["type"] == "REPLY_DELTA"]
+    assert len(deltas) > 1
+    assert "".join(deltas) == response.reply_text
+
+
+def test_sleepy_student_template_reply_is_not_streamed():
+    frames = []
+
+    async def on_frame(frame):
+        frames.append(frame)
+
+    state_manager.update_student_state(203, {"mood": "sleepy"})
+    # Explicit command: answered by the fast path, whose reply the validator replaces
+    req = TeacherInputRequest(source="unity", teacher_id="system", student_id=203, teacher_action="command_sit", content="Otur")
+    response = asyncio.run(pipeline.process_streaming(req, on_frame))
+
+    assert response.decision_trace.tier == "rule_fast_path"
+    assert response.reply_text == "Zzz..."
+    assert [f["type"] for f in frames] == ["DECISION_STARTED"]
+
+
+if __name__ == "__main__":
+    test_extractor_handles_split_escapes()
+    test_extractor_joins_surrogate_pairs()
+    test_extractor_replaces_malformed_escapes()
+    test_streaming_frames_precede_final_response()
+    test_sleepy_student_template_reply_is_not_streamed()
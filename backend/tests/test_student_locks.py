@@ -0,0 +1,78 @@
+import sys
+import os
+import time
+import asyncio
+import json
+from types import SimpleNamespace
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.pipeline import pipeline
+import ai.provider_router as provider_router_module
+from ai.provider_router import ProviderRouter
+from core.config import settings
+from core.metrics import state_lock_wait_seconds
+from models.definitions import TeacherInputRequest
+from state.locks import StudentLocks
+from state.manager import state_manager
+
+SIMULATED_LLM_LATENCY_S = 0.1
+
+
+async def _fake_llm(prompt: str, context: str = "", structured: bool = False, **options):
+    await asyncio.sleep(SIMULATED_LLM_LATENCY_S)
+    return json.dumps({"reply_text": "Dinliyorum.", "animation": "listening_pose", "emotion": "neutral"})
+
+
+def _request(student_id: int) -> TeacherInputRequest:
+    return TeacherInputRequest(source="web", teacher_id="lock_test", student_id=student_id,
+                               content="Güneş sistemi hakkında bilgi ver")
+
+
+async def _timed(*student_ids: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(pipeline.process_async(_request(sid)) for sid in student_ids))
+    return time.perf_counter() - start
+
+
+def test_same_student_serialized_others_parallel():
+    original = provider_router_module.provider_router
+    provider_router_module.provider_router = ProviderRouter([("groq", SimpleNamespace(generate_response_async=_fake_llm))])
+    cache_enabled = settings.RESPONSE_CACHE_ENABLED
+    settings.RESPONSE_CACHE_ENABLED = False
+    waits_before = state_lock_wait_seconds.count(scope="student")
+    try:
+        same_student = asyncio.run(_timed(501, 501))
+        different_students = asyncio.run(_timed(502, 503))
+    finally:
+        provider_router_module.provider_router = original
+        settings.RESPONSE_CACHE_ENABLED = cache_enabled
+
+    print(f"same student: {same_student:.3f}s, different students: {different_students:.3f}s")
+    assert same_student >= 2 * SIMULATED_LLM_LATENCY_S
+    assert different_students < 1.5 * SIMULATED_LLM_LATENCY_S
+    assert state_lock_wait_seconds.count(scope="student") == waits_before + 4
+    # Idle locks are dropped again
+    assert len(state_manager.locks) == 0
+
+
+def test_overlapping_room_locks_do_not_deadlock():
+    locks = StudentLocks()
+    order = []
+
+    async def batch(name, ids):
+        async with locks.hold(*ids):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(batch("a", [1, 2, 3]), batch("b", [3, 2, 1]), batch("c", [2])), timeout=1)
+
+    asyncio.run(main())
+    assert sorted(order) == ["a", "b", "c"] and len(locks) == 0
+
+
+if __name__ == "__main__":
+    test_same_student_serialized_others_parallel()
+    test_overlapping_room_locks_do_not_deadlock()
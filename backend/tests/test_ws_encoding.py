@@ -0,0 +1,118 @@
+import sys
+import os
+import json
+import time
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import msgpack
+
+from core.metrics import ws_encodes_total
+from ws.encoding import OutboundMessage, SCHEMAS, negotiate
+from ws.manager import ConnectionManager
+
+DECISION = {
+    "student_id": 7, "animation": "raise_hand", "reply_text": "Güneş bir yıldızdır.", "emotion": "happy",
+    "confidence": 0.92, "student_state": "active", "meta": {"latency_ms": 41, "decision_id": "d-1"}
+}
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        pass
+
+
+def test_message_is_encoded_once_for_every_client():
+    async def run():
+        manager = ConnectionManager()
+        sockets = [RecordingSocket() for _ in range(50)]
+        for i, socket in enumerate(sockets):
+            await manager.connect(socket, "room_e", "dev-unity-token", "msgpack" if i % 2 else None)
+
+        json_before = ws_encodes_total.value(encoding="json")
+        msgpack_before = ws_encodes_total.value(encoding="msgpack")
+        await manager.send_to_role("room_e", "unity", OutboundMessage(DECISION, schema="decision"))
+        await asyncio.sleep(0.01)
+
+        assert ws_encodes_total.value(encoding="json") - json_before == 1
+        assert ws_encodes_total.value(encoding="msgpack") - msgpack_before == 1
+        # Every client of a format got the very same encoded object
+        assert len({id(socket.frames[0]) for socket in sockets}) == 2
+        assert json.loads(sockets[0].frames[0]) == DECISION
+        for client in list(manager.clients.values()):
+            client.close()
+
+    asyncio.run(run())
+
+
+def test_msgpack_schema_round_trip():
+    packed = OutboundMessage(DECISION, schema="decision").encode("msgpack")
+    schema_id, *values = msgpack.unpackb(packed, raw=False)
+    fields = SCHEMAS["decision"][1]
+    assert schema_id == 1
+    assert dict(zip(fields, values)) == DECISION
+
+    # Messages without a schema stay self-describing maps
+    init = {"type": "INIT_SUCCESS", "message": "Unity connected", "encoding": "msgpack"}
+    assert msgpack.unpackb(OutboundMessage(init).encode("msgpack"), raw=False) == init
+
+    json_size = len(OutboundMessage(DECISION).encode("json").encode("utf-8"))
+    print(f"Decision: {json_size} bytes as JSON, {len(packed)} bytes as MessagePack")
+    assert len(packed) < json_size
+
+
+def test_negotiate_falls_back_to_json():
+    assert negotiate(None) == "json"
+    assert negotiate("protobuf") == "json"
+    assert negotiate("msgpack") == "msgpack"
+
+
+def test_benchmark_encode_cost_per_decision():
+    async def run():
+        for listeners in (1, 10, 100):
+            manager = ConnectionManager(queue_size=1000)
+            for _ in range(listeners):
+                await manager.connect(RecordingSocket(), "room_b", "dev-debug-token")
+            clients = list(manager.clients.values())
+
+            # The old path: every client serialized the dict itself
+            started = time.perf_counter()
+            for _ in range(200):
+                for _ in clients:
+                    json.dumps(DECISION)
+            per_client_us = (time.perf_counter() - started) / 200 * 1e6
+
+            started = time.perf_counter()
+            for _ in range(200):
+                message = OutboundMessage(DECISION)
+                for client in clients:
+                    message.encode(client.encoding)
+            shared_us = (time.perf_counter() - started) / 200 * 1e6
+            print(f"{listeners:>3} listeners: per-client encode {per_client_us:.1f} us, shared {shared_us:.1f} us per decision")
+            if listeners == 100:
+                assert shared_us < per_client_us / 4
+            for client in clients:
+                client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_message_is_encoded_once_for_every_client()
+    test_msgpack_schema_round_trip()
+    test_negotiate_falls_back_to_json()
+    test_benchmark_encode_cost_per_decision()
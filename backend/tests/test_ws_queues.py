@@ -0,0 +1,144 @@
+import sys
+import os
+import json
+import time
+import asyncio
+
+# Add the directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ws import manager as ws_manager
+from ws.manager import ConnectionManager
+
+
+class FakeSocket:
+    """Records what it is sent; `delay_s` simulates a slow client, `fail` a dead one."""
+
+    def __init__(self, delay_s: float = 0.0, fail: bool = False):
+        self.delay_s = delay_s
+        self.fail = fail
+        self.sent = []
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.fail:
+            raise ConnectionResetError("client went away")
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+async def _connect(manager, socket, room_id="room_q", token="dev-unity-token"):
+    await manager.connect(socket, room_id, token)
+    return socket
+
+
+def test_slow_client_does_not_delay_the_room():
+    async def run():
+        manager = ConnectionManager(queue_size=100)
+        slow = await _connect(manager, FakeSocket(delay_s=0.2))
+        fast = await _connect(manager, FakeSocket())
+
+        started = time.perf_counter()
+        for i in range(20):
+            await manager.send_to_role("room_q", "unity", {"n": i})
+        enqueue_ms = (time.perf_counter() - started) * 1000
+        await asyncio.sleep(0.05)
+
+        print(f"20 sends enqueued in {enqueue_ms:.2f} ms; fast got {len(fast.sent)}, slow got {len(slow.sent)}")
+        assert enqueue_ms < 50
+        assert [m["n"] for m in fast.sent] == list(range(20))
+        assert len(slow.sent) <= 1
+        assert manager.room_stats("room_q")["queue_depth"] >= 18
+
+    asyncio.run(run())
+
+
+def test_overflow_policies():
+    async def run():
+        manager = ConnectionManager(queue_size=5, overflow_policy="drop_oldest")
+        client = await _connect(manager, FakeSocket(delay_s=10))
+        for i in range(12):
+            await manager.send_to_role("room_q", "unity", {"n": i})
+        await asyncio.sleep(0)
+        stats = manager.room_stats("room_q")
+        # The queue kept the newest five; the writer then took one of them in flight
+        assert [entry[1].data["n"] for entry in manager.clients[client].queue] == [8, 9, 10, 11]
+        assert stats["dropped"] == 7
+
+        manager = ConnectionManager(queue_size=5, overflow_policy="coalesce")
+        client = await _connect(manager, FakeSocket(delay_s=10))
+        await manager.send_to_role("room_q", "unity", {"warmup": True})
+        await asyncio.sleep(0)
+        for i in range(30):
+            await manager.send_to_role("room_q", "unity", {"student_id": i % 3, "n": i}, key=i % 3)
+        queued = [entry[1].data for entry in manager.clients[client].queue]
+        print(f"Coalesced queue: {queued}")
+        assert queued == [{"student_id": 0, "n": 27}, {"student_id": 1, "n": 28}, {"student_id": 2, "n": 29}]
+        assert manager.room_stats("room_q")["coalesced"] == 27
+
+        manager = ConnectionManager(queue_size=3, overflow_policy="disconnect")
+        socket = await _connect(manager, FakeSocket(delay_s=10))
+        for i in range(6):
+            await manager.send_to_role("room_q", "unity", {"n": i})
+        await asyncio.sleep(0)
+        assert socket.closed_with == 1013
+        assert manager.get_room_clients("room_q") == []
+
+    asyncio.run(run())
+
+
+def test_dead_client_is_dropped_without_raising():
+    async def run():
+        manager = ConnectionManager()
+        dead = await _connect(manager, FakeSocket(fail=True))
+        alive = await _connect(manager, FakeSocket())
+        await manager.send_to_role("room_q", "unity", {"n": 1})
+        await asyncio.sleep(0.01)
+        await manager.send_to_role("room_q", "unity", {"n": 2})
+        await asyncio.sleep(0.01)
+        assert dead.closed_with == 1011
+        assert len(manager.get_room_clients("room_q")) == 1
+        assert [m["n"] for m in alive.sent] == [1, 2]
+
+    asyncio.run(run())
+
+
+def test_close_keeps_the_socket_close_task():
+    async def run():
+        manager = ConnectionManager()
+        socket = await _connect(manager, FakeSocket())
+        client = manager.clients[socket]
+        client.close(code=4000)
+        # Held by the connection until the socket is closed, so it cannot be collected first
+        await client.closer
+        assert socket.closed_with == 4000
+
+    asyncio.run(run())
+
+
+def test_departed_room_stats_stay_bounded():
+    async def run():
+        manager = ConnectionManager()
+        for i in range(ws_manager.CLOSED_STATS_ROOMS + 50):
+            socket = await _connect(manager, FakeSocket(), room_id=f"room_{i}")
+            manager.disconnect(socket)
+        assert len(manager._closed_stats) == ws_manager.CLOSED_STATS_ROOMS
+        assert "room_0" not in manager._closed_stats
+        assert manager.room_stats("room_0")["dropped"] == 0
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_slow_client_does_not_delay_the_room()
+    test_overflow_policies()
+    test_dead_client_is_dropped_without_raising()
+    test_close_keeps_the_socket_close_task()
+    test_departed_room_stats_stay_bounded()
@@ -0,0 +1,110 @@
+"""
+Standalone room pub/sub broker for PUBSUB_BACKEND=broker (ws/pubsub.py).
+
+Workers connect over TCP and exchange newline-delimited JSON frames:
+{"op": "sub"|"unsub", "rooms": [...]} and {"op": "pub", "batch": [[room_id, envelope], ...]}.
+Every published batch is split by subscriber and relayed as one frame per
+worker, never back to its publisher.
+
+    python -m ws.broker --port 7450
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List, Optional, Set
+
+from ws.pubsub import MAX_FRAME_BYTES, dump_frame, load_frame
+
+# A subscriber with this much unsent data is cut off (it reconnects and resubscribes)
+MAX_BUFFERED_BYTES = 64 * 1024 * 1024
+
+
+class Broker:
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.rooms_of: Dict[asyncio.StreamWriter, Set[str]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.relayed = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 7450) -> int:
+        """Starts listening; returns the port (useful with port 0)."""
+        self.server = await asyncio.start_server(self._serve, host, port, limit=MAX_FRAME_BYTES)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.rooms_of):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.rooms_of[writer] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                frame = load_frame(line)
+                op = frame.get("op")
+                if op == "pub":
+                    self._relay(writer, frame["batch"])
+                elif op == "sub":
+                    for room_id in frame["rooms"]:
+                        self.subscribers.setdefault(room_id, set()).add(writer)
+                        self.rooms_of[writer].add(room_id)
+                elif op == "unsub":
+                    for room_id in frame["rooms"]:
+                        self._unsubscribe(writer, room_id)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            print(f"Broker: dropping worker connection ({e!r})")
+        finally:
+            for room_id in list(self.rooms_of.pop(writer, ())):
+                self._unsubscribe(writer, room_id)
+            writer.close()
+
+    def _unsubscribe(self, writer: asyncio.StreamWriter, room_id: str):
+        subscribers = self.subscribers.get(room_id)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self.subscribers[room_id]
+        rooms = self.rooms_of.get(writer)
+        if rooms is not None:
+            rooms.discard(room_id)
+
+    def _relay(self, sender: asyncio.StreamWriter, batch: List[List[Any]]):
+        outgoing: Dict[asyncio.StreamWriter, List[List[Any]]] = {}
+        for entry in batch:
+            for writer in self.subscribers.get(entry[0], ()):
+                if writer is not sender:
+                    outgoing.setdefault(writer, []).append(entry)
+        for writer, entries in outgoing.items():
+            if writer.transport.get_write_buffer_size() > MAX_BUFFERED_BYTES:
+                print("Broker: subscriber is not reading, disconnecting it")
+                writer.close()
+                continue
+            writer.write(dump_frame({"op": "pub", "batch": entries}))
+            self.relayed += len(entries)
+
+
+async def serve(host: str, port: int):
+    broker = Broker()
+    port = await broker.start(host, port)
+    # Parents that spawn the broker (e.g. tests with --port 0) read the port from this line
+    print(f"Broker listening on {host}:{port}", flush=True)
+    await broker.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Room pub/sub broker for several backend workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7450, help="0 picks a free port")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import json
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # The stdlib encoder is slower but produces the same JSON
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Binary frames are only offered when msgpack is installed
+    msgpack = None
+
+from core.metrics import ws_encodes_total
+
+ENCODINGS = ("json", "msgpack")
+
+# Binary encoding of well-known messages: [schema id, values in this field order].
+# Other messages are sent as a plain MessagePack map.
+SCHEMAS: Dict[str, Tuple[int, Tuple[str, ...]]] = {
+    "decision": (1, ("student_id", "animation", "reply_text", "emotion", "confidence", "student_state", "meta")),
+    "state_update": (2, ("type", "room_id", "students")),
+}
+
+
+def negotiate(requested: Optional[str]) -> str:
+    """The encoding a client gets for what it asked for at connect time."""
+    if requested == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def _dumps_json(data: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class OutboundMessage:
+    """
+    A message encoded at most once per wire format, however many clients
+    receive it. The dict must not be changed after it was handed over.
+    """
+
+    __slots__ = ("data", "schema", "_json", "_msgpack")
+
+    def __init__(self, data: Dict[str, Any], schema: Optional[str] = None):
+        self.data = data
+        self.schema = schema
+        self._json: Optional[str] = None
+        self._msgpack: Optional[bytes] = None
+
+    def encode(self, encoding: str) -> Union[str, bytes]:
+        """JSON as text (a text frame), MessagePack as bytes (a binary frame)."""
+        if encoding == "msgpack":
+            if self._msgpack is None:
+                ws_encodes_total.inc(encoding="msgpack")
+                if self.schema is not None:
+                    schema_id, fields = SCHEMAS[self.schema]
+                    packed = [schema_id] + [self.data.get(field) for field in fields]
+                else:
+                    packed = self.data
+                self._msgpack = msgpack.packb(packed, use_bin_type=True, default=str)
+            return self._msgpack
+        if self._json is None:
+            ws_encodes_total.inc(encoding="json")
+            self._json = _dumps_json(self.data)
+        return self._json
+
+
+def as_outbound(message: Union[Dict[str, Any], OutboundMessage]) -> OutboundMessage:
+    return message if isinstance(message, OutboundMessage) else OutboundMessage(message)
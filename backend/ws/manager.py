@@ -1,23 +1,211 @@
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, List, Set, Any
-import json
+from typing import Dict, List, Any, Optional, Hashable, Iterable, Tuple, Union
+from collections import OrderedDict, deque
+import asyncio
 import logging
+from core.config import settings
+from core.metrics import ws_queue_drops_total
 from security.auth import decode_token
+from ws.encoding import OutboundMessage, as_outbound, negotiate
+from ws.pubsub import LocalBus, create_bus
+from ws.state_stream import StateStreams
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+STATE_MODES = ("full", "delta")
+# Window key of the merged simulation STATE_UPDATE of a coalesced role
+STATE_UPDATE_KEY = ("STATE_UPDATE",)
+# Rooms whose departed connections' counters are kept (least recently closed go first)
+CLOSED_STATS_ROOMS = 1024
+# Queue key of the marker that closes a connection once everything before it is sent
+_CLOSE = object()
+
+
+class ClientConnection:
+    """
+    One socket plus its bounded outbound queue.
+
+    Senders only enqueue (O(1)); a dedicated writer task drains the queue,
+    so a slow or dead client delays nobody but itself. When the queue is
+    full the overflow policy applies: drop_oldest discards the oldest
+    message, coalesce first replaces a still-queued message for the same
+    student (then drops the oldest), disconnect closes the client.
+    """
+
+    __slots__ = (
+        "websocket", "room_id", "role", "client_id", "encoding", "state_mode", "synced", "max_size", "policy",
+        "send_timeout_s", "queue", "pending", "wake", "writer", "closer", "closed", "dropped", "coalesced", "on_close"
+    )
+
+    def __init__(self, websocket: WebSocket, room_id: str, role: str, client_id: str,
+                 max_size: int, policy: str, send_timeout_s: float, on_close=None, encoding: str = "json",
+                 state_mode: str = "full"):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy!r}")
+        self.websocket = websocket
+        self.room_id = room_id
+        self.role = role
+        self.client_id = client_id
+        self.encoding = encoding
+        # Delta clients get state deltas only after their first snapshot was queued
+        self.state_mode = state_mode
+        self.synced = False
+        self.max_size = max_size
+        self.policy = policy
+        self.send_timeout_s = send_timeout_s
+        # Entries are [key, message] so a coalesced message keeps its place in the queue
+        self.queue: deque = deque()
+        self.pending: Dict[Hashable, list] = {}
+        self.wake = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        # Closes the socket after close(); referenced here so it is not collected before it runs
+        self.closer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+        self.on_close = on_close
+
+    def meta(self) -> Dict[str, Any]:
+        return {"room_id": self.room_id, "role": self.role, "client_id": self.client_id, "encoding": self.encoding, "state": self.state_mode}
+
+    def start(self):
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, message: OutboundMessage, key: Optional[Hashable] = None) -> bool:
+        """Queues a message without waiting; returns False if it was not accepted."""
+        if self.closed:
+            return False
+        if key is not None and self.policy == "coalesce":
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry[1] = message
+                self.coalesced += 1
+                ws_queue_drops_total.inc(reason="coalesced")
+                return True
+        if len(self.queue) >= self.max_size:
+            if self.policy == "disconnect":
+                ws_queue_drops_total.inc(reason="disconnected")
+                self.close(code=1013)
+                return False
+            old_key, _ = self.queue.popleft()
+            if old_key is not None:
+                self.pending.pop(old_key, None)
+            self.dropped += 1
+            ws_queue_drops_total.inc(reason="dropped_oldest")
+        entry = [key, message]
+        self.queue.append(entry)
+        if key is not None:
+            self.pending[key] = entry
+        self.wake.set()
+        return True
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.wake.clear()
+                    await self.wake.wait()
+                    continue
+                key, message = self.queue.popleft()
+                if key is _CLOSE:
+                    self.close(code=message)
+                    return
+                if key is not None:
+                    self.pending.pop(key, None)
+                # Encoded once per message and format, shared by every recipient
+                data = message.encode(self.encoding)
+                if isinstance(data, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(data), timeout=self.send_timeout_s)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(data), timeout=self.send_timeout_s)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Dead or stuck client: drop it instead of letting senders see the error
+            logging.error(f"Error sending to {self.meta()}: {e!r}")
+            ws_queue_drops_total.inc(reason="send_failed")
+            self.close(code=1011)
+
+    def close_after(self, message: OutboundMessage, code: int):
+        """Sends a last message after what is already queued, then closes."""
+        if self.closed:
+            return
+        self.queue.append([None, message])
+        self.queue.append([_CLOSE, code])
+        self.wake.set()
+
+    def close(self, code: int = 1000):
+        """Stops the writer, discards what is queued and closes the socket in the background."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.pending.clear()
+        if self.writer is not None and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+        if self.on_close is not None:
+            self.on_close(self)
+        self.closer = asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass  # Already closed by the client
+
 
 class ConnectionManager:
     """
     Manages WebSocket connections with role-based routing.
     Types: Unity, Teacher, Debug
+
+    Connections are indexed room -> role -> connections on connect and
+    disconnect. Role-targeted sends iterate a cached tuple of exactly their
+    recipients, rebuilt only after the room's membership changed, so a send
+    never scans the room or copies per call.
+
+    Room sends are published on a pub/sub bus (ws/pubsub.py) and delivered
+    by `_deliver`, here right away and on every other worker that holds
+    sockets of the room.
+
+    Roles in `coalesce_roles` are not sent every message: what arrives for
+    them within one window is collected per room, only the latest message
+    per key (student) is kept, and each client gets a single FRAME_BATCH
+    per window. The window starts with the first message, so idle rooms
+    cost no timer wakeups.
     """
-    def __init__(self):
-        # Room ID -> Set of connections
-        self.rooms: Dict[str, Set[WebSocket]] = {}
+    def __init__(self, queue_size: int = 256, overflow_policy: str = "drop_oldest", send_timeout_s: float = 5.0,
+                 bus: Optional[LocalBus] = None, coalesce_roles: Iterable[str] = (), coalesce_window_ms: float = 33.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy!r}")
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout_s = send_timeout_s
+        # Room ID -> connections of the room (rooms without connections are removed)
+        self.rooms: Dict[str, Dict[WebSocket, ClientConnection]] = {}
         # Connection -> Meta (role, client_id, etc)
         self.meta: Dict[WebSocket, Dict[str, Any]] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # Room ID -> role -> connections, and the tuples sends iterate (built lazily)
+        self._roles: Dict[str, Dict[str, Dict[WebSocket, ClientConnection]]] = {}
+        self._recipients: Dict[Tuple[str, str], Tuple[ClientConnection, ...]] = {}
+        self._snapshots: Dict[str, Tuple[Dict[str, Any], ...]] = {}
+        # Counters of connections that already left, so room stats stay cumulative
+        self._closed_stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        # What delta clients of each room were told (ws/state_stream.py)
+        self.state_streams = StateStreams()
+        self.bus = bus if bus is not None else LocalBus()
+        self.bus.set_handler(self._deliver)
+        self.coalesce_roles = frozenset(coalesce_roles)
+        self.coalesce_window_s = coalesce_window_ms / 1000
+        # (room, role) -> the window's messages by key and merged state updates by student
+        self._window: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._window_task: Optional[asyncio.Task] = None
+        self._unkeyed = 0  # Keys for window messages that are never merged
 
-    async def connect(self, websocket: WebSocket, room_id: str, token: str):
+    async def connect(self, websocket: WebSocket, room_id: str, token: str, encoding: Optional[str] = None,
+                      state_mode: Optional[str] = None):
         await websocket.accept()
-        
+
         # 1. Validate Token
         payload = decode_token(token)
         if not payload:
@@ -25,54 +213,250 @@ class ConnectionManager:
             return None
 
         # 2. Assign to Room
+        client = ClientConnection(
+            websocket, room_id, payload.get("role", "student"), payload.get("sub", "unknown"),
+            self.queue_size, self.overflow_policy, self.send_timeout_s,
+            on_close=lambda closed: self.disconnect(closed.websocket),
+            encoding=negotiate(encoding),
+            state_mode=state_mode if state_mode in STATE_MODES else "full"
+        )
         if room_id not in self.rooms:
-            self.rooms[room_id] = set()
-        self.rooms[room_id].add(websocket)
-        
-        self.meta[websocket] = {
-            "room_id": room_id,
-            "role": payload.get("role", "student"),
-            "client_id": payload.get("sub", "unknown")
-        }
-        
+            # First socket of the room here: receive what other workers send to it
+            self.bus.subscribe(room_id)
+        self.rooms.setdefault(room_id, {})[websocket] = client
+        self._roles.setdefault(room_id, {}).setdefault(client.role, {})[websocket] = client
+        self.meta[websocket] = client.meta()
+        self.clients[websocket] = client
+        self._invalidate(room_id, client.role)
+        client.start()
+
         return payload
 
     def disconnect(self, websocket: WebSocket):
-        meta = self.meta.get(websocket)
-        if meta:
-            room_id = meta["room_id"]
-            if room_id in self.rooms:
-                self.rooms[room_id].remove(websocket)
-            del self.meta[websocket]
-
-    async def broadcast_to_room(self, room_id: str, message: dict, exclude_role: str = None):
-        """Send message to everyone in the room except potentially a specific role."""
-        if room_id not in self.rooms:
+        client = self.clients.pop(websocket, None)
+        self.meta.pop(websocket, None)
+        if client is None:
             return
+        room_id, role = client.room_id, client.role
+        room = self.rooms.get(room_id)
+        if room is not None:
+            room.pop(websocket, None)
+            if not room:
+                del self.rooms[room_id]
+                self.bus.unsubscribe(room_id)
+        roles = self._roles.get(room_id)
+        if roles is not None and role in roles:
+            roles[role].pop(websocket, None)
+            if not roles[role]:
+                del roles[role]
+            if not roles:
+                del self._roles[room_id]
+        self._invalidate(room_id, role)
 
-        for connection in self.rooms[room_id]:
-            meta = self.meta.get(connection)
-            if exclude_role and meta and meta["role"] == exclude_role:
-                continue
-            
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logging.error(f"Error broadcasting to {meta}: {e}")
-
-    async def send_to_role(self, room_id: str, role: str, message: dict):
-        """Send to all clients with a specific role in a room."""
-        if room_id not in self.rooms:
+        stats = self._closed_stats.setdefault(room_id, {"dropped": 0, "coalesced": 0})
+        stats["dropped"] += client.dropped
+        stats["coalesced"] += client.coalesced
+        self._closed_stats.move_to_end(room_id)
+        if len(self._closed_stats) > CLOSED_STATS_ROOMS:
+            self._closed_stats.popitem(last=False)
+        client.on_close = None
+        if not client.closed:
+            # Normal disconnect: the socket is gone, just stop the writer
+            client.closed = True
+            if client.writer is not None and client.writer is not asyncio.current_task():
+                client.writer.cancel()
+
+    def _invalidate(self, room_id: str, role: str):
+        self._recipients.pop((room_id, role), None)
+        self._snapshots.pop(room_id, None)
+
+    def recipients(self, room_id: str, role: str) -> Tuple[ClientConnection, ...]:
+        """Connections of one role in a room; the same tuple until membership changes."""
+        cached = self._recipients.get((room_id, role))
+        if cached is None:
+            members = self._roles.get(room_id, {}).get(role)
+            if not members:
+                return ()
+            cached = self._recipients[(room_id, role)] = tuple(members.values())
+        return cached
+
+    def close_connection(self, websocket: WebSocket, message: dict, code: int):
+        """Closes a connection after its queued messages and a final `message`."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.close_after(as_outbound(message), code)
+
+    def send_personal(self, websocket: WebSocket, message: dict, key: Optional[Hashable] = None):
+        """Queues a message for one connection, in order with its room traffic."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(as_outbound(message), key)
+
+    def client_encoding(self, websocket: WebSocket) -> Optional[str]:
+        client = self.clients.get(websocket)
+        return client.encoding if client is not None else None
+
+    def sync_state(self, websocket: WebSocket) -> bool:
+        """Queues a snapshot of the room's state for a delta client; deltas queued after it build on it."""
+        client = self.clients.get(websocket)
+        if client is None or client.state_mode != "delta":
+            return False
+        client.synced = client.enqueue(self.state_streams.snapshot(client.room_id))
+        return client.synced
+
+    async def broadcast_to_room(self, room_id: str, message: Union[dict, OutboundMessage], exclude_role: str = None, key: Optional[Hashable] = None):
+        """Send message to everyone in the room except potentially a specific role."""
+        self.bus.publish(room_id, {"kind": "room", "exclude_role": exclude_role, "key": key, "message": as_outbound(message)})
+
+    async def send_to_role(self, room_id: str, role: str, message: Union[dict, OutboundMessage], key: Optional[Hashable] = None):
+        """
+        Send to all clients with a specific role in a room. Only enqueues, so
+        it never waits on a client; `key` (e.g. a student id) lets the
+        coalesce policy replace that student's still-queued message. Pass an
+        OutboundMessage to share one encoding across several sends.
+        """
+        self.bus.publish(room_id, {"kind": "role", "role": role, "key": key, "message": as_outbound(message)})
+
+    async def send_state(self, room_id: str, role: str, message: Optional[Union[dict, OutboundMessage]],
+                         updates: List[Dict[str, Any]], key: Optional[Hashable] = None):
+        """
+        Like send_to_role for a state-bearing message: full clients get
+        `message` (if any), synced delta clients a STATE_DELTA of what
+        `updates` changed. Deltas are never coalesced, since each one
+        depends on the previous.
+        """
+        self.bus.publish(room_id, {
+            "kind": "state", "role": role, "key": key, "updates": updates,
+            "message": as_outbound(message) if message is not None else None
+        })
+
+    def _deliver(self, room_id: str, envelope: Dict[str, Any]):
+        """Enqueues a published room message for this process's sockets."""
+        kind, message, key = envelope["kind"], envelope["message"], envelope["key"]
+        if kind == "role":
+            if envelope["role"] in self.coalesce_roles:
+                self._collect(room_id, envelope["role"], message, key)
+                return
+            # The tuple stays valid even if a recipient disconnects during the loop
+            for client in self.recipients(room_id, envelope["role"]):
+                client.enqueue(message, key)
+        elif kind == "room":
+            for role in list(self._roles.get(room_id, ())):
+                if role == envelope["exclude_role"]:
+                    continue
+                if role in self.coalesce_roles:
+                    self._collect(room_id, role, message, key)
+                    continue
+                for client in self.recipients(room_id, role):
+                    client.enqueue(message, key)
+        elif kind == "state":
+            if envelope["role"] in self.coalesce_roles:
+                self._collect(room_id, envelope["role"], message, key, envelope["updates"])
+                return
+            # Every worker folds the updates into its own stream, even without delta clients yet
+            delta = self.state_streams.apply(room_id, envelope["updates"])
+            for client in self.recipients(room_id, envelope["role"]):
+                if client.state_mode == "delta":
+                    if delta is not None and client.synced:
+                        client.enqueue(delta)
+                elif message is not None:
+                    client.enqueue(message, key)
+
+    def _collect(self, room_id: str, role: str, message: Optional[OutboundMessage], key: Optional[Hashable],
+                 updates: Optional[List[Dict[str, Any]]] = None):
+        """Adds a message (and state updates) to the current window of a coalesced role."""
+        if not updates and not self.recipients(room_id, role):
             return
+        window = self._window.get((room_id, role))
+        if window is None:
+            window = self._window[(room_id, role)] = {"messages": {}, "updates": {}}
+        if message is not None and key is None and message.data.get("type") == "STATE_UPDATE":
+            # Simulation ticks: one STATE_UPDATE per window, with the latest entry per student
+            merged = window["messages"].get(STATE_UPDATE_KEY)
+            students = {student["student_id"]: student for student in merged[0].data["students"]} if merged else {}
+            for student in message.data["students"]:
+                students[student["student_id"]] = student
+            message = OutboundMessage({**message.data, "students": list(students.values())}, schema=message.schema)
+            key = STATE_UPDATE_KEY
+        if message is not None:
+            if key is None:
+                self._unkeyed += 1
+                key = (None, self._unkeyed)
+            elif key in window["messages"]:
+                ws_queue_drops_total.inc(reason="window_merged")
+            # A replaced message keeps its place; state messages are what delta clients skip
+            window["messages"][key] = (message, updates is not None)
+        for update in updates or ():
+            window["updates"].setdefault(update["student_id"], {}).update(update)
+        if self._window_task is None:
+            self._window_task = asyncio.create_task(self._flush_window_later())
+
+    async def _flush_window_later(self):
+        await asyncio.sleep(self.coalesce_window_s)
+        self._window_task = None
+        self.flush_window()
 
-        for connection in self.rooms[room_id]:
-            meta = self.meta.get(connection)
-            if meta and meta["role"] == role:
-                await connection.send_json(message)
+    def flush_window(self):
+        """Sends every coalesced role its FRAME_BATCH for the window that just ended."""
+        windows, self._window = self._window, {}
+        for (room_id, role), window in windows.items():
+            delta = None
+            if window["updates"]:
+                delta = self.state_streams.apply(room_id, list(window["updates"].values()))
+            entries = list(window["messages"].values())
+            frame = delta_frame = None
+            if entries:
+                # Encoded once for all clients of the role
+                frame = OutboundMessage({"type": "FRAME_BATCH", "room_id": room_id,
+                                         "messages": [message.data for message, _ in entries]})
+                others = [message.data for message, is_state in entries if not is_state]
+                if others:
+                    delta_frame = OutboundMessage({"type": "FRAME_BATCH", "room_id": room_id, "messages": others})
+            for client in self.recipients(room_id, role):
+                if client.state_mode == "delta":
+                    if delta is not None and client.synced:
+                        client.enqueue(delta)
+                    if delta_frame is not None:
+                        client.enqueue(delta_frame)
+                elif frame is not None:
+                    client.enqueue(frame)
+
+    def room_snapshot(self, room_id: str) -> Tuple[Dict[str, Any], ...]:
+        """Metadata of every client in a room, cached until membership changes (do not mutate)."""
+        cached = self._snapshots.get(room_id)
+        if cached is None:
+            room = self.rooms.get(room_id)
+            if not room:
+                return ()
+            cached = self._snapshots[room_id] = tuple(self.meta[ws] for ws in room)
+        return cached
 
     def get_room_clients(self, room_id: str) -> List[Dict[str, Any]]:
-        if room_id not in self.rooms:
-            return []
-        return [self.meta[ws] for ws in self.rooms[room_id] if ws in self.meta]
+        return list(self.room_snapshot(room_id))
+
+    def room_stats(self, room_id: str) -> Dict[str, Any]:
+        """Outbound queue depth and drop counters of one room (live clients plus departed ones)."""
+        closed = self._closed_stats.get(room_id, {"dropped": 0, "coalesced": 0})
+        clients = list(self.rooms.get(room_id, {}).values())
+        return {
+            "room_id": room_id,
+            "connections": len(clients),
+            "queue_depth": sum(len(client.queue) for client in clients),
+            "max_queue_depth": max((len(client.queue) for client in clients), default=0),
+            "dropped": closed["dropped"] + sum(client.dropped for client in clients),
+            "coalesced": closed["coalesced"] + sum(client.coalesced for client in clients),
+            "clients": [
+                {**client.meta(), "queue_depth": len(client.queue), "dropped": client.dropped, "coalesced": client.coalesced}
+                for client in clients
+            ]
+        }
 
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    overflow_policy=settings.WS_OVERFLOW_POLICY,
+    send_timeout_s=settings.WS_SEND_TIMEOUT_S,
+    coalesce_roles=settings.WS_COALESCE_ROLES,
+    coalesce_window_ms=settings.WS_COALESCE_WINDOW_MS,
+    bus=create_bus(settings.PUBSUB_BACKEND, settings.PUBSUB_URL if settings.PUBSUB_BACKEND == "broker" else settings.REDIS_URL,
+                   settings.PUBSUB_BATCH_MS, settings.PUBSUB_BATCH_MAX, settings.PUBSUB_BACKLOG_MAX)
+)
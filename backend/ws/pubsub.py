@@ -0,0 +1,357 @@
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+try:
+    import orjson
+except ImportError:  # The stdlib codec is slower but speaks the same frames
+    orjson = None
+
+from core.metrics import pubsub_messages_total
+from ws.encoding import OutboundMessage
+
+# Largest frame a broker connection accepts (a whole batch is one frame)
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+RECONNECT_DELAY_S = (0.1, 0.5, 1.0, 2.0, 5.0)
+
+
+def dump_frame(frame: Dict[str, Any]) -> bytes:
+    """One newline-terminated JSON frame of the broker protocol."""
+    if orjson is not None:
+        return orjson.dumps(frame, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+    return json.dumps(frame, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+
+def load_frame(line: bytes) -> Dict[str, Any]:
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def pack_envelope(envelope: Dict[str, Any]) -> Dict[str, Any]:
+    """The wire form of an envelope: its OutboundMessage becomes plain data."""
+    message = envelope.get("message")
+    if isinstance(message, OutboundMessage):
+        envelope = {**envelope, "message": {"data": message.data, "schema": message.schema}}
+    return envelope
+
+
+def unpack_envelope(envelope: Dict[str, Any]) -> Dict[str, Any]:
+    message = envelope.get("message")
+    if message is not None:
+        envelope["message"] = OutboundMessage(message["data"], message.get("schema"))
+    return envelope
+
+
+class LocalBus:
+    """
+    Room pub/sub within one process, and the base of the networked buses.
+
+    `publish` hands the envelope to this process's handler right away, so
+    local sockets never wait on the network. Networked buses additionally
+    send it to the other workers subscribed to the room, which call their
+    own handler with it. A worker subscribes to exactly the rooms it holds
+    sockets for.
+    """
+
+    def __init__(self):
+        self.handler: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self.rooms: Set[str] = set()
+
+    def set_handler(self, handler: Callable[[str, Dict[str, Any]], None]):
+        self.handler = handler
+
+    def subscribe(self, room_id: str):
+        self.rooms.add(room_id)
+
+    def unsubscribe(self, room_id: str):
+        self.rooms.discard(room_id)
+
+    def publish(self, room_id: str, envelope: Dict[str, Any]):
+        if self.handler is not None:
+            self.handler(room_id, envelope)
+
+    def _receive(self, room_id: str, envelope: Dict[str, Any]):
+        """An envelope another worker published."""
+        pubsub_messages_total.inc(direction="in")
+        if room_id in self.rooms and self.handler is not None:
+            self.handler(room_id, unpack_envelope(envelope))
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class _BatchingBus(LocalBus, ABC):
+    """Collects published envelopes and sends them in one batch per window."""
+
+    def __init__(self, batch_ms: float = 2.0, batch_max: int = 256):
+        super().__init__()
+        self.batch_s = batch_ms / 1000
+        self.batch_max = batch_max
+        self._outbox: List[Tuple[str, Dict[str, Any]]] = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    def publish(self, room_id: str, envelope: Dict[str, Any]):
+        super().publish(room_id, envelope)
+        self._outbox.append((room_id, pack_envelope(envelope)))
+        if len(self._outbox) >= self.batch_max:
+            self._flush_now()
+        elif self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_s)
+        self._flusher = None
+        self._flush_now()
+
+    def _flush_now(self):
+        batch, self._outbox = self._outbox, []
+        if batch:
+            self._send_batch(batch)
+
+    @abstractmethod
+    def _send_batch(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """Hands a batch of (room_id, packed envelope) to the network."""
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self._flush_now()
+
+
+class BrokerBus(_BatchingBus):
+    """
+    Talks to ws/broker.py over one TCP connection: subscriptions go out as
+    they change, publishes in batches. The broker relays each batch to the
+    other subscribers of its rooms. After a lost connection it reconnects and
+    subscribes again. Publishes wait in a backlog of at most `backlog_max`
+    envelopes (oldest dropped first and counted) for a sender that writes
+    one frame at a time and awaits drain(), so an unreachable or slow broker
+    backs up into that bound rather than into the transport buffer.
+    """
+
+    def __init__(self, url: str, batch_ms: float = 2.0, batch_max: int = 256, backlog_max: int = 4096):
+        super().__init__(batch_ms, batch_max)
+        self._backlog: deque = deque()
+        self.backlog_max = backlog_max
+        self._dropping = False
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 7450
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self.connected = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        attempt = 0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=MAX_FRAME_BYTES)
+            except OSError as e:
+                delay = RECONNECT_DELAY_S[min(attempt, len(RECONNECT_DELAY_S) - 1)]
+                print(f"Pub/sub broker {self.host}:{self.port} unreachable ({e}), retrying in {delay}s")
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            attempt = 0
+            self._writer = writer
+            if self.rooms:
+                writer.write(dump_frame({"op": "sub", "rooms": sorted(self.rooms)}))
+            if self._backlog:
+                print(f"Pub/sub broker reconnected, sending {len(self._backlog)} buffered messages")
+            sender = asyncio.create_task(self._send_loop(writer))
+            self.connected.set()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    frame = load_frame(line)
+                    for room_id, envelope in frame.get("batch", ()):
+                        self._receive(room_id, envelope)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                print(f"Pub/sub broker connection lost: {e!r}")
+            finally:
+                sender.cancel()
+                self.connected.clear()
+                self._writer = None
+                writer.close()
+
+    def _take_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        count = min(self.batch_max, len(self._backlog))
+        return [self._backlog.popleft() for _ in range(count)]
+
+    async def _send_loop(self, writer: asyncio.StreamWriter):
+        """Writes the backlog to one broker connection, a frame at a time, until it is lost."""
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                while self._backlog:
+                    batch = self._take_batch()
+                    writer.write(dump_frame({"op": "pub", "batch": batch}))
+                    pubsub_messages_total.inc(len(batch), direction="out")
+                    await writer.drain()
+                self._dropping = False
+        except ConnectionError:
+            pass  # The reader notices too and reconnects
+
+    def subscribe(self, room_id: str):
+        if room_id not in self.rooms and self._writer is not None:
+            self._writer.write(dump_frame({"op": "sub", "rooms": [room_id]}))
+        super().subscribe(room_id)
+
+    def unsubscribe(self, room_id: str):
+        if room_id in self.rooms and self._writer is not None:
+            self._writer.write(dump_frame({"op": "unsub", "rooms": [room_id]}))
+        super().unsubscribe(room_id)
+
+    def _send_batch(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        self._backlog.extend(batch)
+        overflow = len(self._backlog) - self.backlog_max
+        if overflow > 0:
+            for _ in range(overflow):
+                self._backlog.popleft()
+            pubsub_messages_total.inc(overflow, direction="dropped")
+            if not self._dropping:
+                # Once per outage; vc_pubsub_messages_total{direction="dropped"} has the count
+                print(f"Pub/sub broker unreachable or not keeping up, {self.backlog_max} messages buffered, dropping the oldest")
+                self._dropping = True
+        self._ready.set()
+
+    async def stop(self):
+        await super().stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._writer is not None:
+            # Last publishes go out before the connection closes
+            while self._backlog:
+                batch = self._take_batch()
+                self._writer.write(dump_frame({"op": "pub", "batch": batch}))
+                pubsub_messages_total.inc(len(batch), direction="out")
+            self._writer.close()
+            self._writer = None
+
+
+class RedisBus(_BatchingBus):
+    """
+    Redis pub/sub with one channel per room. A batch becomes one PUBLISH per
+    room, pipelined; the publishing worker skips its own messages when they
+    come back.
+    """
+
+    CHANNEL_PREFIX = "vc:room:"
+
+    def __init__(self, url: Optional[str] = None, batch_ms: float = 2.0, batch_max: int = 256, client=None):
+        super().__init__(batch_ms, batch_max)
+        if client is None:
+            import redis.asyncio  # Optional dependency, only needed for PUBSUB_BACKEND=redis
+            client = redis.asyncio.Redis.from_url(url)
+        self.client = client
+        self.origin = uuid.uuid4().hex
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self):
+        if self._task is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            if self.rooms:
+                await self._pubsub.subscribe(*(self.CHANNEL_PREFIX + room for room in self.rooms))
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            if not self._pubsub.subscribed:
+                # Nothing to read until this worker holds sockets of some room
+                await asyncio.sleep(0.05)
+                continue
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Pub/sub Redis error: {e!r}")
+                await asyncio.sleep(RECONNECT_DELAY_S[-1])
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            room_id = (channel.decode() if isinstance(channel, bytes) else channel)[len(self.CHANNEL_PREFIX):]
+            try:
+                frame = load_frame(message["data"])
+                origin, batch = frame["origin"], frame["batch"]
+            except (ValueError, KeyError, TypeError) as e:
+                # One bad message must not end the listener (and with it all room traffic)
+                print(f"Pub/sub Redis: skipping malformed message on {room_id} ({e!r})")
+                continue
+            if origin == self.origin:
+                continue
+            for envelope in batch:
+                self._receive(room_id, envelope)
+
+    def _background(self, coro):
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def subscribe(self, room_id: str):
+        if room_id not in self.rooms and self._pubsub is not None:
+            self._background(self._pubsub.subscribe(self.CHANNEL_PREFIX + room_id))
+        super().subscribe(room_id)
+
+    def unsubscribe(self, room_id: str):
+        if room_id in self.rooms and self._pubsub is not None:
+            self._background(self._pubsub.unsubscribe(self.CHANNEL_PREFIX + room_id))
+        super().unsubscribe(room_id)
+
+    def _send_batch(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        self._background(self._publish(batch))
+
+    async def _publish(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        by_room: Dict[str, List[Dict[str, Any]]] = {}
+        for room_id, envelope in batch:
+            by_room.setdefault(room_id, []).append(envelope)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for room_id, envelopes in by_room.items():
+                pipe.publish(self.CHANNEL_PREFIX + room_id, dump_frame({"origin": self.origin, "batch": envelopes}))
+            await pipe.execute()
+            pubsub_messages_total.inc(len(batch), direction="out")
+        except Exception as e:
+            print(f"Pub/sub Redis publish failed: {e!r}")
+            pubsub_messages_total.inc(len(batch), direction="dropped")
+
+    async def stop(self):
+        await super().stop()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+
+
+def create_bus(kind: str, url: Optional[str] = None, batch_ms: float = 2.0, batch_max: int = 256,
+               backlog_max: int = 4096) -> LocalBus:
+    if kind == "broker":
+        return BrokerBus(url, batch_ms, batch_max, backlog_max)
+    if kind == "redis":
+        return RedisBus(url, batch_ms, batch_max)
+    if kind == "local":
+        return LocalBus()
+    raise ValueError(f"Unknown pub/sub backend: {kind}")
@@ -0,0 +1,83 @@
+from typing import Any, Dict, Iterable, Optional
+
+from ws.encoding import OutboundMessage
+
+# Per-student fields Unity mirrors; anything else in an update is ignored
+STATE_FIELDS = (
+    "animation", "reply_text", "emotion", "confidence", "student_state",
+    "attention_level", "energy_level", "decision_id"
+)
+
+
+class RoomState:
+    """What delta clients of one room have been told so far, and the seq it is at."""
+
+    __slots__ = ("room_id", "seq", "students", "_snapshot")
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.seq = 0
+        self.students: Dict[int, Dict[str, Any]] = {}
+        self._snapshot: Optional[OutboundMessage] = None
+
+    def apply(self, updates: Iterable[Dict[str, Any]]) -> Optional[OutboundMessage]:
+        """
+        Folds student updates into the room state. Returns one STATE_DELTA
+        with only the fields that changed (under the next seq), or None if
+        nothing did.
+        """
+        changed = []
+        for update in updates:
+            student_id = update["student_id"]
+            current = self.students.setdefault(student_id, {})
+            fields = {}
+            for field in STATE_FIELDS:
+                if field in update and current.get(field) != update[field]:
+                    fields[field] = current[field] = update[field]
+            if fields:
+                changed.append({"student_id": student_id, **fields})
+        if not changed:
+            return None
+        self.seq += 1
+        self._snapshot = None
+        return OutboundMessage({"type": "STATE_DELTA", "room_id": self.room_id, "seq": self.seq, "students": changed})
+
+    def snapshot(self) -> OutboundMessage:
+        """Full state of the room at the current seq (shared until the next change)."""
+        if self._snapshot is None:
+            self._snapshot = OutboundMessage({
+                "type": "STATE_SNAPSHOT", "room_id": self.room_id, "seq": self.seq,
+                "students": [{"student_id": student_id, **fields} for student_id, fields in self.students.items()]
+            })
+        return self._snapshot
+
+
+class StateStreams:
+    """
+    Versioned per-room student state, kept by ConnectionManager for clients
+    connected with ?state=delta. They get one STATE_SNAPSHOT, then STATE_DELTA frames whose seq grows by
+    exactly one per frame; a gap means frames were dropped and the client
+    sends RESYNC_REQUEST for a new snapshot.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, RoomState] = {}
+
+    def room(self, room_id: str) -> RoomState:
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = RoomState(room_id)
+        return state
+
+    def apply(self, room_id: str, updates: Iterable[Dict[str, Any]]) -> Optional[OutboundMessage]:
+        return self.room(room_id).apply(updates)
+
+    def snapshot(self, room_id: str) -> OutboundMessage:
+        return self.room(room_id).snapshot()
+
+    def known_students(self, room_id: str) -> Iterable[int]:
+        state = self.rooms.get(room_id)
+        return state.students.keys() if state is not None else ()
+
+    def drop_room(self, room_id: str):
+        self.rooms.pop(room_id, None)